@@ -0,0 +1,54 @@
+"""Render product videos in bulk from the command line.
+
+Usage:
+    python -m video_mvp.backend.batch items.jsonl --output-dir uploads/batches/catalogue
+
+Each line of the input file is a JSON object with ``product_url`` and
+``creative_prompt`` (optionally ``id``, ``max_images`` and local ``media``
+paths). A plain line holding just a URL uses ``--prompt``. Re-running with
+the same output directory resumes from its manifest.
+"""
+from typing import Dict, List
+import argparse
+import json
+import sys
+from .services.batch_pipeline import BatchJob, DEFAULT_CONCURRENCY, STAGES
+
+
+def read_items(path: str, default_prompt: str) -> List[Dict]:
+    items = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                item.setdefault("creative_prompt", default_prompt)
+            else:
+                item = {"product_url": line, "creative_prompt": default_prompt}
+            items.append(item)
+    return items
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Batch-render product videos.")
+    parser.add_argument("items", help="JSONL file of items (or one product URL per line)")
+    parser.add_argument("--output-dir", required=True, help="Where videos and manifest.json are written")
+    parser.add_argument("--media-dir", default="uploads", help="Shared download cache for scraped images")
+    parser.add_argument("--prompt", default="10 sec tiktok marketing video", help="Prompt for items without one")
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}-workers", type=int, default=DEFAULT_CONCURRENCY[stage],
+                            help=f"Concurrency limit for the {stage} stage")
+    args = parser.parse_args(argv)
+    concurrency = {stage: getattr(args, f"{stage}_workers") for stage in STAGES}
+    job = BatchJob(read_items(args.items, args.prompt), args.output_dir,
+                   media_dir=args.media_dir, concurrency=concurrency)
+    manifest = job.run()
+    print(json.dumps({k: manifest[k] for k in ("batch_id", "status", "elapsed_seconds", "stage_seconds", "counts")}, indent=2))
+    print(f"Manifest: {job.manifest_path}")
+    return 0 if manifest["status"] == "done" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
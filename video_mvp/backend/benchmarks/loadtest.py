@@ -0,0 +1,130 @@
+"""Offline load test for the FastAPI app.
+
+Usage:
+    python -m video_mvp.backend.benchmarks.loadtest --out load.json [--concurrency 1,2,4,8,16] [--requests 8]
+
+Starts the product-site and OpenAI stand-ins, serves the app with uvicorn in
+this process (or targets ``--base-url``), and at each concurrency level has
+every virtual user run ``/api/input`` followed by ``/api/render_video``.
+Reports throughput, p50/p95/p99 latency and the status codes seen, including
+429/503 answers from admission control.
+"""
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+import requests
+from .standins import offline_environment
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return round(ordered[index], 4)
+
+
+@contextmanager
+def serve_app(host: str = "127.0.0.1"):
+    """Run the app under uvicorn in a background thread; yields its base URL."""
+    import uvicorn
+    from ..main import app
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def _virtual_user(base_url: str, product_url: str, n_requests: int, results: Dict, lock: threading.Lock) -> None:
+    session = requests.Session()
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        r = session.post(f"{base_url}/api/input", data={"product_url": product_url, "creative_prompt": "10 sec vid"})
+        _record(results, lock, "input", r.status_code, time.perf_counter() - start)
+        if r.status_code != 200:
+            continue
+        data = r.json()
+        start = time.perf_counter()
+        r = session.post(f"{base_url}/api/render_video",
+                         json={"storyboard": data["storyboard"], "media_files": data["media_files"]})
+        _record(results, lock, "render_video", r.status_code, time.perf_counter() - start)
+
+
+def _record(results: Dict, lock: threading.Lock, endpoint: str, status: int, seconds: float) -> None:
+    with lock:
+        entry = results.setdefault(endpoint, {"latencies": [], "statuses": {}})
+        entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+        if status == 200:
+            entry["latencies"].append(seconds)
+
+
+def run_level(base_url: str, product_url: str, concurrency: int, requests_per_user: int) -> Dict:
+    raw: Dict = {}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(_virtual_user, base_url, product_url, requests_per_user, raw, lock)
+    elapsed = time.perf_counter() - start
+    level = {"concurrency": concurrency, "elapsed_s": round(elapsed, 3), "endpoints": {}}
+    for endpoint, entry in raw.items():
+        latencies = entry["latencies"]
+        level["endpoints"][endpoint] = {
+            "ok": len(latencies),
+            "statuses": entry["statuses"],
+            "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else None,
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "p99_s": percentile(latencies, 99),
+        }
+    print(f"concurrency {concurrency:>3}: " + ", ".join(
+        f"{name} {e['throughput_rps']} rps p50={e['p50_s']} p95={e['p95_s']} p99={e['p99_s']} {e['statuses']}"
+        for name, e in level["endpoints"].items()))
+    return level
+
+
+def run_load_test(levels: List[int], requests_per_user: int, image_count: int = 5,
+                  openai_latency: float = 0.2, base_url: Optional[str] = None) -> Dict:
+    with offline_environment(image_count=image_count, openai_latency=openai_latency) as (site, _):
+        if base_url:
+            return {"levels": [run_level(base_url, site.product_url, c, requests_per_user) for c in levels]}
+        with serve_app() as url:
+            return {"levels": [run_level(url, site.product_url, c, requests_per_user) for c in levels]}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for /api/input and /api/render_video.")
+    parser.add_argument("--out", default="load_output.json")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=4, help="Input+render rounds per virtual user")
+    parser.add_argument("--images", type=int, default=5, help="Gallery images on the stand-in product page")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="Seconds the fake OpenAI takes per call")
+    parser.add_argument("--base-url", help="Target an already running server instead of starting one")
+    args = parser.parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    # An external server must be started with OPENAI_BASE_URL pointing at a fake for this to stay offline
+    results = run_load_test(levels, args.requests, args.images, args.openai_latency, args.base_url)
+    results["config"] = vars(args)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
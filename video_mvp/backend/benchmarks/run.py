@@ -0,0 +1,345 @@
+"""Reproducible, offline benchmarks for the video pipeline.
+
+Usage:
+    python -m video_mvp.backend.benchmarks.run --out bench.json [--quick] [--baseline old.json]
+
+Every case runs against local stand-ins (see ``standins.py``), so numbers are
+comparable across commits. Results are written as JSON; ``--baseline``
+reports cases whose median got slower than ``--threshold``.
+
+Startup is tracked per worker role too: ``import_app`` times a fresh
+interpreter importing the app (with the slowest top-level imports from
+``-X importtime``), and ``cold_start`` times a uvicorn worker from spawn to
+its first ``/healthz`` answer (``warm_s``: until its stack is imported).
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import cv2
+from .standins import isolated_uploads, offline_environment, make_product_image
+from ..services import pipeline
+
+IMAGE_COUNTS = [3, 10]
+RESOLUTIONS = [(640, 480), (1946, 2594)]
+DURATIONS = [10, 30]
+# Compositor -> encoder frame transport cases (frames go to a null sink, so only the transport is timed)
+TRANSPORT_FPS = [30, 60]
+TRANSPORT_SECONDS = 5
+# Worker roles whose import time and cold start are tracked
+STARTUP_ROLES = ["all", "api", "render"]
+APP_MODULE = "video_mvp.backend.main"
+
+
+def _stats(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, max(0, round(0.95 * len(ordered)) - 1))
+    return {
+        "runs": len(samples),
+        "min_s": round(ordered[0], 4),
+        "median_s": round(statistics.median(ordered), 4),
+        "mean_s": round(statistics.mean(ordered), 4),
+        "p95_s": round(ordered[p95_index], 4),
+    }
+
+
+def bench(name: str, params: Dict, fn: Callable[[], object], repeats: int,
+          setup: Optional[Callable[[], None]] = None) -> Dict:
+    samples = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    result = {"name": name, "params": params}
+    result.update(_stats(samples))
+    print(f"{name:<24} {json.dumps(params):<60} median {result['median_s']:.4f}s")
+    return result
+
+
+def _clear_caches() -> None:
+    for cache in (pipeline.SCRAPE_CACHE, pipeline.DOWNLOAD_CACHE, pipeline.ANALYSIS_CACHE):
+        cache.clear()
+
+
+def _write_images(dest_dir: str, count: int, resolution) -> List[str]:
+    paths = []
+    for i in range(count):
+        path = os.path.join(dest_dir, f"bench_{resolution[0]}x{resolution[1]}_{i}.jpg")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(make_product_image(i, *resolution))
+        paths.append(path)
+    return paths
+
+
+def _storyboard_for(paths: List[str], duration: int) -> str:
+    per = duration / len(paths)
+    media = []
+    for i, p in enumerate(paths):
+        start, end = round(i * per), round((i + 1) * per)
+        media.append({"start": f"{start // 60:02d}:{start % 60:02d}", "end": f"{end // 60:02d}:{end % 60:02d}", "file": p})
+    return json.dumps({"script": "Benchmark video", "media": media})
+
+
+def _tool_benchmarks(workdir: str, image_counts, resolutions, durations, repeats: int) -> List[Dict]:
+    from ..tools.scrape_url import scrape_url
+    from ..tools.analyze_media import analyze_media
+    from ..tools.generate_storyboard import generate_storyboard
+    from ..tools.render_video import render_video
+    results = []
+    for count in image_counts:
+        with offline_environment(image_count=count) as (site, _):
+            results.append(bench("scrape_url", {"images": count}, lambda: scrape_url(site.product_url), repeats))
+            paths = _write_images(workdir, count, resolutions[0])
+            results.append(bench("analyze_media", {"images": count}, lambda: analyze_media(paths), repeats))
+            sb_input = {
+                "creative_prompt": "10 sec vid",
+                "product": {"title": "Strawberry Maxine", "description": "A heatable plush."},
+                "media": [{"path": p, "description": "A plush toy."} for p in paths],
+            }
+            results.append(bench("generate_storyboard", {"images": count}, lambda: generate_storyboard(sb_input), repeats))
+    for count in image_counts:
+        for resolution in resolutions:
+            paths = _write_images(workdir, count, resolution)
+            for duration in durations:
+                storyboard = _storyboard_for(paths, duration)
+                output_path = os.path.join(workdir, "bench_output.mp4")
+                params = {"images": count, "resolution": f"{resolution[0]}x{resolution[1]}", "duration": duration}
+                results.append(bench("render_video", params, lambda: render_video(storyboard, paths, output_path), repeats))
+    return results
+
+
+def _transport_benchmarks(workdir: str, fps_values, seconds: int, repeats: int) -> List[Dict]:
+    from ..utils.frame_transport import stream_frames, compositor_pool, TRANSPORTS
+    paths = _write_images(workdir, 3, RESOLUTIONS[-1])
+    # Compositor processes outlive a render; start them outside the timed runs
+    compositor_pool().warm(2)
+    results = []
+    for fps in fps_values:
+        per_image = seconds * fps // len(paths)
+        items = [(p, i * per_image, per_image) for i, p in enumerate(paths)]
+        frames = per_image * len(paths)
+        for transport in TRANSPORTS:
+            with open(os.devnull, "wb") as sink:
+                result = bench("frame_transport", {"transport": transport, "fps": fps, "seconds": seconds},
+                               lambda: stream_frames(items, sink, transport=transport), repeats)
+            # Throughput relative to playback: above 1.0 the transport outruns real time
+            result["frames_per_s"] = round(frames / result["median_s"], 1) if result["median_s"] else None
+            result["realtime_factor"] = round(result["frames_per_s"] / fps, 2) if result["frames_per_s"] else None
+            results.append(result)
+    return results
+
+
+def _endpoint_benchmarks(image_counts, resolutions, repeats: int) -> List[Dict]:
+    from fastapi.testclient import TestClient
+    from ..main import app, prefetcher
+    from ..tools.scrape_url import scrape_url
+    client = TestClient(app)
+    results = []
+    # Downloads and published videos go to a scratch directory, not the repository's uploads/
+    with tempfile.TemporaryDirectory() as upload_dir, isolated_uploads(upload_dir):
+        for count in image_counts:
+            for resolution in resolutions:
+                params = {"images": count, "resolution": f"{resolution[0]}x{resolution[1]}"}
+                with offline_environment(image_count=count, resolution=resolution) as (site, _):
+                    state = {}
+
+                    def cold_start():
+                        # Drop in-memory caches and downloaded files so each run measures the cold path
+                        _clear_caches()
+                        for url in scrape_url(site.product_url)["images"]:
+                            path = pipeline.scraped_image_path(url, upload_dir)
+                            if os.path.exists(path):
+                                os.remove(path)
+
+                    def call_input():
+                        r = client.post("/api/input", data={"product_url": site.product_url, "creative_prompt": "10 sec vid"})
+                        r.raise_for_status()
+                        state["input"] = r.json()
+
+                    results.append(bench("api_input", params, call_input, repeats, setup=cold_start))
+
+                    def prefetched_start():
+                        # The URL was pasted (and prefetched) while the user was still writing the prompt
+                        cold_start()
+                        client.post("/api/prefetch", data={"product_url": site.product_url}).raise_for_status()
+                        prefetcher.wait(site.product_url, pipeline.MAX_STORYBOARD_MEDIA)
+
+                    results.append(bench("api_input_prefetched", params, call_input, repeats, setup=prefetched_start))
+
+                    def call_render():
+                        r = client.post("/api/render_video", json={
+                            "storyboard": state["input"]["storyboard"],
+                            "media_files": state["input"]["media_files"],
+                        })
+                        r.raise_for_status()
+
+                    results.append(bench("api_render_video", params, call_render, repeats))
+                    cold_start()
+    return results
+
+
+def import_profile(stderr: str, top: int = 8) -> List[Dict]:
+    """Slowest top-level packages in ``python -X importtime`` output, by cumulative time."""
+    cumulative: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line.split(":", 1)[1].split("|")
+        if not cum.strip().isdigit():
+            continue  # the header line
+        # A package's outermost import has the largest cumulative time and covers its submodules
+        root = name.strip().split(".")[0]
+        cumulative[root] = max(cumulative.get(root, 0), int(cum))
+    ranked = sorted(cumulative.items(), key=lambda kv: -kv[1])[:top]
+    return [{"module": name, "cumulative_s": round(us / 1e6, 4)} for name, us in ranked]
+
+
+def _role_env(role: str) -> Dict[str, str]:
+    env = dict(os.environ, VIDEO_MVP_ROLE=role)
+    # The child must find this package however the benchmarks were started
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (root, env.get("PYTHONPATH")) if p)
+    return env
+
+
+def _wait_for(url: str, proc: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Worker exited with {proc.returncode} before answering {url}")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.005)
+    raise TimeoutError(f"No answer from {url} within {timeout}s")
+
+
+def cold_start(role: str, host: str = "127.0.0.1") -> Tuple[float, float]:
+    """Spawn a uvicorn worker; seconds until /healthz answers, and until its stack is warm."""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+    base = f"http://{host}:{port}/healthz"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{APP_MODULE}:app", "--host", host,
+                             "--port", str(port), "--log-level", "warning"],
+                            env=_role_env(role), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for(base, proc)
+        ready = time.perf_counter() - start
+        _wait_for(base + "?require_warm=true", proc)  # 503 until the warm-up thread is done
+        return ready, time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _startup_benchmarks(roles, repeats: int) -> List[Dict]:
+    results = []
+    for role in roles:
+        profile = {}
+
+        def import_app():
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {APP_MODULE}"],
+                                  env=_role_env(role), capture_output=True, text=True, check=True)
+            profile["top"] = import_profile(proc.stderr)
+
+        result = bench("import_app", {"role": role}, import_app, repeats)
+        result["top_imports"] = profile["top"]
+        results.append(result)
+        # Timed inside cold_start: stopping the worker is not part of the startup
+        ready, warm = zip(*(cold_start(role) for _ in range(repeats)))
+        result = {"name": "cold_start", "params": {"role": role}}
+        result.update(_stats(list(ready)))
+        result["warm_s"] = round(statistics.median(warm), 4)
+        print(f"{'cold_start':<24} {json.dumps(result['params']):<60} median {result['median_s']:.4f}s "
+              f"(warm {result['warm_s']:.4f}s)")
+        results.append(result)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(quick: bool = False, repeats: int = 3, include_endpoints: bool = True) -> Dict:
+    image_counts = IMAGE_COUNTS[:1] if quick else IMAGE_COUNTS
+    resolutions = RESOLUTIONS[:1] if quick else RESOLUTIONS
+    durations = DURATIONS[:1] if quick else DURATIONS
+    repeats = 1 if quick else repeats
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        results.extend(_tool_benchmarks(workdir, image_counts, resolutions, durations, repeats))
+        results.extend(_transport_benchmarks(workdir, TRANSPORT_FPS, 1 if quick else TRANSPORT_SECONDS, repeats))
+    results.extend(_startup_benchmarks(STARTUP_ROLES[:1] if quick else STARTUP_ROLES, repeats))
+    if include_endpoints:
+        results.extend(_endpoint_benchmarks(image_counts, resolutions, repeats))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "quick": quick,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def _case_key(result: Dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.2) -> List[str]:
+    """Cases whose median is more than ``threshold`` slower than the baseline."""
+    previous = {_case_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in current.get("results", []):
+        old = previous.get(_case_key(r))
+        if old and old["median_s"] > 0 and r["median_s"] > old["median_s"] * (1 + threshold):
+            regressions.append(f"{_case_key(r)}: {old['median_s']:.4f}s -> {r['median_s']:.4f}s")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks.")
+    parser.add_argument("--out", default="bench_output.json", help="Where to write the JSON results")
+    parser.add_argument("--quick", action="store_true", help="Smallest matrix, one run per case")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-endpoints", action="store_true", help="Skip the FastAPI end-to-end cases")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown vs baseline")
+    args = parser.parse_args(argv)
+    results = run_benchmarks(quick=args.quick, repeats=args.repeats, include_endpoints=not args.no_endpoints)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {len(results['results'])} results to {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
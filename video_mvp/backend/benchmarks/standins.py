@@ -0,0 +1,290 @@
+"""Local stand-ins for the product site and the OpenAI API.
+
+``ProductSiteServer`` serves the recorded product page fixture and generated
+product images (honouring single ``Range`` requests); ``FakeOpenAIServer``
+answers ``/v1/chat/completions`` with canned vision descriptions and
+storyboards; ``make_voiceover`` stands in for TTS. ``offline_environment()``
+starts both servers and points the OpenAI client at the fake via
+``OPENAI_BASE_URL``; ``isolated_uploads()`` keeps the app's downloads and
+renders out of the repository's ``uploads/``.
+"""
+from typing import Callable, Dict, Optional, Tuple, Union
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import re
+import threading
+import time
+import wave
+import cv2
+import numpy as np
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+PRODUCT_HANDLE = "preorder-strawberry-maxine-heatable-plush"
+
+
+def _read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return f.read()
+
+
+def make_product_image(index: int, width: int, height: int) -> bytes:
+    """A smooth, index-seeded JPEG (distinct images have distinct perceptual hashes)."""
+    rng = np.random.default_rng(index)
+    grid = rng.integers(0, 256, size=(6, 4, 3), dtype=np.uint8)
+    img = cv2.resize(grid, (width, height), interpolation=cv2.INTER_CUBIC)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buf.tobytes()
+
+
+class _StandInServer:
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        server = self
+        handler = type("Handler", (self.handler_class,), {"standin": server, "log_message": lambda *a: None})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count_request(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _ProductSiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, body: bytes, content_type: str, head_only: bool = False) -> None:
+        total = len(body)
+        byte_range = re.match(r"^bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if status == 200 and byte_range and int(byte_range.group(1)) < total:
+            start = int(byte_range.group(1))
+            end = min(int(byte_range.group(2) or total - 1), total - 1)
+            status, body = 206, body[start:end + 1]
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def _handle(self, head_only: bool) -> None:
+        site = self.standin
+        site.count_request()
+        parsed = urlparse(self.path)
+        if site.latency:
+            time.sleep(site.latency)
+        if parsed.path == f"/products/{PRODUCT_HANDLE}":
+            return self._send(200, site.page_html().encode("utf-8"), "text/html; charset=utf-8", head_only)
+        match = re.match(r"^/cdn/shop/files/IMG_(\d+)(-zoom)?\.jpg$", parsed.path)
+        if match and int(match.group(1)) < site.image_count:
+            width = parse_qs(parsed.query).get("width", [None])[0]
+            body = site.image_bytes(int(match.group(1)), int(width) if width else None)
+            return self._send(200, body, "image/jpeg", head_only)
+        if parsed.path.startswith("/cdn/"):
+            # Logos, icons and banners referenced by the page: a tiny image is enough
+            return self._send(200, site.image_bytes(999, 64), "image/jpeg", head_only)
+        self._send(404, b"not found", "text/plain", head_only)
+
+    def do_GET(self):
+        self._handle(head_only=False)
+
+    def do_HEAD(self):
+        self._handle(head_only=True)
+
+
+class ProductSiteServer(_StandInServer):
+    """Serves the product page fixture with ``image_count`` gallery images of ``resolution``."""
+
+    handler_class = _ProductSiteHandler
+
+    def __init__(self, image_count: int = 10, resolution: Tuple[int, int] = (1946, 2594), latency: float = 0.0):
+        super().__init__()
+        self.image_count = image_count
+        self.resolution = resolution
+        self.latency = latency
+        self._images: Dict[Tuple[int, Optional[int]], bytes] = {}
+
+    @property
+    def product_url(self) -> str:
+        return f"{self.url}/products/{PRODUCT_HANDLE}"
+
+    def page_html(self) -> str:
+        item = _read_fixture("gallery_item.html")
+        gallery = "".join(item.replace("{{INDEX}}", str(i)) for i in range(self.image_count))
+        return _read_fixture("product_page.html").replace("{{GALLERY}}", gallery).replace("{{BASE_URL}}", self.url)
+
+    def image_bytes(self, index: int, width: Optional[int] = None) -> bytes:
+        key = (index, width)
+        with self._lock:
+            cached = self._images.get(key)
+        if cached is None:
+            w, h = self.resolution
+            if width and width < w:
+                w, h = width, max(1, round(h * width / w))
+            cached = make_product_image(index, w, h)
+            with self._lock:
+                self._images[key] = cached
+        return cached
+
+
+def make_voiceover(path: str, script: str, seconds_per_word: float = 0.35, sample_rate: int = 16000) -> str:
+    """Stand-in for a TTS voiceover: a mono WAV with one short tone per word of ``script``."""
+    words = script.split() or [""]
+    t = np.arange(int(sample_rate * seconds_per_word)) / sample_rate
+    chunks = []
+    for i, _ in enumerate(words):
+        tone = 0.3 * np.sin(2 * np.pi * (220 + 20 * (i % 8)) * t) * np.hanning(len(t))
+        chunks.append((tone * 32767).astype(np.int16))
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(np.concatenate(chunks).tobytes())
+    return path
+
+
+def canned_storyboard(prompt: str) -> str:
+    """Storyboard JSON using every input media item in order, like a well-behaved model."""
+    try:
+        input_json = json.loads(prompt.rsplit("Input:\n", 1)[1])
+    except (IndexError, ValueError):
+        input_json = {}
+    media = input_json.get("media", [])
+    title = input_json.get("product", {}).get("title", "this").split(":")[-1].strip()
+    n = len(media)
+    per = 10 / n if n else 10
+    items = [
+        {"start": f"00:{str(round(i * per)).zfill(2)}", "end": f"00:{str(round((i + 1) * per)).zfill(2)}", "file": m["path"]}
+        for i, m in enumerate(media)
+    ]
+    return json.dumps({"script": f"Meet {title}! Cozy, cute and ready to ship. Grab yours now!", "media": items})
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        fake = self.standin
+        n = fake.count_request()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._reply(404, {"error": {"message": "not found"}})
+        latency = fake.latency(n) if callable(fake.latency) else fake.latency
+        if latency:
+            time.sleep(latency)
+        status = fake.status(n) if fake.status else 200
+        if status == 429:
+            return self._reply(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}},
+                               {"Retry-After": str(fake.retry_after)})
+        if status != 200:
+            return self._reply(status, {"error": {"message": f"fake error {status}"}})
+        request = json.loads(body or b"{}")
+        content = request.get("messages", [{}])[-1].get("content", "")
+        if isinstance(content, list):
+            text = "A soft pink strawberry plush toy photographed on a clean background."
+        else:
+            text = canned_storyboard(content)
+        self._reply(200, {
+            "id": f"chatcmpl-fake-{n}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(text) // 4,
+                      "total_tokens": len(body) // 4 + len(text) // 4},
+        })
+
+    def _reply(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeOpenAIServer(_StandInServer):
+    """Canned ``/v1/chat/completions``. ``latency`` is seconds, or a function of the request number.
+
+    ``status`` maps the request number to the HTTP status to answer with; 429s
+    carry ``Retry-After: retry_after``.
+    """
+
+    handler_class = _FakeOpenAIHandler
+
+    def __init__(self, latency: Union[float, Callable[[int], float]] = 0.0,
+                 status: Optional[Callable[[int], int]] = None, retry_after: float = 1.0):
+        super().__init__()
+        self.latency = latency
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+
+@contextmanager
+def offline_environment(image_count: int = 10, resolution: Tuple[int, int] = (1946, 2594),
+                        openai_latency: Union[float, Callable[[int], float]] = 0.0, site_latency: float = 0.0):
+    """Start both stand-ins and route the OpenAI client to the fake for the duration of the block."""
+    saved = {k: os.environ.get(k) for k in ("OPENAI_BASE_URL", "OPENAI_API_KEY")}
+    with ProductSiteServer(image_count, resolution, site_latency) as site, FakeOpenAIServer(openai_latency) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ["OPENAI_API_KEY"] = "sk-offline-standin"
+        try:
+            yield site, fake
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+
+@contextmanager
+def isolated_uploads(root: str):
+    """Point the app's upload, video and batch directories at ``root`` for the duration of the block."""
+    from .. import main
+    from ..services import workflows
+    root = str(root)
+    video_dir = os.path.join(root, "videos")
+    patches = [(workflows, "UPLOAD_DIR", root), (workflows, "VIDEO_DIR", video_dir),
+               (main, "UPLOAD_DIR", root), (main, "VIDEO_DIR", video_dir),
+               (main, "BATCH_DIR", os.path.join(root, "batches")), (main.prefetcher, "dest_dir", root)]
+    saved = [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+    for obj, name, value in patches:
+        setattr(obj, name, value)
+    try:
+        yield root
+    finally:
+        for obj, name, value in saved:
+            setattr(obj, name, value)
@@ -1,21 +1,48 @@
-from fastapi import FastAPI, UploadFile, File, Form, Body
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi import APIRouter, FastAPI, UploadFile, File, Form, HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Dict, List, Optional
 import os
-from pydantic import BaseModel
-from .tools.scrape_url import scrape_url
-from .tools.analyze_media import analyze_media
-from .tools.generate_storyboard import generate_storyboard
-from .tools.render_video import render_video
+from pydantic import BaseModel, ValidationError
+from .tools.render_video import RenderError
+from .services.pipeline import MAX_STORYBOARD_MEDIA
+from .services.batch_pipeline import BatchJob, load_manifest
+from .services.delivery import resolve_video, video_response
+from .services.llm import LLMError
+from .services.prefetch import prefetcher_from_env
+from .services.job_queue import queue_from_env
+from .services.workflows import (UPLOAD_DIR, VIDEO_DIR, AnalyzeJob, RenderVideoRequest, prepare_storyboard,
+                                 render_storyboard)
+from .utils.metrics import REGISTRY, HTTP_SECONDS, collect_timings, current_spans, summarize_timings
+from .utils.admission import admit, controller_from_env
+from .utils.cancellation import Cancelled, CancelToken, Supersession
+from .utils.startup import API, RENDER, WarmUp, role_from_env, serves
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import requests
-import tempfile
-import shutil
-import json
-import cv2
+import re
+import threading
+from contextlib import asynccontextmanager
+import asyncio
+import uuid
+import time
+import logging
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Heavy libraries are imported where they are used, so the worker answers /healthz right away;
+# the modules of the stacks its role serves are imported in the background after startup
+ROLE = role_from_env()
+warm_up = WarmUp(ROLE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up.start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+# Routes of the two stacks; only those of the worker's role are included (see the end of the module)
+api_router = APIRouter()
+render_router = APIRouter()
 
 # Mount uploads directory for static file serving
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -28,17 +55,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Admission control: requests beyond the concurrency limit queue up to the queue
+# length, after which they are rejected with 429 (503 if they wait too long)
+input_admission = controller_from_env("input", default_concurrent=4, default_queue=16)
+render_admission = controller_from_env("render", default_concurrent=2, default_queue=4)
+
+# Speculative scrape/download/vision for URLs typed into the input form
+prefetcher = prefetcher_from_env(UPLOAD_DIR)
+
+# Durable queue feeding separate worker processes (python -m video_mvp.backend.worker)
+job_queue = queue_from_env(os.path.join(UPLOAD_DIR, "queue.db"))
+
+# A render for a project cancels the project's earlier renders, queued or running. With a
+# debounce, renders wait that long first so a burst of edits starts only the last one
+render_sessions = Supersession("render")
+RENDER_DEBOUNCE = float(os.environ.get("VIDEO_MVP_RENDER_DEBOUNCE", 0))
+
+@app.exception_handler(LLMError)
+async def llm_error_handler(request: Request, exc: LLMError):
+    # The scheduler has already retried; tell the client to come back later
+    logger.warning("[api] LLM call failed: %s", exc)
+    return JSONResponse(status_code=503, content={"detail": f"LLM unavailable: {exc}"}, headers={"Retry-After": "5"})
+
+@app.exception_handler(RenderError)
+async def render_error_handler(request: Request, exc: RenderError):
+    # Nothing was published: a broken file must never get an immutable, long-cached URL
+    logger.warning("[api] Render failed: %s", exc)
+    return JSONResponse(status_code=500, content={"detail": str(exc)})
 
-@app.post("/api/input")
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    # Spans recorded while handling the request are collected for the optional timing breakdown
+    start = time.perf_counter()
+    with collect_timings():
+        response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(time.perf_counter() - start, path=getattr(route, "path", "other"), method=request.method)
+    return response
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(REGISTRY.expose(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz")
+async def healthz(require_warm: bool = False):
+    # Liveness answers at once; with require_warm a worker still importing its stack reports 503
+    status = warm_up.status()
+    status["status"] = "ok" if warm_up.warm or not require_warm else "warming"
+    return JSONResponse(status, status_code=503 if status["status"] == "warming" else 200)
+
+@api_router.post("/api/input", dependencies=[Depends(admit(input_admission))])
 async def input_phase(
     product_url: Optional[str] = Form(None),
     creative_prompt: str = Form(...),
-    media: Optional[List[UploadFile]] = File(None)
+    media: Optional[List[UploadFile]] = File(None),
+    include_timings: bool = Form(False),
+    max_images: int = Form(MAX_STORYBOARD_MEDIA, ge=0)  # scraped images to download and analyze
 ):
-    # Scrape product info if URL provided
-    product_data = scrape_url(product_url) if product_url else {}
     # Save uploaded media
     media_files = []
     media_json = []
@@ -49,119 +122,146 @@ async def input_phase(
                 f.write(await file.read())
             media_files.append(file_path)
             media_json.append({"path": f"uploads/{file.filename}", "description": ""})
-    # Add scraped images to media_json (use local download for analysis)
-    scraped_image_paths = []
-    if product_data.get("images"):
-        for i, img_url in enumerate(product_data["images"]):
-            # Download image locally for analysis
-            local_path = os.path.join(UPLOAD_DIR, f"scraped_{i}.jpg")
-            try:
-                r = requests.get(img_url, timeout=5)
-                with open(local_path, "wb") as f:
-                    f.write(r.content)
-                scraped_image_paths.append(local_path)
-                media_json.append({"path": img_url, "description": ""})
-            except Exception:
-                pass
-    # Analyze all media (uploaded + scraped)
-    all_media_paths = media_files + scraped_image_paths
-    media_descriptions = analyze_media(all_media_paths) if all_media_paths else {}
-    # Fill in media descriptions
-    for m in media_json:
-        # Try to match by filename or URL ending
-        desc = ""
-        for k, v in media_descriptions.items():
-            if m["path"].endswith(os.path.basename(k)) or os.path.basename(m["path"]) in k:
-                desc = v
-                # Also map the URL to the description if it's a URL
-                if m["path"].startswith("http"):
-                    media_descriptions[m["path"]] = v
-                break
-        m["description"] = desc or "Image"
-    # After filling in media descriptions, map each scraped URL to its local file's description
-    if product_data.get("images"):
-        for i, img_url in enumerate(product_data["images"]):
-            local_path = os.path.join(UPLOAD_DIR, f"scraped_{i}.jpg")
-            if local_path in media_descriptions:
-                media_descriptions[img_url] = media_descriptions[local_path]
-    # Remove duplicates by path
-    seen = set()
-    deduped_media = []
-    for m in media_json:
-        if m["path"] not in seen:
-            deduped_media.append(m)
-            seen.add(m["path"])
-    # Build input for storyboard (no images field)
-    input_json = {
-        "creative_prompt": creative_prompt,
-        "product": {
-            "title": product_data.get("title", ""),
-            "description": product_data.get("description", "")
-        },
-        "media": deduped_media
-    }
-    # Generate storyboard (strict JSON)
-    storyboard_json = generate_storyboard(input_json)
-    # --- Combine uploaded and scraped image URLs for media_files ---
-    uploaded_files = media_files if media_files else []
-    scraped_urls = [m["path"] for m in deduped_media if m["path"].startswith("http")]
-    all_media_files = uploaded_files + scraped_urls
-    return JSONResponse({
-        "product": product_data,
-        "creative_prompt": creative_prompt,
-        "media_files": all_media_files,
-        "media_descriptions": media_descriptions,
-        "storyboard": storyboard_json
-    })
-
-class RenderVideoRequest(BaseModel):
-    storyboard: str  # JSON string
-    media_files: List[str]
-
-@app.post("/api/render_video")
+    # Scraping, analysis and the storyboard call block, so keep them off the event loop
+    response = await run_in_threadpool(prepare_storyboard, product_url, creative_prompt, media_files, media_json, max_images)
+    if include_timings:
+        response["timings"] = summarize_timings(current_spans())
+    return JSONResponse(response)
+
+@api_router.post("/api/prefetch", status_code=202)
+async def prefetch_endpoint(
+    product_url: str = Form(...),
+    max_images: int = Form(MAX_STORYBOARD_MEDIA, ge=0)  # must match the later /api/input to be reused
+):
+    # Returns at once; a later /api/input for the URL joins the work in progress
+    return {"status": prefetcher.submit(product_url, max_images)}
+
+@render_router.post("/api/render_video")
 async def render_video_endpoint(req: RenderVideoRequest):
-    # Parse storyboard JSON
-    sb = json.loads(req.storyboard)
-    media_files = []
-    temp_files = []
-    print("[render_video_endpoint] Checking media files for video rendering...")
-    for item in sb.get("media", []):
-        media_path = item["file"]
-        if media_path.startswith("http://") or media_path.startswith("https://"):
-            # Download to temp file, strip query params from extension
-            ext = os.path.splitext(media_path.split("?")[0])[-1] or ".jpg"
-            with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=UPLOAD_DIR) as tmp:
-                try:
-                    r = requests.get(media_path, timeout=10)
-                    tmp.write(r.content)
-                    tmp.flush()
-                    # Validate with OpenCV
-                    tmp_path = tmp.name
-                    img = cv2.imread(tmp_path)
-                    print(f"[render_video_endpoint] Downloaded {media_path} -> {tmp_path}, cv2.imread: {img.shape if img is not None else None}")
-                    if img is not None:
-                        media_files.append(tmp_path)
-                        temp_files.append(tmp_path)
-                    else:
-                        print(f"[render_video_endpoint] Downloaded file is not a valid image: {media_path}")
-                        os.remove(tmp_path)
-                except Exception as e:
-                    print(f"[render_video_endpoint] Failed to download {media_path}: {e}")
-        else:
-            # Local file
-            img = cv2.imread(media_path)
-            print(f"[render_video_endpoint] Local file {media_path}, cv2.imread: {img.shape if img is not None else None}")
-            if img is not None:
-                media_files.append(media_path)
-            else:
-                print(f"[render_video_endpoint] Local file is not a valid image: {media_path}")
-    print(f"[render_video_endpoint] Final media_files for video: {media_files}")
-    output_path = os.path.join(UPLOAD_DIR, "output.mp4")
-    video_path = render_video(req.storyboard, media_files, output_path)
-    # Optionally: cleanup temp files after rendering
-    for f in temp_files:
+    # The render registers before queueing for admission so a newer edit can cancel it there too
+    with render_sessions.begin(req.project_id) as token:
+        try:
+            response = await token.guard(_admitted_render(req, token))
+        except Cancelled:
+            raise HTTPException(status_code=409, detail="Superseded by a newer render for this project")
+    if req.include_timings:
+        response["timings"] = summarize_timings(current_spans())
+    return JSONResponse(response)
+
+async def _admitted_render(req: RenderVideoRequest, token: CancelToken) -> Dict:
+    if RENDER_DEBOUNCE and req.project_id:
+        await asyncio.sleep(RENDER_DEBOUNCE)
+    await render_admission.acquire()
+    # The render thread gives the slot back when it finishes: a superseded request returns 409
+    # at once, but its render keeps the CPU until it next checks its token
+    claim = threading.Lock()
+
+    def render() -> Dict:
+        if not claim.acquire(blocking=False):
+            raise Cancelled("superseded before the render started")
         try:
-            os.remove(f)
-        except Exception:
-            pass
-    return JSONResponse({"video_path": video_path}) 
\ No newline at end of file
+            return render_storyboard(req, token)
+        finally:
+            render_admission.release()
+
+    try:
+        # Downloads, decoding and the encode are blocking; run them in the threadpool
+        return await run_in_threadpool(render)
+    except BaseException:
+        # Cancelled before a thread picked the render up, so the slot is still ours
+        if claim.acquire(blocking=False):
+            render_admission.release()
+        raise
+
+@app.api_route("/videos/{name:path}", methods=["GET", "HEAD"])
+async def video_endpoint(name: str, request: Request):
+    path = resolve_video(name, VIDEO_DIR)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return video_response(request, name, path)
+
+class BatchItem(BaseModel):
+    product_url: Optional[str] = None
+    creative_prompt: str
+    id: Optional[str] = None
+    max_images: Optional[int] = None  # scraped images to download and analyze (default 10)
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: Optional[Dict[str, int]] = None  # per-stage worker limits
+    batch_id: Optional[str] = None  # reuse an id to resume an earlier batch
+
+BATCH_DIR = os.path.join(UPLOAD_DIR, "batches")
+# Batch ids name a directory under BATCH_DIR, so nothing that could leave it is accepted
+BATCH_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def _checked_batch_id(batch_id: str) -> str:
+    if not BATCH_ID_RE.match(batch_id):
+        raise HTTPException(status_code=422, detail="batch_id must be 1-64 letters, digits, '_' or '-'")
+    return batch_id
+batch_jobs: Dict[str, BatchJob] = {}
+
+@api_router.post("/api/batch")
+async def batch_endpoint(req: BatchRequest):
+    batch_id = _checked_batch_id(req.batch_id) if req.batch_id is not None else uuid.uuid4().hex[:12]
+    existing = batch_jobs.get(batch_id)
+    if existing and existing.status == "running":
+        raise HTTPException(status_code=409, detail=f"Batch {batch_id} is already running")
+    job = BatchJob(
+        [item.model_dump() for item in req.items],
+        output_dir=os.path.join(BATCH_DIR, batch_id),
+        media_dir=UPLOAD_DIR,
+        concurrency=req.concurrency,
+        batch_id=batch_id,
+    )
+    batch_jobs[batch_id] = job
+    threading.Thread(target=job.run, name=f"batch-{batch_id}", daemon=True).start()
+    return JSONResponse({"batch_id": batch_id, "manifest_path": job.manifest_path, "items": len(job.items)})
+
+@api_router.get("/api/batch/{batch_id}")
+async def batch_status_endpoint(batch_id: str):
+    batch_id = _checked_batch_id(batch_id)
+    job = batch_jobs.get(batch_id)
+    if job:
+        return JSONResponse(job.manifest())
+    # Fall back to a manifest left on disk by an earlier process or the CLI
+    manifest = load_manifest(os.path.join(BATCH_DIR, batch_id, "manifest.json"))
+    if manifest is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+    return JSONResponse(manifest)
+
+# Payload schema per job kind; workers run them with prepare_storyboard / render_storyboard
+JOB_PAYLOADS = {"analyze": AnalyzeJob, "render": RenderVideoRequest}
+
+class JobRequest(BaseModel):
+    kind: str
+    payload: Dict
+    key: Optional[str] = None  # idempotency key; defaults to a hash of kind + payload
+
+def _job_view(job: Dict) -> Dict:
+    return {k: job[k] for k in ("id", "kind", "status", "attempts", "result", "error")}
+
+@api_router.post("/api/jobs", status_code=202)
+async def enqueue_job(req: JobRequest):
+    model = JOB_PAYLOADS.get(req.kind)
+    if model is None:
+        raise HTTPException(status_code=422, detail=f"Unknown job kind {req.kind!r}; expected one of {sorted(JOB_PAYLOADS)}")
+    try:
+        # Normalized, so equivalent payloads hash to the same key
+        payload = model(**req.payload).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    job = await run_in_threadpool(job_queue.enqueue, req.kind, payload, req.key)
+    return _job_view(job)
+
+@api_router.get("/api/jobs/{job_id}")
+async def job_status_endpoint(job_id: str):
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return _job_view(job)
+
+if serves(ROLE, API):
+    app.include_router(api_router)
+if serves(ROLE, RENDER):
+    app.include_router(render_router)
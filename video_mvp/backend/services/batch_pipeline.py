@@ -0,0 +1,248 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from .pipeline import scrape_product, select_images, download_images, dedupe_downloads, describe_media, build_storyboard_input, MAX_STORYBOARD_MEDIA
+from .llm import BULK, llm_priority
+from ..tools.generate_storyboard import generate_storyboard
+from ..tools.render_video import is_valid_video, render_video
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["scrape", "analyze", "storyboard", "render"]
+DEFAULT_CONCURRENCY = {"scrape": 4, "analyze": 4, "storyboard": 2, "render": 1}
+
+StageFn = Callable[[Dict], Optional[Dict]]
+
+
+class StagedPipeline:
+    """Run items through ordered stages, each stage with its own bounded worker pool.
+
+    An item moves to the next stage as soon as the previous one finishes, so
+    stages overlap across items and throughput is bounded by the slowest stage
+    rather than by the sum of all stage latencies. Stages already listed in an
+    item's ``completed`` list are skipped, which makes runs resumable.
+    """
+
+    def __init__(self, stages: List[Tuple[str, StageFn, int]],
+                 on_progress: Optional[Callable[[Dict], None]] = None,
+                 lock: Optional[threading.RLock] = None):
+        self.stages = stages
+        self.on_progress = on_progress
+        # Guards item state; stage functions run outside it, progress callbacks inside it
+        self.lock = lock or threading.RLock()
+
+    def run(self, items: List[Dict]) -> List[Dict]:
+        pools = {
+            name: ThreadPoolExecutor(max_workers=max(1, limit), thread_name_prefix=f"batch-{name}")
+            for name, _, limit in self.stages
+        }
+        all_done = threading.Event()
+        remaining = [len(items)]
+
+        def finish(item: Dict) -> None:
+            # Called with self.lock held
+            self._progress(item)
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                all_done.set()
+
+        def advance(item: Dict, idx: int) -> None:
+            # Called with self.lock held
+            completed = item.setdefault("completed", [])
+            while idx < len(self.stages) and self.stages[idx][0] in completed:
+                idx += 1
+            if idx == len(self.stages):
+                item["status"] = "done"
+                finish(item)
+                return
+            item["status"] = f"queued:{self.stages[idx][0]}"
+            pools[self.stages[idx][0]].submit(run_stage, item, idx)
+
+        def run_stage(item: Dict, idx: int) -> None:
+            name, fn, _ = self.stages[idx]
+            with self.lock:
+                item["status"] = f"running:{name}"
+            start = time.perf_counter()
+            try:
+                outputs, error = fn(item), None
+            except Exception as e:
+                outputs, error = None, e
+            elapsed = round(time.perf_counter() - start, 3)
+            with self.lock:
+                item.setdefault("timings", {})[name] = elapsed
+                if error is not None:
+                    item["status"] = "failed"
+                    item["error"] = f"{name}: {error}"
+                    finish(item)
+                    return
+                item.setdefault("outputs", {}).update(outputs or {})
+                item["completed"].append(name)
+                self._progress(item)
+                advance(item, idx + 1)
+
+        try:
+            if not items:
+                return items
+            with self.lock:
+                for item in items:
+                    item.pop("error", None)
+                    advance(item, 0)
+            all_done.wait()
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+        return items
+
+    def _progress(self, item: Dict) -> None:
+        if not self.on_progress:
+            return
+        try:
+            self.on_progress(item)
+        except Exception:
+            # The item still has to finish (or advance), or run() would wait forever
+            logger.exception("[batch] Progress callback failed for item %s", item.get("id"))
+
+
+def batch_item_id(item: Dict) -> str:
+    """Idempotent key for a batch item (explicit id, or hash of URL + prompt)."""
+    if item.get("id"):
+        return str(item["id"])
+    raw = f"{item.get('product_url') or ''}|{item.get('creative_prompt') or ''}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+class BatchJob:
+    """A batch of product videos rendered through scrape -> analyze -> storyboard -> render.
+
+    Progress is written to ``<output_dir>/manifest.json`` after every stage; running
+    a job again against the same output directory resumes from the manifest.
+    """
+
+    def __init__(self, items: List[Dict], output_dir: str, media_dir: str = "uploads",
+                 concurrency: Optional[Dict[str, int]] = None, batch_id: Optional[str] = None):
+        self.output_dir = output_dir
+        self.media_dir = media_dir
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        self.concurrency.update(concurrency or {})
+        self.manifest_path = os.path.join(output_dir, "manifest.json")
+        self._lock = threading.RLock()
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(media_dir, exist_ok=True)
+        previous = load_manifest(self.manifest_path) or {}
+        self.batch_id = batch_id or previous.get("batch_id") or uuid.uuid4().hex[:12]
+        done_before = {it["id"]: it for it in previous.get("items", [])}
+        self.items = []
+        for raw in items:
+            item_id = batch_item_id(raw)
+            item = done_before.get(item_id) or {
+                "id": item_id,
+                "product_url": raw.get("product_url"),
+                "creative_prompt": raw.get("creative_prompt", ""),
+                "media": list(raw.get("media") or []),
+                "max_images": raw.get("max_images"),
+            }
+            video_path = item.get("outputs", {}).get("video_path")
+            # Re-render outputs that are missing or broken (e.g. left by an older failed run)
+            if "render" in item.get("completed", []) and not (video_path and is_valid_video(video_path)):
+                item["completed"].remove("render")
+            self.items.append(item)
+        self.status = "pending"
+        self.elapsed = None
+
+    # --- Stages ---
+    def _scrape(self, item: Dict) -> Dict:
+        url = item.get("product_url")
+        return {"product": scrape_product(url) if url else {}}
+
+    def _analyze(self, item: Dict) -> Dict:
+        product = item["outputs"].get("product", {})
+        max_images = item.get("max_images")
+        image_urls = select_images(product, MAX_STORYBOARD_MEDIA if max_images is None else int(max_images))
+        scraped, dedup_stats = dedupe_downloads(download_images(image_urls, self.media_dir))
+        local_media = [p for p in item.get("media", []) if os.path.exists(p)]
+        local_files = {p: p for p in local_media}
+        local_files.update({url: path for url, path in scraped})
+        # Batch LLM calls yield to interactive /api/input calls
+        with llm_priority(BULK):
+            descriptions = describe_media(list(local_files.values())) if local_files else {}
+        media = [
+            {"path": ref, "description": descriptions.get(path) or "Image"}
+            for ref, path in local_files.items()
+        ]
+        return {"media": media, "local_files": local_files, "dedup": dedup_stats}
+
+    def _storyboard(self, item: Dict) -> Dict:
+        outputs = item["outputs"]
+        input_json = build_storyboard_input(item["creative_prompt"], outputs.get("product", {}), outputs.get("media", []))
+        with llm_priority(BULK):
+            return {"storyboard": generate_storyboard(input_json)}
+
+    def _render(self, item: Dict) -> Dict:
+        outputs = item["outputs"]
+        local_files = outputs.get("local_files", {})
+        sb = json.loads(outputs["storyboard"])
+        media_files = [local_files.get(m["file"], m["file"]) for m in sb.get("media", [])]
+        output_path = os.path.join(self.output_dir, f"{item['id']}.mp4")
+        return {"video_path": render_video(outputs["storyboard"], media_files, output_path)}
+
+    # --- Running / reporting ---
+    def run(self) -> Dict:
+        self.status = "running"
+        self._write_manifest()
+        stage_fns = {"scrape": self._scrape, "analyze": self._analyze,
+                     "storyboard": self._storyboard, "render": self._render}
+        pipeline = StagedPipeline(
+            [(name, stage_fns[name], self.concurrency.get(name, 1)) for name in STAGES],
+            on_progress=lambda _: self._write_manifest(),
+            lock=self._lock,
+        )
+        start = time.perf_counter()
+        pipeline.run(self.items)
+        self.elapsed = round(time.perf_counter() - start, 3)
+        self.status = "failed" if any(it.get("status") == "failed" for it in self.items) else "done"
+        return self._write_manifest()
+
+    def manifest(self) -> Dict:
+        with self._lock:
+            return json.loads(json.dumps(self._manifest()))
+
+    def _manifest(self) -> Dict:
+        stage_seconds = {name: 0.0 for name in STAGES}
+        for item in self.items:
+            for name, seconds in item.get("timings", {}).items():
+                stage_seconds[name] = round(stage_seconds.get(name, 0.0) + seconds, 3)
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "concurrency": self.concurrency,
+            "elapsed_seconds": self.elapsed,
+            "stage_seconds": stage_seconds,
+            "counts": {
+                "total": len(self.items),
+                "done": sum(1 for it in self.items if it.get("status") == "done"),
+                "failed": sum(1 for it in self.items if it.get("status") == "failed"),
+            },
+            "items": self.items,
+        }
+
+    def _write_manifest(self) -> Dict:
+        with self._lock:
+            manifest = self._manifest()
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        return manifest
+
+
+def load_manifest(manifest_path: str) -> Optional[Dict]:
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
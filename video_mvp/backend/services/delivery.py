@@ -0,0 +1,130 @@
+"""Immutable, cache-friendly delivery of rendered videos.
+
+Renders are published under a name derived from their content hash, so a URL
+never changes meaning: responses carry a strong ETag and a one-year
+``immutable`` Cache-Control, and browsers/CDNs can cache them safely. Range
+requests (seeking) are served by ``FileResponse``, which also uses the ASGI
+``pathsend`` zero-copy extension when the server offers it.
+"""
+from typing import Dict, Optional
+import errno
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import uuid
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from ..utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+VIDEO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+}
+# <hash>.mp4, or files of the <hash>/ HLS package
+_NAME_RE = re.compile(r"^(?P<digest>[0-9a-f]{16})(\.mp4|/(index\.m3u8|init\.mp4|seg_\d{4}\.m4s))$")
+
+
+class VideoFileResponse(FileResponse):
+    # Larger reads than the 64KB default for range requests on multi-megabyte videos
+    chunk_size = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:16]
+
+
+def publish_video(src_path: str, video_dir: str, segmented: bool = False) -> Dict[str, str]:
+    """Move a finished render to its content-addressed name (reusing an identical earlier render)."""
+    os.makedirs(video_dir, exist_ok=True)
+    digest = file_digest(src_path)
+    name = f"{digest}.mp4"
+    dest = os.path.join(video_dir, name)
+    if os.path.exists(dest):
+        os.remove(src_path)
+    else:
+        _move_into(src_path, dest)
+    published = {"path": dest, "url": f"/videos/{name}", "etag": f'"{digest}"'}
+    if segmented:
+        playlist = package_hls(dest, os.path.join(video_dir, digest))
+        if playlist:
+            published["hls_url"] = f"/videos/{digest}/index.m3u8"
+    return published
+
+
+def _move_into(src_path: str, dest: str) -> None:
+    try:
+        os.replace(src_path, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # The video directory is shared storage on another filesystem: copy next to the
+        # destination and rename, so readers on other hosts never see a partial file
+        tmp = f"{dest}.{uuid.uuid4().hex[:8]}.tmp"
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, dest)
+        os.remove(src_path)
+
+
+def package_hls(mp4_path: str, out_dir: str, segment_seconds: int = 2) -> Optional[str]:
+    """Segment an H.264 MP4 into HLS with fMP4 segments (stream copy, no re-encode)."""
+    playlist = os.path.join(out_dir, "index.m3u8")
+    if os.path.exists(playlist):
+        return playlist
+    # Workers sharing the video directory may package the same render at once
+    tmp_dir = f"{out_dir}.{uuid.uuid4().hex[:8]}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    cmd = [
+        "ffmpeg", "-y", "-i", mp4_path, "-c", "copy",
+        "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+        "-hls_segment_filename", os.path.join(tmp_dir, "seg_%04d.m4s"),
+        os.path.join(tmp_dir, "index.m3u8"),
+    ]
+    try:
+        with span("hls_package"):
+            subprocess.run(cmd, check=True, capture_output=True)
+        os.replace(tmp_dir, out_dir)
+        return playlist
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if os.path.exists(playlist):
+            return playlist  # another worker published it first
+        logger.warning("[delivery] HLS packaging failed for %s: %s", mp4_path, e)
+        return None
+
+
+def resolve_video(name: str, video_dir: str) -> Optional[str]:
+    """Map a /videos/ name to a file, refusing anything that is not a published artifact."""
+    if not _NAME_RE.match(name):
+        return None
+    path = os.path.join(video_dir, *name.split("/"))
+    return path if os.path.isfile(path) else None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def video_response(request: Request, name: str, path: str) -> Response:
+    digest = _NAME_RE.match(name).group("digest")
+    # The package files share their video's digest, so qualify their tags with the file name
+    etag = f'"{digest}"' if name.endswith(".mp4") and "/" not in name else f'"{digest}-{os.path.basename(name)}"'
+    headers = {"ETag": etag, "Cache-Control": VIDEO_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = MEDIA_TYPES.get(os.path.splitext(path)[1], "application/octet-stream")
+    return VideoFileResponse(path, media_type=media_type, headers=headers)
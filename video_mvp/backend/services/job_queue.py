@@ -0,0 +1,313 @@
+"""Durable job queue shared by the API tier and worker processes.
+
+Jobs live in one SQLite database in WAL mode, so the API and any number of
+worker processes on the same host can use it at once. The queue is
+single-host only: WAL coordinates through shared memory next to the database
+file, which does not work across machines or over NFS/SMB, so never point
+workers on other boxes at a shared copy of the file. A worker ``claim``s a job
+under a lease and keeps the lease alive with ``heartbeat`` while it runs; if
+the worker dies, the lease runs out and the job is handed to another worker.
+Delivery is therefore at-least-once: handlers must be safe to run twice,
+which renders are (their output is published under its content hash).
+
+Every job has a key. Enqueueing a key that is already queued, running or
+done returns the existing job instead of adding a second one; a failed job
+is queued again.
+"""
+from typing import Callable, Dict, Iterable, Optional
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from ..utils.cancellation import Cancelled, CancelToken, cancel_scope
+from ..utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUEUE_JOBS = REGISTRY.counter("video_mvp_queue_jobs_total", "Queued jobs by kind and outcome.")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+Handler = Callable[[Dict], Optional[Dict]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, kind, available_at);
+"""
+
+
+def job_key(kind: str, payload: Dict) -> str:
+    """Idempotent key for a job without an explicit one (hash of kind + payload)."""
+    raw = kind + "|" + json.dumps(payload, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    """A SQLite-backed queue with leases, retries and idempotent job keys."""
+
+    def __init__(self, path: str, lease_seconds: float = 60.0, max_attempts: int = 3,
+                 retry_seconds: float = 5.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; the schema is created on first use, not at import
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so two workers never claim the same job
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def enqueue(self, kind: str, payload: Dict, key: Optional[str] = None,
+                max_attempts: Optional[int] = None) -> Dict:
+        """Add a job, or return the existing one for ``key`` (re-queued if it had failed)."""
+        job_id = key or job_key(kind, payload)
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, payload, status, max_attempts, available_at, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload), QUEUED, max_attempts or self.max_attempts, now, now, now))
+                outcome = "enqueued"
+            elif row["status"] == FAILED:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, error = NULL, updated_at = ?"
+                    " WHERE id = ?", (QUEUED, now, now, job_id))
+                outcome = "requeued"
+            else:
+                outcome = "duplicate"
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        QUEUE_JOBS.inc(kind=kind, outcome=outcome)
+        if row is not None and row["kind"] != kind:
+            logger.warning("[job_queue] Key %s is already used by a %s job", job_id, row["kind"])
+        return self.get(job_id)
+
+    def claim(self, worker: str, kinds: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """Lease the oldest ready job (of ``kinds``), including jobs whose lease ran out."""
+        now = time.time()
+        kinds = list(kinds) if kinds else None
+        kind_filter = f" AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        conn = self._transaction()
+        try:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = ? AND available_at <= ?{kind_filter}"
+                " ORDER BY available_at, created_at LIMIT 1", [QUEUED, now] + (kinds or [])).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_until = ?,"
+                    " updated_at = ? WHERE id = ?", (RUNNING, worker, now + self.lease_seconds, now, row["id"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"]) if row is not None else None
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float) -> None:
+        # A worker that stopped heartbeating is presumed dead: its job is delivered again,
+        # unless that was its last attempt
+        expired = conn.execute("SELECT id, kind, attempts, max_attempts, lease_owner FROM jobs"
+                               " WHERE status = ? AND lease_until < ?", (RUNNING, now)).fetchall()
+        for row in expired:
+            last = row["attempts"] >= row["max_attempts"]
+            conn.execute("UPDATE jobs SET status = ?, lease_owner = NULL, lease_until = NULL, available_at = ?,"
+                         " error = ?, updated_at = ? WHERE id = ?",
+                         (FAILED if last else QUEUED, now, f"lease lost by {row['lease_owner']}", now, row["id"]))
+            QUEUE_JOBS.inc(kind=row["kind"], outcome="lease_expired")
+            logger.warning("[job_queue] Lease on %s (%s) by %s expired; %s", row["id"], row["kind"],
+                           row["lease_owner"], "giving up" if last else "redelivering")
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """Extend the lease. False if the worker no longer holds it (the job went to someone else)."""
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+            (now + self.lease_seconds, now, job_id, RUNNING, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: Optional[Dict] = None) -> bool:
+        """Record the result. Ignored (False) if the lease was lost meanwhile."""
+        return self._finish(job_id, worker, DONE, result=result)
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        """Retry the job after a backoff, or mark it failed once its attempts are used up."""
+        job = self.get(job_id)
+        retry = job is not None and job["attempts"] < job["max_attempts"]
+        delay = self.retry_seconds * 2 ** max(0, (job or {}).get("attempts", 1) - 1)
+        return self._finish(job_id, worker, QUEUED if retry else FAILED, error=error, delay=delay)
+
+    def _finish(self, job_id: str, worker: str, status: str, result: Optional[Dict] = None,
+                error: Optional[str] = None, delay: float = 0.0) -> bool:
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, available_at = ?, lease_owner = NULL,"
+            " lease_until = NULL, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+            (status, json.dumps(result) if result is not None else None, error, now + delay, now,
+             job_id, RUNNING, worker))
+        finished = cursor.rowcount == 1
+        if finished:
+            QUEUE_JOBS.inc(kind=self.get(job_id)["kind"], outcome="retry" if status == QUEUED else status)
+        else:
+            logger.warning("[job_queue] %s no longer holds %s; dropping its %s", worker, job_id, status)
+        return finished
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll: float = 0.1) -> Optional[Dict]:
+        """Poll until the job is done or failed (or ``timeout`` passes); returns its last state."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll)
+
+
+class Worker:
+    """Pulls jobs of the kinds it has handlers for and runs them, ``concurrency`` at a time.
+
+    While a handler runs, its lease is renewed every third of the lease period.
+    If a renewal finds the job was handed to another worker, the handler's
+    ``CancelToken`` fires (killing e.g. a running ffmpeg) and its result is dropped.
+    """
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Handler], name: Optional[str] = None,
+                 concurrency: int = 1, poll_seconds: float = 0.5):
+        self.queue = queue
+        self.handlers = handlers
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self.processed = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self, until_idle: bool = False) -> int:
+        """Work until ``stop()`` (or, with ``until_idle``, until no job is ready). Returns jobs processed."""
+        threads = [threading.Thread(target=self._loop, args=(f"{self.name}-{i}", until_idle),
+                                    name=f"worker-{i}", daemon=True) for i in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.processed
+
+    def stop(self) -> None:
+        """Finish the jobs in hand and take no new ones."""
+        self._stop.set()
+
+    def _loop(self, slot: str, until_idle: bool) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(slot, self.handlers)
+            except sqlite3.Error as e:
+                logger.warning("[worker] Claim failed: %s", e)
+                job = None
+            if job is None:
+                if until_idle:
+                    return
+                self._stop.wait(self.poll_seconds)
+                continue
+            self.process(job, slot)
+            with self._lock:
+                self.processed += 1
+
+    def process(self, job: Dict, slot: str) -> None:
+        token = CancelToken()
+        done = threading.Event()
+
+        def keep_lease() -> None:
+            while not done.wait(self.queue.lease_seconds / 3):
+                if not self.queue.heartbeat(job["id"], slot):
+                    logger.warning("[worker] Lost the lease on %s; cancelling it here", job["id"])
+                    token.cancel()
+                    return
+
+        heartbeat = threading.Thread(target=keep_lease, name=f"lease-{job['id']}", daemon=True)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            with cancel_scope(token):
+                result = self.handlers[job["kind"]](job["payload"])
+        except Cancelled:
+            return  # the job now belongs to another worker
+        except Exception as e:
+            logger.warning("[worker] %s job %s failed (attempt %d/%d): %s", job["kind"], job["id"],
+                           job["attempts"], job["max_attempts"], e)
+            self.queue.fail(job["id"], slot, f"{type(e).__name__}: {e}")
+            return
+        finally:
+            done.set()
+            heartbeat.join()
+        self.queue.complete(job["id"], slot, result)
+        logger.info("[worker] %s job %s done in %.2fs", job["kind"], job["id"], time.perf_counter() - start)
+
+
+def queue_from_env(default_path: str, path: Optional[str] = None) -> JobQueue:
+    """Queue database ``path``, else ``VIDEO_MVP_QUEUE_PATH``; lease and attempts from ``VIDEO_MVP_QUEUE_LEASE``/``_MAX_ATTEMPTS``."""
+    return JobQueue(
+        path or os.environ.get("VIDEO_MVP_QUEUE_PATH", default_path),
+        lease_seconds=float(os.environ.get("VIDEO_MVP_QUEUE_LEASE", 60)),
+        max_attempts=int(os.environ.get("VIDEO_MVP_QUEUE_MAX_ATTEMPTS", 3)),
+    )
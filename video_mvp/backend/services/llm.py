@@ -0,0 +1,443 @@
+"""Process-wide scheduler for OpenAI chat calls.
+
+Every LLM call in the process goes through one ``LLMScheduler`` and one
+reused client. Calls wait for a concurrency slot and for request and token
+budgets (token buckets refilled per minute), interactive calls ahead of
+bulk ones. A 429 pauses all calls for the provider's Retry-After instead
+of letting every thread hammer it, and identical calls already in flight
+share one request. Failures surface as ``LLMError`` after retries rather
+than as text that looks like model output.
+
+Each call also has a latency budget. A call still running at the p95
+latency of its stage is hedged with a duplicate request (the first answer
+wins), within a hedge budget of a fraction of all calls. If the deadline
+runs out, the last good answer to the same call or the caller's fallback is
+returned instead.
+"""
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from ..utils.cache import MemoCache
+from ..utils.metrics import span, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = {INTERACTIVE: 0, BULK: 1}
+
+# Rough prompt cost of one image part (a high-detail image is 85 + 170 per 512px tile)
+IMAGE_TOKENS = 765
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 20.0
+# Hedging starts once a stage has this many latency samples; the window keeps the most recent ones
+MIN_LATENCY_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Unused hedge budget carries over up to this many hedges
+MAX_HEDGE_CREDIT = 5.0
+
+LLM_CALLS = REGISTRY.counter("video_mvp_llm_calls_total", "LLM calls by lane and outcome.")
+LLM_WAIT = REGISTRY.histogram("video_mvp_llm_wait_seconds", "Time LLM calls waited for a slot and rate budget.")
+LLM_HEDGES = REGISTRY.counter("video_mvp_llm_hedges_total", "Hedged LLM requests sent, and how many answered first.")
+LLM_HEDGE_SAVED = REGISTRY.counter("video_mvp_llm_hedge_saved_seconds_total",
+                                   "Latency saved by hedges that answered before the original request.")
+LLM_DEADLINES = REGISTRY.counter("video_mvp_llm_deadline_exceeded_total",
+                                 "LLM calls that ran out of time, by what was returned instead.")
+
+
+class LLMError(RuntimeError):
+    """An LLM call failed for good (after retries, or with a non-retryable error)."""
+
+
+class LLMDeadlineExceeded(LLMError):
+    """An LLM call did not finish within its latency budget."""
+
+
+class LatencyWindow:
+    """Recent successful call latencies of one stage."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The ``q`` quantile, or None until there are enough samples to trust it."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class TokenBucket:
+    """Refills at ``per_minute`` units a minute up to one minute's worth. A rate of 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.available = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` is available (0 if it is now)."""
+        if not self.per_minute:
+            return 0.0
+        self._refill(now)
+        # A single call larger than the bucket only waits for a full bucket
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing * 60.0 / self.per_minute)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.per_minute:
+            self._refill(now)
+            self.available -= amount
+
+
+_lane: contextvars.ContextVar = contextvars.ContextVar("video_mvp_llm_lane", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(lane: str) -> Iterator[None]:
+    """Run LLM calls made in this context in ``lane`` (``INTERACTIVE`` or ``BULK``)."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown LLM lane {lane!r}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+    """Prompt tokens (~4 characters each, images at a flat rate) plus the completion budget."""
+    tokens = max_tokens
+    for message in messages:
+        content = message.get("content", "")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += len(part.get("text", "")) // 4 + 1
+    return tokens
+
+
+def _retry_after(error: "openai.APIStatusError") -> Optional[float]:
+    headers = getattr(error.response, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass  # an HTTP date; fall back to exponential backoff
+    return None
+
+
+class LLMScheduler:
+    """Rate-limited, prioritized and coalescing front for ``chat.completions.create``."""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrent: int = 8, max_retries: int = 4, deadline: float = 60.0,
+                 hedge_ratio: float = 0.1, hedge_after: Optional[float] = None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_retries = max(0, max_retries)
+        self.deadline = deadline
+        # Each call earns ``hedge_ratio`` of a hedge; ``hedge_after`` fixes the hedge delay instead of the p95
+        self.hedge_ratio = hedge_ratio
+        self.hedge_after = hedge_after
+        self._hedge_credit = 0.0
+        self._latency: Dict[str, LatencyWindow] = {}
+        self._counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "saved_s": 0.0}
+        # Last good answer per call, returned when a later identical call runs out of time
+        self._answers = MemoCache(max_entries=1024, name="llm_answer")
+        self._pool = ThreadPoolExecutor(max_workers=4 * self.max_concurrent, thread_name_prefix="llm")
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._active = 0
+        self._blocked_until = 0.0
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._inflight: Dict[str, Future] = {}
+        self._client = None
+        self._client_config = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> "openai.OpenAI":
+        """The shared client, rebuilt only if the OpenAI endpoint or key in the environment changes."""
+        import openai  # ~0.6s to import; only processes that call the LLM pay for it
+        config = (os.environ.get("OPENAI_BASE_URL"), os.environ.get("OPENAI_API_KEY"))
+        with self._client_lock:
+            if self._client is None or config != self._client_config:
+                # Retries are ours: they have to respect the shared rate budget
+                self._client = openai.OpenAI(max_retries=0)
+                self._client_config = config
+            return self._client
+
+    def chat(self, messages: List[Dict], model: str = "gpt-4o", max_tokens: int = 256,
+             lane: Optional[str] = None, stage: str = "llm_call", nbytes: Optional[int] = None,
+             deadline: Optional[float] = None, fallback: Optional[str] = None) -> str:
+        """Run one chat completion and return the message content. Raises ``LLMError``.
+
+        If ``deadline`` seconds (default: the scheduler's) pass first, the last
+        good answer to the same call is returned, else ``fallback``, else
+        ``LLMDeadlineExceeded`` is raised.
+        """
+        lane = lane or current_lane()
+        key = hashlib.sha1(json.dumps([model, messages, max_tokens], sort_keys=True).encode("utf-8")).hexdigest()
+        with self._cond:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            LLM_CALLS.inc(lane=lane, outcome="coalesced")
+            return future.result()
+        try:
+            try:
+                content = self._hedged(key, (messages, model, max_tokens, lane, stage, nbytes),
+                                       self.deadline if deadline is None else deadline)
+            except LLMDeadlineExceeded:
+                content = self._answers.get(key)
+                LLM_DEADLINES.inc(stage=stage, result="none" if content is None and fallback is None
+                                  else "cached" if content is not None else "fallback")
+                if content is None:
+                    content = fallback
+                if content is None:
+                    raise
+                logger.warning("[llm] %s call ran out of time, using the %s answer", stage,
+                               "fallback" if content is fallback else "cached")
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(content)
+            return content
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+
+    def _hedged(self, key: str, call: Tuple, deadline: float) -> str:
+        """Run ``call`` and, if it is slow, a duplicate; return the first answer."""
+        stage = call[4]
+        start = time.monotonic()
+        deadline_at = start + deadline
+        window = self._latency.setdefault(stage, LatencyWindow())
+        answers: "queue.Queue" = queue.Queue()
+        finished: Dict[str, Tuple[float, bool]] = {}
+        lock = threading.Lock()
+
+        def attempt(name: str) -> None:
+            try:
+                result = (name, self._call(*call, deadline_at=deadline_at), None)
+            except Exception as e:
+                result = (name, None, e)
+            elapsed = time.monotonic() - start
+            with lock:
+                finished[name] = (elapsed, result[2] is None)
+                if name == "primary" and result[2] is None:
+                    window.record(elapsed)
+                hedge = finished.get("hedge")
+                if len(finished) == 2 and hedge[1] and hedge[0] < finished["primary"][0]:
+                    self._record_saved(stage, finished["primary"][0] - hedge[0])
+            answers.put(result)
+
+        with self._cond:
+            self._counts["calls"] += 1
+            self._hedge_credit = min(MAX_HEDGE_CREDIT, self._hedge_credit + self.hedge_ratio)
+        # Attempts run in a copy of this context so their spans land in the caller's request
+        self._pool.submit(contextvars.copy_context().run, attempt, "primary")
+        launched, errors = 1, []
+        hedge_at = self.hedge_after if self.hedge_after is not None else window.percentile(0.95)
+        while True:
+            now = time.monotonic()
+            if now >= deadline_at:
+                raise LLMDeadlineExceeded(f"{call[1]} call exceeded its {deadline:.1f}s budget")
+            wait = deadline_at - now
+            if hedge_at is not None:
+                wait = min(wait, max(0.0, start + hedge_at - now))
+            try:
+                name, content, error = answers.get(timeout=wait)
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() >= start + hedge_at:
+                    hedge_at = None  # one hedge per call at most
+                    if self._take_hedge(stage):
+                        self._pool.submit(contextvars.copy_context().run, attempt, "hedge")
+                        launched += 1
+                continue
+            if error is None:
+                if name == "hedge":
+                    LLM_HEDGES.inc(stage=stage, outcome="won")
+                    with self._cond:
+                        self._counts["hedge_wins"] += 1
+                self._answers.set(key, content)
+                return content
+            errors.append(error)
+            if len(errors) == launched:
+                # Every request sent has failed (each after its own retries)
+                raise errors[0]
+
+    def _take_hedge(self, stage: str) -> bool:
+        with self._cond:
+            if self._hedge_credit < 1.0:
+                return False
+            self._hedge_credit -= 1.0
+            self._counts["hedges"] += 1
+        LLM_HEDGES.inc(stage=stage, outcome="sent")
+        return True
+
+    def _record_saved(self, stage: str, seconds: float) -> None:
+        LLM_HEDGE_SAVED.inc(seconds, stage=stage)
+        with self._cond:
+            self._counts["saved_s"] += seconds
+
+    def _call(self, messages: List[Dict], model: str, max_tokens: int, lane: str, stage: str,
+              nbytes: Optional[int], deadline_at: Optional[float] = None) -> str:
+        import openai
+        estimate = estimate_tokens(messages, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            self._acquire(lane, estimate, deadline_at)
+            try:
+                # The request itself gives up when the call's budget does
+                timeout = max(0.1, deadline_at - time.monotonic()) if deadline_at else openai.NOT_GIVEN
+                with span(stage, bytes=nbytes):
+                    response = self.client.chat.completions.create(model=model, messages=messages,
+                                                                   max_tokens=max_tokens, timeout=timeout)
+                LLM_CALLS.inc(lane=lane, outcome="ok")
+                usage = getattr(response, "usage", None)
+                if usage is not None and usage.total_tokens:
+                    self._settle(usage.total_tokens - estimate)
+                return response.choices[0].message.content
+            except openai.RateLimitError as e:
+                LLM_CALLS.inc(lane=lane, outcome="rate_limited")
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                self._pause(delay)
+                error = e
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                LLM_CALLS.inc(lane=lane, outcome="retry")
+                delay = self._backoff(attempt)
+                error = e
+            except openai.OpenAIError as e:
+                LLM_CALLS.inc(lane=lane, outcome="error")
+                raise LLMError(f"{model} call failed: {e}") from e
+            finally:
+                self._release()
+            if attempt == self.max_retries:
+                break
+            logger.warning("[llm] %s call failed (attempt %d/%d), retrying in %.2fs: %s",
+                           model, attempt + 1, self.max_retries + 1, delay, error)
+            if not isinstance(error, openai.RateLimitError):
+                time.sleep(min(delay, max(0.0, deadline_at - time.monotonic())) if deadline_at else delay)
+            if deadline_at and time.monotonic() >= deadline_at:
+                raise LLMDeadlineExceeded(f"{model} call ran out of time: {error}") from error
+        LLM_CALLS.inc(lane=lane, outcome="error")
+        raise LLMError(f"{model} call failed after {self.max_retries + 1} attempts: {error}") from error
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _acquire(self, lane: str, tokens: int, deadline_at: Optional[float] = None) -> None:
+        """Wait until this call is the highest-priority waiter and there is budget for it."""
+        start = time.monotonic()
+        entry = (LANES[lane], next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self._waiting[0] == entry and self._active < self.max_concurrent:
+                        now = time.monotonic()
+                        timeout = max(self._blocked_until - now, self._requests.wait_time(1, now),
+                                      self._tokens.wait_time(tokens, now))
+                        if timeout <= 0:
+                            break
+                    if deadline_at is not None:
+                        remaining = deadline_at - time.monotonic()
+                        if remaining <= 0:
+                            raise LLMDeadlineExceeded("ran out of time waiting for the rate limit")
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    self._cond.wait(timeout)
+                heapq.heappop(self._waiting)
+                now = time.monotonic()
+                self._requests.take(1, now)
+                self._tokens.take(tokens, now)
+                self._active += 1
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                raise
+            finally:
+                # The next waiter may be able to go now
+                self._cond.notify_all()
+        LLM_WAIT.observe(time.monotonic() - start, lane=lane)
+
+    def _release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _pause(self, seconds: float) -> None:
+        """The provider said to back off: no call starts for ``seconds``."""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def _settle(self, extra_tokens: int) -> None:
+        """Charge (or refund) the difference between the estimate and the reported usage."""
+        with self._cond:
+            self._tokens.take(extra_tokens, time.monotonic())
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            counts = dict(self._counts)
+            return {"active": self._active, "waiting": len(self._waiting), "inflight": len(self._inflight),
+                    "paused_for": round(max(0.0, self._blocked_until - time.monotonic()), 3),
+                    "calls": counts["calls"], "hedges": counts["hedges"], "hedge_wins": counts["hedge_wins"],
+                    "hedge_rate": round(counts["hedges"] / counts["calls"], 4) if counts["calls"] else 0.0,
+                    "latency_saved_s": round(counts["saved_s"], 3)}
+
+
+def scheduler_from_env() -> LLMScheduler:
+    """Limits from ``VIDEO_MVP_LLM_RPM`` / ``_TPM`` (0 = unlimited), ``_CONCURRENCY``, ``_MAX_RETRIES``,
+    ``_DEADLINE`` (seconds) and ``_HEDGE_RATIO`` (0 disables hedging)."""
+    return LLMScheduler(
+        requests_per_minute=float(os.environ.get("VIDEO_MVP_LLM_RPM", 0)),
+        tokens_per_minute=float(os.environ.get("VIDEO_MVP_LLM_TPM", 0)),
+        max_concurrent=int(os.environ.get("VIDEO_MVP_LLM_CONCURRENCY", 8)),
+        max_retries=int(os.environ.get("VIDEO_MVP_LLM_MAX_RETRIES", 4)),
+        deadline=float(os.environ.get("VIDEO_MVP_LLM_DEADLINE", 60)),
+        hedge_ratio=float(os.environ.get("VIDEO_MVP_LLM_HEDGE_RATIO", 0.1)),
+    )
+
+
+LLM = scheduler_from_env()
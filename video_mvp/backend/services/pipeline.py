@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import hashlib
+import logging
+import os
+from ..tools.scrape_url import scrape_url
+from ..tools.analyze_media import describe_image
+from ..utils.cache import MemoCache
+from ..utils.metrics import span, REGISTRY
+from ..utils.dedup import find_duplicates
+from ..utils.clips import is_video_file, poster_frame
+from .ranking import rank_images
+from .llm import LLMError
+
+logger = logging.getLogger(__name__)
+
+# Process-wide caches shared by the API handlers and batch jobs
+SCRAPE_CACHE = MemoCache(ttl=15 * 60, name="scrape")
+DOWNLOAD_CACHE = MemoCache(max_entries=4096, name="image_download")
+ANALYSIS_CACHE = MemoCache(max_entries=4096, name="vision")
+
+# generate_storyboard uses at most this many images, one render segment each
+MAX_STORYBOARD_MEDIA = 10
+DEDUP_SAVED = REGISTRY.counter("video_mvp_dedup_saved_total", "Work avoided by near-duplicate image elimination.")
+
+
+def scrape_product(url: str) -> Dict:
+    """Scrape a product page, reusing recent results for the same URL."""
+    return dict(SCRAPE_CACHE.get_or_compute(url, lambda: scrape_url(url)))
+
+
+def select_images(product_data: Dict, max_images: int = MAX_STORYBOARD_MEDIA) -> List[str]:
+    """The scraped image URLs worth downloading, best first (pre-ranked, nothing fetched in full)."""
+    candidates = product_data.get("image_candidates")
+    if not candidates:
+        return list(product_data.get("images", []))[:max_images]
+    return rank_images(candidates, product_data.get("title", ""), top_n=max_images)
+
+
+def scraped_image_path(img_url: str, dest_dir: str) -> str:
+    """Stable local path for a scraped image (same URL -> same file)."""
+    digest = hashlib.sha1(img_url.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(dest_dir, f"scraped_{digest}.jpg")
+
+
+def download_image(img_url: str, dest_dir: str, timeout: float = 5) -> str:
+    """Download an image once and return its local path."""
+    local_path = scraped_image_path(img_url, dest_dir)
+
+    def fetch() -> str:
+        if os.path.exists(local_path) and os.path.getsize(local_path) > 0:
+            return local_path
+        import requests
+        with span("image_download") as sp:
+            r = requests.get(img_url, timeout=timeout)
+            r.raise_for_status()
+            sp["bytes"] = len(r.content)
+            with open(local_path, "wb") as f:
+                f.write(r.content)
+        return local_path
+
+    return DOWNLOAD_CACHE.get_or_compute((img_url, dest_dir), fetch)
+
+
+def download_images(image_urls: List[str], dest_dir: str, timeout: float = 5) -> List[Tuple[str, str]]:
+    """Download scraped images, returning (url, local_path) for the ones that succeeded."""
+    downloaded = []
+    for img_url in image_urls:
+        try:
+            downloaded.append((img_url, download_image(img_url, dest_dir, timeout)))
+        except Exception:
+            pass
+    return downloaded
+
+
+def dedupe_downloads(downloaded: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], Dict]:
+    """Collapse near-duplicate downloads (same photo at other sizes or URLs), keeping the largest copy.
+
+    Returns the surviving (url, local_path) pairs in their original order and a
+    report of the vision calls and render segments saved.
+    """
+    with span("dedup"):
+        replaced = find_duplicates([path for _, path in downloaded])
+    kept = [(url, path) for url, path in downloaded if path not in replaced]
+    n_in, n_kept = len(downloaded), len(kept)
+    stats = {
+        "images_in": n_in,
+        "images_kept": n_kept,
+        "vision_calls_saved": n_in - n_kept,
+        "render_segments_saved": min(n_in, MAX_STORYBOARD_MEDIA) - min(n_kept, MAX_STORYBOARD_MEDIA),
+    }
+    DEDUP_SAVED.inc(stats["vision_calls_saved"], kind="vision_calls")
+    DEDUP_SAVED.inc(stats["render_segments_saved"], kind="render_segments")
+    return kept, stats
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def describe_media(media_paths: List[str]) -> Dict[str, str]:
+    """Describe local media files, only sending content not seen before to the vision model.
+
+    Video clips are described from a single poster frame extracted by ffmpeg.
+    Files whose vision call fails are left out of the result.
+    """
+    results = {}
+    pending = {}
+    for path in media_paths:
+        source = poster_frame(path) if is_video_file(path) else path
+        if source is None:
+            results[path] = "Video clip"
+            continue
+        digest = _file_digest(source)
+        cached = ANALYSIS_CACHE.get(digest) if digest else None
+        if cached is not None:
+            results[path] = cached
+        else:
+            pending[source] = (path, digest)
+    if pending:
+        # One failed call only costs that image its description
+        with ThreadPoolExecutor(max_workers=min(8, len(pending)), thread_name_prefix="vision") as pool:
+            futures = {source: pool.submit(contextvars.copy_context().run, _describe, source, digest)
+                       for source, (_, digest) in pending.items()}
+        for source, future in futures.items():
+            path = pending[source][0]
+            try:
+                results[path] = future.result()
+            except LLMError as e:
+                logger.warning("[describe_media] No description for %s: %s", path, e)
+    return results
+
+
+def _describe(source: str, digest: Optional[str]) -> str:
+    # Keyed on content, so a prefetch or another request describing the same image is joined
+    if digest is None:
+        return describe_image(source)
+    return ANALYSIS_CACHE.get_or_compute(digest, lambda: describe_image(source))
+
+
+def build_storyboard_input(creative_prompt: str, product_data: Dict, media: List[Dict]) -> Dict:
+    """Build the generate_storyboard input, dropping duplicate media paths."""
+    seen = set()
+    deduped_media = []
+    for m in media:
+        if m["path"] not in seen:
+            deduped_media.append(m)
+            seen.add(m["path"])
+    return {
+        "creative_prompt": creative_prompt,
+        "product": {
+            "title": product_data.get("title", ""),
+            "description": product_data.get("description", "")
+        },
+        "media": deduped_media
+    }
@@ -0,0 +1,87 @@
+"""Speculative warm-up of the ``/api/input`` pipeline for a product URL.
+
+The input form knows the product URL long before the user submits it. A
+prefetch runs the scrape, image download and vision stages for that URL in
+the background, exactly as ``/api/input`` would. Every stage goes through a
+cache that shares in-flight work, so a submit that arrives mid-prefetch joins
+whatever is still running instead of starting it again.
+"""
+from typing import Dict, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import os
+import threading
+from .llm import INTERACTIVE, llm_priority
+from .pipeline import scrape_product, select_images, download_images, dedupe_downloads, describe_media
+from ..utils.metrics import span, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PREFETCHES = REGISTRY.counter("video_mvp_prefetch_total", "Prefetch requests by result.")
+
+
+def warm_product(url: str, dest_dir: str, max_images: int) -> Dict:
+    """Run the /api/input stages that only depend on the URL; returns what was warmed.
+
+    Its vision calls run in the interactive lane: the submit that follows
+    joins them through the analysis cache, so in the bulk lane it would wait
+    behind batch traffic.
+    """
+    with span("prefetch"), llm_priority(INTERACTIVE):
+        product = scrape_product(url)
+        scraped, _ = dedupe_downloads(download_images(select_images(product, max_images), dest_dir))
+        descriptions = describe_media([path for _, path in scraped]) if scraped else {}
+    return {"images": len(scraped), "described": len(descriptions)}
+
+
+class Prefetcher:
+    """Runs prefetches on a small pool; repeats of a running prefetch and overflow are dropped."""
+
+    def __init__(self, dest_dir: str, workers: int = 2, max_pending: int = 16):
+        self.dest_dir = dest_dir
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._pending: Dict[Tuple[str, int], Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url: str, max_images: int) -> str:
+        """Start warming ``url``. Returns "started", "running" (already in progress) or "skipped" (busy)."""
+        key = (url, max_images)
+        with self._lock:
+            if key in self._pending:
+                status = "running"
+            elif len(self._pending) >= self.max_pending:
+                status = "skipped"
+            else:
+                self._pending[key] = self._pool.submit(self._run, key)
+                status = "started"
+        PREFETCHES.inc(result=status)
+        return status
+
+    def _run(self, key: Tuple[str, int]) -> Dict:
+        url, max_images = key
+        try:
+            return warm_product(url, self.dest_dir, max_images)
+        except Exception as e:
+            # Speculative: the real request will retry and report the failure
+            logger.warning("[prefetch] Prefetch of %s failed: %s", url, e)
+            return {}
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def wait(self, url: str, max_images: int, timeout: Optional[float] = None) -> None:
+        """Block until a running prefetch of ``url`` finishes (no-op if none is running)."""
+        with self._lock:
+            future = self._pending.get((url, max_images))
+        if future is not None:
+            future.result(timeout=timeout)
+
+
+def prefetcher_from_env(dest_dir: str) -> Prefetcher:
+    """Pool size from ``VIDEO_MVP_PREFETCH_WORKERS``, queue cap from ``VIDEO_MVP_PREFETCH_MAX_PENDING``."""
+    return Prefetcher(
+        dest_dir,
+        workers=int(os.environ.get("VIDEO_MVP_PREFETCH_WORKERS", 2)),
+        max_pending=int(os.environ.get("VIDEO_MVP_PREFETCH_MAX_PENDING", 16)),
+    )
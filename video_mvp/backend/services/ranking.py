@@ -0,0 +1,149 @@
+"""Cheap pre-ranking of scraped image candidates.
+
+Product pages reference far more images than a storyboard can use. Before
+anything is downloaded or sent to the vision model, candidates are scored from
+signals that are already in the page (gallery membership, DOM position,
+declared width/height, alt text). The best few are then probed with a small
+``Range`` request for their byte size and real dimensions (from the image
+header), and only the top ``N`` go on to download and analysis.
+"""
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import re
+from ..utils.cache import MemoCache
+from ..utils.metrics import span
+
+# Image headers (JPEG SOF, PNG IHDR, WebP VP8) sit well inside the first 64KB
+PROBE_BYTES = 64 * 1024
+PROBE_WORKERS = 8
+# Probe this many times N of the best cheap candidates
+PROBE_FACTOR = 2
+PROBE_CACHE = MemoCache(ttl=60 * 60, max_entries=4096, name="image_probe")
+
+# Below these an image is an icon/thumbnail, not a product shot
+MIN_SIDE = 150
+MIN_BYTES = 4 * 1024
+# Aspect ratios beyond this are banners and strips
+MAX_ASPECT = 2.5
+GOOD_LONG_SIDE = 600
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"the", "a", "an", "and", "of", "for", "with", "in", "on", "to", "by"}
+
+
+def _words(text: Optional[str]) -> set:
+    return {w for w in _WORD_RE.findall((text or "").lower()) if len(w) > 1 and w not in _STOPWORDS}
+
+
+def _dimension_score(width: Optional[int], height: Optional[int]) -> float:
+    if not width or not height:
+        return 0.0
+    short_side, long_side = sorted((width, height))
+    score = 0.0
+    if short_side < MIN_SIDE:
+        score -= 80
+    elif long_side >= GOOD_LONG_SIDE:
+        score += 10
+    if long_side / short_side > MAX_ASPECT:
+        score -= 40
+    return score
+
+
+def cheap_score(candidate: Dict, title_words: set) -> float:
+    """Score a candidate from page markup alone (no network)."""
+    score = 100.0 if candidate.get("gallery") else 0.0
+    # Product pages put the hero shot first; later images are progressively less likely picks
+    score -= min(candidate.get("position") or 0, 50)
+    alt = _words(candidate.get("alt"))
+    if alt:
+        score += 10 + 5 * min(len(alt & title_words), 4)
+    return score + _dimension_score(candidate.get("width"), candidate.get("height"))
+
+
+def _total_length(resp: "requests.Response") -> Optional[int]:
+    content_range = resp.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = resp.headers.get("Content-Length")
+    return int(length) if resp.status_code == 200 and length and length.isdigit() else None
+
+
+def probe_image(img_url: str, timeout: float = 3) -> Dict:
+    """Byte size and pixel dimensions of a remote image from its first few KB.
+
+    Servers that ignore ``Range`` send the whole file; we still stop reading once
+    the header has been parsed.
+    """
+    import requests
+    from PIL import ImageFile
+
+    def fetch() -> Dict:
+        info = {"content_length": None, "width": None, "height": None}
+        with span("image_probe") as sp:
+            resp = requests.get(img_url, headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"},
+                                stream=True, timeout=timeout)
+            try:
+                resp.raise_for_status()
+                info["content_length"] = _total_length(resp)
+                parser, read = ImageFile.Parser(), 0
+                for chunk in resp.iter_content(8192):
+                    read += len(chunk)
+                    try:
+                        parser.feed(chunk)
+                    except Exception:
+                        break  # not a raster image we can parse
+                    if parser.image is not None or read >= PROBE_BYTES:
+                        break
+                sp["bytes"] = read
+                if parser.image is not None:
+                    info["width"], info["height"] = parser.image.size
+            finally:
+                resp.close()
+        return info
+
+    return PROBE_CACHE.get_or_compute(img_url, fetch)
+
+
+def probe_score(info: Optional[Dict]) -> float:
+    """Adjustment from a probe; unreachable images sink to the bottom."""
+    if info is None:
+        return -200.0
+    score = _dimension_score(info.get("width"), info.get("height"))
+    length = info.get("content_length")
+    if length is not None and length < MIN_BYTES:
+        score -= 50
+    return score
+
+
+def rank_images(candidates: List[Dict], title: str = "", top_n: int = 10, probe: bool = True) -> List[str]:
+    """URLs of the ``top_n`` most promising candidates, best first."""
+    if top_n <= 0 or not candidates:
+        return []
+    title_words = _words(title)
+    scored: List[Tuple[float, int, Dict]] = [
+        (cheap_score(c, title_words), i, c) for i, c in enumerate(candidates)
+    ]
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    if probe:
+        shortlist = scored[:top_n * PROBE_FACTOR]
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="image-probe") as pool:
+            # Probes run in copies of this context, so their spans and the request's cancellation reach them
+            futures = [pool.submit(contextvars.copy_context().run, _safe_probe, c["url"]) for _, _, c in shortlist]
+        infos = [future.result() for future in futures]
+        # Replace declared dimensions with real ones where the probe found them
+        rescored = []
+        for (score, i, c), info in zip(shortlist, infos):
+            if info and info.get("width"):
+                score -= _dimension_score(c.get("width"), c.get("height"))
+            rescored.append((score + probe_score(info), i, c))
+        scored = sorted(rescored, key=lambda s: (-s[0], s[1])) + scored[len(shortlist):]
+    return [c["url"] for _, _, c in scored[:top_n]]
+
+
+def _safe_probe(img_url: str) -> Optional[Dict]:
+    try:
+        return probe_image(img_url)
+    except Exception:
+        return None
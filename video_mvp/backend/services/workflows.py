@@ -0,0 +1,199 @@
+"""The analyze and render steps behind the API and the queue workers.
+
+``/api/input`` and ``/api/render_video`` run these in the API process; queued
+``analyze`` and ``render`` jobs run the same functions in a worker
+(``python -m video_mvp.backend.worker``), which therefore never builds the
+FastAPI app.
+"""
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import tempfile
+import uuid
+from pydantic import BaseModel
+from ..tools.generate_storyboard import generate_storyboard
+from ..tools.render_video import render_video, validate_video
+from ..utils.cancellation import CancelToken, cancel_scope, check_cancelled
+from ..utils.clips import is_video_file, probe_media
+from ..utils.metrics import span
+from .delivery import publish_video
+from .pipeline import (scrape_product, select_images, download_images, dedupe_downloads, describe_media,
+                       build_storyboard_input, MAX_STORYBOARD_MEDIA)
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploads"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Published videos; point every API and worker process at the same (shared) directory
+VIDEO_DIR = os.environ.get("VIDEO_MVP_VIDEO_DIR", os.path.join(UPLOAD_DIR, "videos"))
+
+
+class AnalyzeJob(BaseModel):
+    product_url: Optional[str] = None
+    creative_prompt: str
+    media_files: List[str] = []  # paths on storage the workers share
+    max_images: int = MAX_STORYBOARD_MEDIA
+
+
+def prepare_storyboard(product_url: Optional[str], creative_prompt: str, media_files: List[str], media_json: List[Dict],
+                       max_images: int = MAX_STORYBOARD_MEDIA) -> Dict:
+    # Scrape product info if URL provided
+    product_data = scrape_product(product_url) if product_url else {}
+    # Only the top-ranked candidates are downloaded; ranking signals stay out of the response
+    image_urls = select_images(product_data, max_images)
+    product_data.pop("image_candidates", None)
+    # Add scraped images to media_json (use local download for analysis)
+    scraped = download_images(image_urls, UPLOAD_DIR)
+    # Drop near-duplicates (same photo at several sizes) before paying for vision calls
+    scraped, dedup_stats = dedupe_downloads(scraped)
+    scraped_image_paths = [local_path for _, local_path in scraped]
+    for img_url, _ in scraped:
+        media_json.append({"path": img_url, "description": ""})
+    # Analyze all media (uploaded + scraped)
+    all_media_paths = media_files + scraped_image_paths
+    media_descriptions = describe_media(all_media_paths) if all_media_paths else {}
+    # Fill in media descriptions
+    for m in media_json:
+        # Try to match by filename or URL ending
+        desc = ""
+        for k, v in media_descriptions.items():
+            if m["path"].endswith(os.path.basename(k)) or os.path.basename(m["path"]) in k:
+                desc = v
+                # Also map the URL to the description if it's a URL
+                if m["path"].startswith("http"):
+                    media_descriptions[m["path"]] = v
+                break
+        m["description"] = desc or "Image"
+    # After filling in media descriptions, map each scraped URL to its local file's description
+    for img_url, local_path in scraped:
+        if local_path in media_descriptions:
+            media_descriptions[img_url] = media_descriptions[local_path]
+            for m in media_json:
+                if m["path"] == img_url:
+                    m["description"] = media_descriptions[local_path]
+    # Build input for storyboard (no images field, duplicates removed)
+    input_json = build_storyboard_input(creative_prompt, product_data, media_json)
+    deduped_media = input_json["media"]
+    # Generate storyboard (strict JSON)
+    storyboard_json = generate_storyboard(input_json)
+    # --- Combine uploaded and scraped image URLs for media_files ---
+    uploaded_files = media_files if media_files else []
+    scraped_urls = [m["path"] for m in deduped_media if m["path"].startswith("http")]
+    all_media_files = uploaded_files + scraped_urls
+    return {
+        "product": product_data,
+        "creative_prompt": creative_prompt,
+        "media_files": all_media_files,
+        "media_descriptions": media_descriptions,
+        "storyboard": storyboard_json,
+        "dedup": dedup_stats
+    }
+
+
+def is_renderable(path: str) -> bool:
+    """Validate media without decoding clips: images with OpenCV, clips with (cached) ffprobe."""
+    if is_video_file(path):
+        try:
+            probe_media(path)
+            return True
+        except Exception:
+            return False
+    import cv2
+    with span("image_decode"):
+        img = cv2.imread(path)
+    logger.debug("[render_video_endpoint] %s, cv2.imread: %s", path, img.shape if img is not None else None)
+    return img is not None
+
+
+class RenderVideoRequest(BaseModel):
+    storyboard: str  # JSON string
+    media_files: List[str]
+    include_timings: bool = False  # return a per-stage timing breakdown
+    segmented: bool = False  # also package HLS (fMP4 segments) for progressive playback
+    captions: bool = True  # burn the storyboard script in as captions
+    audio_file: Optional[str] = None  # voiceover/music track (local path or URL)
+    project_id: Optional[str] = None  # a newer render for the same project supersedes this one
+
+
+def render_storyboard(req: RenderVideoRequest, token: Optional[CancelToken] = None) -> Dict:
+    with cancel_scope(token):
+        return _render_storyboard(req)
+
+
+def _render_storyboard(req: RenderVideoRequest) -> Dict:
+    import requests
+    # Parse storyboard JSON
+    sb = json.loads(req.storyboard)
+    media_files = []
+    temp_files = []
+    logger.info("[render_video_endpoint] Checking media files for video rendering...")
+    for item in sb.get("media", []):
+        media_path = item["file"]
+        if media_path.startswith("http://") or media_path.startswith("https://"):
+            # Download to temp file, strip query params from extension
+            ext = os.path.splitext(media_path.split("?")[0])[-1] or ".jpg"
+            with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=UPLOAD_DIR) as tmp:
+                try:
+                    with span("image_download") as sp:
+                        r = requests.get(media_path, timeout=10)
+                        tmp.write(r.content)
+                        tmp.flush()
+                        sp["bytes"] = len(r.content)
+                    tmp_path = tmp.name
+                    if is_renderable(tmp_path):
+                        media_files.append(tmp_path)
+                        temp_files.append(tmp_path)
+                    else:
+                        logger.warning("[render_video_endpoint] Downloaded file is not a valid image or clip: %s", media_path)
+                        os.remove(tmp_path)
+                except Exception as e:
+                    logger.warning("[render_video_endpoint] Failed to download %s: %s", media_path, e)
+        else:
+            # Local file
+            if is_renderable(media_path):
+                media_files.append(media_path)
+            else:
+                logger.warning("[render_video_endpoint] Local file is not a valid image or clip: %s", media_path)
+    logger.info("[render_video_endpoint] Final media_files for video: %s", media_files)
+    audio_path = None
+    if req.audio_file and req.audio_file.startswith(("http://", "https://")):
+        ext = os.path.splitext(req.audio_file.split("?")[0])[-1] or ".m4a"
+        with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=UPLOAD_DIR) as tmp:
+            temp_files.append(tmp.name)
+            try:
+                with span("audio_download") as sp:
+                    r = requests.get(req.audio_file, timeout=10)
+                    r.raise_for_status()
+                    tmp.write(r.content)
+                    sp["bytes"] = len(r.content)
+                audio_path = tmp.name
+            except Exception as e:
+                logger.warning("[render_video_endpoint] Failed to download audio %s: %s", req.audio_file, e)
+    elif req.audio_file:
+        if os.path.exists(req.audio_file):
+            audio_path = req.audio_file
+        else:
+            logger.warning("[render_video_endpoint] Audio file not found: %s", req.audio_file)
+    # Render to a private name, then publish under the content hash (immutable URL)
+    output_path = os.path.join(UPLOAD_DIR, f"render_{uuid.uuid4().hex}.mp4")
+    try:
+        check_cancelled()
+        video_path = validate_video(render_video(req.storyboard, media_files, output_path,
+                                                 captions=req.captions, audio_path=audio_path))
+        published = publish_video(video_path, VIDEO_DIR, segmented=req.segmented)
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    finally:
+        # Downloads are removed whether the render finished, failed or was superseded
+        for f in temp_files:
+            try:
+                os.remove(f)
+            except Exception:
+                pass
+    response = {"video_path": published["path"], "video_url": published["url"], "etag": published["etag"]}
+    if "hls_url" in published:
+        response["hls_url"] = published["hls_url"]
+    return response
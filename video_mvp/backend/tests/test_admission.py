@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from video_mvp.backend.utils.admission import AdmissionController
+
+def test_admission_limits_concurrency_and_queues():
+    controller = AdmissionController("test", max_concurrent=2, max_queue=4)
+    peak = {"active": 0, "current": 0}
+
+    async def job():
+        await controller.acquire()
+        try:
+            peak["current"] += 1
+            peak["active"] = max(peak["active"], peak["current"])
+            await asyncio.sleep(0.02)
+            peak["current"] -= 1
+        finally:
+            controller.release()
+
+    async def main():
+        await asyncio.gather(*(job() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak["active"] == 2
+    assert controller.active == 0 and controller.queued == 0
+
+def test_admission_rejects_when_queue_full():
+    controller = AdmissionController("test", max_concurrent=1, max_queue=1)
+
+    async def main():
+        await controller.acquire()
+        waiting = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            await controller.acquire()
+        assert exc.value.status_code == 429
+        controller.release()
+        await waiting
+        controller.release()
+
+    asyncio.run(main())
+    assert controller.active == 0
+
+def test_admission_times_out_with_503_and_frees_queue():
+    controller = AdmissionController("test", max_concurrent=1, max_queue=2, queue_timeout=0.05)
+
+    async def main():
+        await controller.acquire()
+        with pytest.raises(HTTPException) as exc:
+            await controller.acquire()
+        assert exc.value.status_code == 503
+        assert controller.queued == 0
+        # A cancelled waiter must not leak its slot
+        waiting = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        controller.release()
+
+    asyncio.run(main())
+    assert controller.active == 0 and controller.queued == 0
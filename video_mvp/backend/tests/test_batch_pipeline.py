@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from fastapi.testclient import TestClient
+from video_mvp.backend import main as main_module
+from video_mvp.backend.services.batch_pipeline import StagedPipeline, BatchJob, batch_item_id
+
+def test_staged_pipeline_respects_stage_limits():
+    active = {"slow": 0}
+    peak = {"slow": 0}
+    lock = threading.Lock()
+
+    def fast(item):
+        return {"fast": item["id"]}
+
+    def slow(item):
+        with lock:
+            active["slow"] += 1
+            peak["slow"] = max(peak["slow"], active["slow"])
+        time.sleep(0.05)
+        with lock:
+            active["slow"] -= 1
+        return {"slow": item["id"]}
+
+    items = [{"id": str(i)} for i in range(6)]
+    StagedPipeline([("fast", fast, 4), ("slow", slow, 2)]).run(items)
+    assert all(it["status"] == "done" for it in items)
+    assert all(it["completed"] == ["fast", "slow"] for it in items)
+    assert peak["slow"] == 2
+    assert all(set(it["timings"]) == {"fast", "slow"} for it in items)
+
+def test_staged_pipeline_finishes_when_progress_callback_raises():
+    def on_progress(item):
+        raise OSError("disk full")
+    items = [{"id": str(i)} for i in range(3)]
+    result = []
+    runner = threading.Thread(target=lambda: result.append(
+        StagedPipeline([("a", lambda it: {"a": 1}, 2), ("b", lambda it: {"b": 1}, 1)], on_progress=on_progress).run(items)))
+    runner.start()
+    runner.join(timeout=5)
+    assert not runner.is_alive()
+    assert all(it["status"] == "done" and it["completed"] == ["a", "b"] for it in result[0])
+
+def test_staged_pipeline_is_pipelined():
+    # 6 items through two 0.05s stages with 1 worker each: serial would take 0.6s,
+    # pipelined takes ~0.35s (bounded by one stage, not the sum of both)
+    def stage(item):
+        time.sleep(0.05)
+    items = [{"id": str(i)} for i in range(6)]
+    start = time.perf_counter()
+    StagedPipeline([("a", stage, 1), ("b", stage, 1)]).run(items)
+    assert time.perf_counter() - start < 0.55
+
+def test_staged_pipeline_skips_completed_and_records_failures():
+    calls = []
+
+    def first(item):
+        calls.append(("first", item["id"]))
+
+    def second(item):
+        calls.append(("second", item["id"]))
+        if item["id"] == "bad":
+            raise RuntimeError("boom")
+
+    items = [{"id": "resumed", "completed": ["first"]}, {"id": "bad"}]
+    StagedPipeline([("first", first, 1), ("second", second, 1)]).run(items)
+    assert ("first", "resumed") not in calls
+    assert items[0]["status"] == "done"
+    assert items[1]["status"] == "failed"
+    assert items[1]["error"] == "second: boom"
+
+def test_batch_job_resumes_from_manifest(tmp_path):
+    out_dir = tmp_path / "batch"
+    item = {"product_url": None, "creative_prompt": "10 sec vid", "id": "sku-1"}
+    job = BatchJob([item], str(out_dir), media_dir=str(tmp_path / "media"))
+    # Simulate an earlier run that got as far as the storyboard
+    job.items[0].update({
+        "completed": ["scrape", "analyze", "storyboard"],
+        "outputs": {"product": {}, "media": [], "storyboard": json.dumps({"script": "x", "media": []})},
+    })
+    job._write_manifest()
+    resumed = BatchJob([item], str(out_dir), media_dir=str(tmp_path / "media"))
+    assert resumed.batch_id == job.batch_id
+    assert resumed.items[0]["completed"] == ["scrape", "analyze", "storyboard"]
+    manifest = json.loads((out_dir / "manifest.json").read_text())
+    assert manifest["items"][0]["id"] == "sku-1"
+
+def test_failed_render_is_not_done_and_reruns_on_resume(tmp_path):
+    out_dir = tmp_path / "batch"
+    item = {"product_url": None, "creative_prompt": "10 sec vid", "id": "sku-1"}
+    job = BatchJob([item], str(out_dir), media_dir=str(tmp_path / "media"))
+    job.items[0].update({
+        "completed": ["scrape", "analyze", "storyboard"],
+        "outputs": {"product": {}, "media": [], "storyboard": json.dumps({"script": "x", "media": []})},
+    })
+    manifest = job.run()
+    assert manifest["items"][0]["status"] == "failed" and "render" in manifest["items"][0]["error"]
+    assert "render" not in manifest["items"][0]["completed"]
+    # A broken output recorded as done by an older run is rendered again
+    placeholder = out_dir / "sku-1.mp4"
+    placeholder.write_bytes(b"00")
+    job.items[0]["completed"].append("render")
+    job.items[0]["outputs"]["video_path"] = str(placeholder)
+    job._write_manifest()
+    resumed = BatchJob([item], str(out_dir), media_dir=str(tmp_path / "media"))
+    assert "render" not in resumed.items[0]["completed"]
+
+def test_batch_item_id_is_stable():
+    a = {"product_url": "https://example.com/p/1", "creative_prompt": "10 sec"}
+    assert batch_item_id(a) == batch_item_id(dict(a))
+    assert batch_item_id({"id": "sku"}) == "sku"
+
+def test_batch_ids_cannot_leave_the_batch_dir():
+    client = TestClient(main_module.app)
+    for bad in ("../../x", "/tmp/x", "a" * 65, ""):
+        r = client.post("/api/batch", json={"items": [], "batch_id": bad})
+        assert r.status_code == 422, bad
+    assert client.get("/api/batch/..%2F..%2Fx").status_code in (404, 422)
+    assert client.get("/api/batch/bad.id").status_code == 422
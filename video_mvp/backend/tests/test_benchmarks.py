@@ -0,0 +1,44 @@
+import json
+from fastapi.testclient import TestClient
+from video_mvp.backend.main import app
+from video_mvp.backend.tools.scrape_url import scrape_url
+from video_mvp.backend.tools.generate_storyboard import generate_storyboard
+from video_mvp.backend.benchmarks.standins import isolated_uploads, offline_environment
+from video_mvp.backend.benchmarks.run import run_benchmarks, compare
+
+client = TestClient(app)
+
+def test_standins_serve_fixture_and_canned_storyboard():
+    with offline_environment(image_count=4) as (site, fake):
+        product = scrape_url(site.product_url)
+        assert "Strawberry Maxine" in product["title"]
+        assert product["images"] and all(url.startswith(site.url) for url in product["images"])
+        sb = json.loads(generate_storyboard({
+            "creative_prompt": "10 sec vid",
+            "product": {"title": product["title"], "description": product["description"]},
+            "media": [{"path": url, "description": "Image"} for url in product["images"]],
+        }))
+        assert [m["file"] for m in sb["media"]] == product["images"]
+        assert fake.requests == 1
+
+def test_input_api_offline(tmp_path):
+    with isolated_uploads(tmp_path), offline_environment(image_count=3) as (site, _):
+        response = client.post("/api/input", data={"product_url": site.product_url, "creative_prompt": "10 sec vid"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["product"]["description"]
+    for path in data["media_files"]:
+        assert data["media_descriptions"][path]
+
+def test_quick_benchmark_run_and_compare():
+    results = run_benchmarks(quick=True, include_endpoints=False)
+    names = {r["name"] for r in results["results"]}
+    assert {"scrape_url", "analyze_media", "generate_storyboard", "render_video", "frame_transport",
+            "import_app", "cold_start"} <= names
+    for r in results["results"]:
+        assert r["median_s"] >= 0 and r["runs"] == 1
+    slower = json.loads(json.dumps(results))
+    for r in slower["results"]:
+        r["median_s"] = r["median_s"] * 2 + 1
+    assert compare(slower, results)
+    assert not compare(results, slower)
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from video_mvp.backend import main as main_module
+from video_mvp.backend.services import workflows
+from video_mvp.backend.utils.cancellation import Cancelled, Supersession, check_cancelled, run_cancellable
+from video_mvp.backend.benchmarks.standins import isolated_uploads, make_product_image
+
+def test_newer_work_cancels_older_work_for_the_same_key():
+    sessions = Supersession("test")
+    with sessions.begin("project-1") as first, sessions.begin("project-2") as other:
+        with sessions.begin("project-1") as second:
+            assert first.cancelled and not second.cancelled and not other.cancelled
+            with pytest.raises(Cancelled):
+                first.check()
+    assert sessions.active() == 0
+    with sessions.begin(None) as a, sessions.begin(None) as b:
+        assert not a.cancelled and not b.cancelled
+
+def test_cancel_kills_the_child_process():
+    sessions = Supersession("test")
+    with sessions.begin("p") as token:
+        threading.Timer(0.2, token.cancel).start()
+        start = time.monotonic()
+        with pytest.raises(Cancelled):
+            run_cancellable([sys.executable, "-c", "import time; time.sleep(30)"], token)
+        assert time.monotonic() - start < 5
+
+def test_guard_cancels_queued_work():
+    sessions = Supersession("test")
+
+    async def main():
+        with sessions.begin("p") as token:
+            asyncio.get_running_loop().call_later(0.05, token.cancel)
+            await token.guard(asyncio.sleep(30))
+
+    with pytest.raises(Cancelled):
+        asyncio.run(main())
+
+def test_newer_render_supersedes_running_render(tmp_path, monkeypatch):
+    still = tmp_path / "still.jpg"
+    still.write_bytes(make_product_image(1, 64, 64))
+    started = threading.Event()
+    calls = []
+
+    def fake_render(storyboard, media_files, output_path, **kwargs):
+        calls.append(output_path)
+        if len(calls) == 1:
+            started.set()
+            while True:  # the first render runs until it is superseded
+                check_cancelled()
+                time.sleep(0.01)
+        with open(output_path, "wb") as f:
+            f.write(b"\x00\x00\x00\x10ftypisom latest render")
+        return output_path
+
+    monkeypatch.setattr(workflows, "render_video", fake_render)
+    client = TestClient(main_module.app)
+    body = {"storyboard": json.dumps({"media": [{"start": "00:00", "end": "00:01", "file": "a"}]}),
+            "media_files": [str(still)], "project_id": "project-1"}
+    first = {}
+    with isolated_uploads(tmp_path):
+        thread = threading.Thread(target=lambda: first.update(r=client.post("/api/render_video", json=body)))
+        thread.start()
+        assert started.wait(10)
+        second = client.post("/api/render_video", json=body)
+        thread.join(10)
+    assert first["r"].status_code == 409
+    assert second.status_code == 200 and second.json()["video_url"].startswith("/videos/")
+
+def _active_renders_once_settled(timeout=5):
+    # Superseded renders give their slot back once they next check their token
+    deadline = time.monotonic() + timeout
+    while main_module.render_admission.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return main_module.render_admission.active
+
+def test_superseded_render_holds_its_slot_until_the_thread_stops(monkeypatch):
+    release = threading.Event()
+    slots = {}
+
+    def fake_render_storyboard(req, token):
+        if req.project_id == "first":
+            token.cancel()  # superseded, but this render ignores its token for a while
+            release.wait(10)
+            slots["while_running"] = main_module.render_admission.active
+        return {"video_url": "/videos/x.mp4"}
+
+    monkeypatch.setattr(main_module, "render_storyboard", fake_render_storyboard)
+    monkeypatch.setattr(main_module, "RENDER_DEBOUNCE", 0)
+    client = TestClient(main_module.app)
+    body = {"storyboard": "{}", "media_files": [], "project_id": "first"}
+    assert _active_renders_once_settled() == 0
+    assert client.post("/api/render_video", json=body).status_code == 409
+    assert main_module.render_admission.active == 1
+    release.set()
+    assert _active_renders_once_settled() == 0 and slots["while_running"] == 1
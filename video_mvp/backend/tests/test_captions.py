@@ -0,0 +1,96 @@
+import json
+import shutil
+import subprocess
+import pytest
+from video_mvp.backend.utils.captions import split_script, caption_cues, segment_cues, to_srt
+from video_mvp.backend.utils.clips import probe_media
+from video_mvp.backend.tools import render_video as render_module
+from video_mvp.backend.benchmarks.standins import make_product_image, make_voiceover
+
+SCRIPT = "Meet Maxine! Cozy, cute and ready to ship. Grab yours now!"
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                                  reason="ffmpeg not installed")
+
+def test_split_script_wraps_long_sentences():
+    assert split_script(SCRIPT) == ["Meet Maxine!", "Cozy, cute and ready to ship.", "Grab yours now!"]
+    lines = split_script("word " * 40, max_chars=30)
+    assert all(len(line) <= 30 for line in lines) and " ".join(lines) == ("word " * 40).strip()
+
+def test_cues_follow_media_segments():
+    # One line per segment: each caption covers its segment exactly
+    assert caption_cues(SCRIPT, [(0, 3), (3, 4), (7, 3)]) == [
+        (0, 3, "Meet Maxine!"), (3, 7, "Cozy, cute and ready to ship."), (7, 10, "Grab yours now!"),
+    ]
+    # Otherwise time is shared by length, snapping to nearby cuts
+    cues = caption_cues(SCRIPT, [(0, 2), (2, 8)])
+    assert [round(end, 2) for _, end, _ in cues] == [2, 7.32, 10]
+    assert to_srt(cues[:1]).startswith("1\n00:00:00,000 --> ")
+
+def _fake_ffmpeg(calls, audio_codec):
+    def run(cmd, **kwargs):
+        calls.append(cmd)
+        if cmd[0] == "ffprobe":
+            return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps({"streams": [{"codec_name": audio_codec}]}).encode())
+        with open(cmd[-1], "wb") as f:
+            f.write(b"\x00\x00\x00\x10ftypisom encoded")  # passes validate_video
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+    return run
+
+@pytest.mark.parametrize("audio_codec, audio_args", [("pcm_s16le", ["-c:a", "aac"]), ("aac", ["-c:a", "copy"])])
+def test_captions_and_audio_go_into_the_single_encode(tmp_path, monkeypatch, audio_codec, audio_args):
+    calls = []
+    monkeypatch.setattr(render_module.subprocess, "run", _fake_ffmpeg(calls, audio_codec))
+    monkeypatch.setattr(render_module, "FRAME_TRANSPORT", "off")  # OpenCV writer + one ffmpeg encode
+    still = tmp_path / "still.jpg"
+    still.write_bytes(make_product_image(1, 600, 800))
+    audio = tmp_path / f"voiceover_{audio_codec}.wav"
+    make_voiceover(str(audio), SCRIPT)
+    storyboard = json.dumps({"script": SCRIPT, "media": [{"start": "00:00", "end": "00:03", "file": "still"}]})
+    render_module.render_video(storyboard, [str(still)], str(tmp_path / "out.mp4"), audio_path=str(audio))
+    encodes = [cmd for cmd in calls if cmd[0] == "ffmpeg"]
+    assert len(encodes) == 1
+    cmd = encodes[0]
+    assert cmd[cmd.index("-vf") + 1].startswith("subtitles=") and str(audio) in cmd
+    assert " ".join(audio_args) in " ".join(cmd)
+    assert not (tmp_path / "out.srt").exists()
+
+def test_cues_split_at_segment_cuts():
+    cues = [(0, 2.5, "Meet Maxine!"), (2.5, 4, "Grab yours now!")]
+    assert segment_cues(cues, 2, 2) == [(0, 0.5, "Meet Maxine!"), (0.5, 2, "Grab yours now!")]
+    assert segment_cues(cues, 4, 1) == []
+
+def test_captioned_segment_render_encodes_once(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(render_module.subprocess, "run", _fake_ffmpeg(calls, "aac"))
+    still = tmp_path / "still.jpg"
+    still.write_bytes(make_product_image(1, 600, 800))
+    audio = make_voiceover(str(tmp_path / "voiceover.wav"), SCRIPT)
+    segments = [
+        {"kind": "still", "path": str(still), "start": 0.0, "duration": 3.0},
+        {"kind": "black", "start": 3.0, "duration": 1.0},
+        {"kind": "clip", "path": str(tmp_path / "clip.mp4"), "start": 4.0, "duration": 4.0,
+         "plan": {"start": 0.0, "duration": 4.0, "copy": True}},
+        {"kind": "still", "path": str(still), "start": 8.0, "duration": 3.0},
+    ]
+    render_module.render_segments(segments, str(tmp_path / "out.mp4"), SCRIPT, audio)
+    segment_cmds = [cmd for cmd in calls if cmd[0] == "ffmpeg" and cmd[-1].endswith(".ts")]
+    concat = [cmd for cmd in calls if cmd[0] == "ffmpeg" and "concat" in cmd]
+    assert len(segment_cmds) == 4 and len(concat) == 1
+    # Every captioned segment burns its own cues in; the concat only copies video and muxes audio
+    captioned = [cmd for cmd in segment_cmds if "subtitles=" in " ".join(cmd)]
+    assert len(captioned) == 3 and all(cmd[cmd.index("-c:v") + 1] == "libx264" for cmd in captioned)
+    assert concat[0][concat[0].index("-c:v") + 1] == "copy"
+    assert "-vf" not in concat[0] and "libx264" not in concat[0] and str(audio) in concat[0]
+
+@needs_ffmpeg
+def test_render_with_captions_and_voiceover(tmp_path):
+    still = tmp_path / "still.jpg"
+    still.write_bytes(make_product_image(1, 600, 800))
+    audio = make_voiceover(str(tmp_path / "voiceover.wav"), SCRIPT)
+    storyboard = json.dumps({"script": SCRIPT, "media": [
+        {"start": "00:00", "end": "00:02", "file": "a"}, {"start": "00:02", "end": "00:04", "file": "b"},
+    ]})
+    out = render_module.render_video(storyboard, [str(still), str(still)], str(tmp_path / "out.mp4"), audio_path=audio)
+    assert probe_media(out)["codec"] == "h264"
+    assert probe_media(out, stream="a")["codec"] == "aac"
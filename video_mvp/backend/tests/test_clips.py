@@ -0,0 +1,103 @@
+import json
+import shutil
+import subprocess
+import pytest
+from video_mvp.backend.utils import clips
+from video_mvp.backend.utils.clips import parse_probe, plan_clip, clip_segment_cmd, probe_media
+from video_mvp.backend.tools import render_video as render_module
+from video_mvp.backend.benchmarks.standins import make_product_image
+
+FFPROBE_OUTPUT = {
+    "packets": [{"pts_time": "0.000000", "flags": "K__"}, {"pts_time": "0.033333", "flags": "___"},
+                {"pts_time": "2.000000", "flags": "K__"}, {"pts_time": "4.000000", "flags": "K__"}],
+    "streams": [{"codec_name": "h264", "width": 720, "height": 1280, "pix_fmt": "yuv420p",
+                 "avg_frame_rate": "30/1", "r_frame_rate": "30/1"}],
+    "format": {"duration": "6.000000"},
+}
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                                  reason="ffmpeg not installed")
+
+def test_matching_clip_is_cut_at_keyframe_with_stream_copy():
+    info = parse_probe(FFPROBE_OUTPUT)
+    assert info["keyframes"] == [0.0, 2.0, 4.0] and info["fps"] == 30.0
+    plan = plan_clip(info, clip_start=3.5, duration=5)
+    assert plan == {"start": 2.0, "duration": 4.0, "copy": True}
+    cmd = clip_segment_cmd("clip.mp4", plan, "seg.ts")
+    assert cmd[cmd.index("-c:v") + 1] == "copy" and "-vf" not in cmd
+
+def test_other_formats_are_letterboxed_not_copied():
+    info = parse_probe(dict(FFPROBE_OUTPUT, streams=[{"codec_name": "hevc", "width": 1920, "height": 1080,
+                                                     "pix_fmt": "yuv420p", "avg_frame_rate": "25/1"}]))
+    plan = plan_clip(info, clip_start=3.5, duration=2)
+    # Re-encoding is frame accurate, so the in-point is not moved to a keyframe
+    assert plan == {"start": 3.5, "duration": 2, "copy": False}
+    cmd = clip_segment_cmd("clip.mov", plan, "seg.ts")
+    assert "pad=720:1280" in cmd[cmd.index("-vf") + 1] and cmd[cmd.index("-c:v") + 1] == "libx264"
+
+def test_probe_runs_once_per_file_version(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps(FFPROBE_OUTPUT).encode())
+
+    monkeypatch.setattr(clips.subprocess, "run", fake_run)
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"v1")
+    assert probe_media(str(clip)) == probe_media(str(clip))
+    assert len(calls) == 1
+    clip.write_bytes(b"v2-longer")
+    probe_media(str(clip))
+    assert len(calls) == 2
+
+def test_poster_is_remade_when_the_clip_changes(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd[0])
+        if cmd[0] == "ffmpeg":
+            with open(cmd[-1], "wb") as f:
+                f.write(f"poster of {open(cmd[cmd.index('-i') + 1]).read()}".encode())
+        return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps(FFPROBE_OUTPUT).encode())
+
+    monkeypatch.setattr(clips.subprocess, "run", fake_run)
+    clip = tmp_path / "clip.mp4"
+    clip.write_text("v1")
+    poster = clips.poster_frame(str(clip))
+    assert clips.poster_frame(str(clip)) == poster and calls.count("ffmpeg") == 1
+    clips.POSTER_CACHE.clear()  # a restarted worker still reuses the poster on disk
+    assert clips.poster_frame(str(clip)) == poster and calls.count("ffmpeg") == 1
+    clip.write_text("v2-longer")
+    assert clips.poster_frame(str(clip)) == poster and calls.count("ffmpeg") == 2
+    assert open(poster).read() == "poster of v2-longer"
+
+def test_plan_segments_follows_actual_clip_length(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_module, "probe_media", lambda path: parse_probe(FFPROBE_OUTPUT))
+    still = tmp_path / "still.jpg"
+    still.write_bytes(make_product_image(1, 64, 64))
+    media = [
+        {"start": "00:01", "end": "00:03", "file": "still"},
+        {"start": "00:03", "end": "00:10", "file": "clip", "clip_start": "00:01"},
+        {"start": "00:10", "end": "00:12", "file": "still"},
+    ]
+    segments = render_module.plan_segments(media, {"still": str(still), "clip": str(tmp_path / "clip.mp4")})
+    assert [(s["kind"], s["start"], s["duration"]) for s in segments] == [
+        ("black", 0.0, 1.0), ("still", 1.0, 2.0), ("clip", 3.0, 6.0), ("still", 9.0, 2.0),
+    ]
+
+@needs_ffmpeg
+def test_render_clip_and_still_without_python_decoding(tmp_path):
+    clip = tmp_path / "clip.mp4"
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", "testsrc=size=720x1280:rate=30:duration=4",
+                    "-c:v", "libx264", "-g", "30", "-pix_fmt", "yuv420p", str(clip)], check=True)
+    still = tmp_path / "still.jpg"
+    still.write_bytes(make_product_image(1, 600, 800))
+    storyboard = json.dumps({"script": "", "media": [
+        {"start": "00:00", "end": "00:02", "file": "still"},
+        {"start": "00:02", "end": "00:04", "file": "clip", "clip_start": "00:01"},
+    ]})
+    out = render_module.render_video(storyboard, [str(still), str(clip)], str(tmp_path / "out.mp4"))
+    info = probe_media(out)
+    assert (info["codec"], info["width"], info["height"]) == ("h264", 720, 1280)
+    assert 3.5 < info["duration"] < 4.5
@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+from video_mvp.backend.main import app
+from video_mvp.backend.utils.dedup import find_duplicates
+from video_mvp.backend.services.pipeline import dedupe_downloads
+from video_mvp.backend.benchmarks.standins import isolated_uploads, make_product_image, offline_environment
+
+client = TestClient(app)
+
+def _write(tmp_path, name, index, width, height):
+    path = tmp_path / name
+    path.write_bytes(make_product_image(index, width, height))
+    return str(path)
+
+def test_find_duplicates_keeps_highest_resolution(tmp_path):
+    small = _write(tmp_path, "small.jpg", 1, 246, 328)
+    large = _write(tmp_path, "large.jpg", 1, 1946, 2594)
+    medium = _write(tmp_path, "medium.jpg", 1, 600, 800)
+    other = _write(tmp_path, "other.jpg", 2, 600, 800)
+    replaced = find_duplicates([small, large, medium, other])
+    assert replaced == {small: large, medium: large}
+
+def test_dedupe_downloads_reports_savings(tmp_path):
+    downloaded = [
+        ("https://cdn/a.jpg?width=246", _write(tmp_path, "a_small.jpg", 1, 246, 328)),
+        ("https://cdn/a.jpg?width=1946", _write(tmp_path, "a_large.jpg", 1, 1946, 2594)),
+        ("https://cdn/b.jpg", _write(tmp_path, "b.jpg", 2, 600, 800)),
+    ]
+    kept, stats = dedupe_downloads(downloaded)
+    assert [url for url, _ in kept] == ["https://cdn/a.jpg?width=1946", "https://cdn/b.jpg"]
+    assert stats["vision_calls_saved"] == 1
+    assert stats["render_segments_saved"] == 1
+
+def test_input_api_drops_duplicate_variants(tmp_path):
+    with isolated_uploads(tmp_path), offline_environment(image_count=3) as (site, _):
+        response = client.post("/api/input", data={"product_url": site.product_url, "creative_prompt": "10 sec vid"})
+    data = response.json()
+    assert data["dedup"]["vision_calls_saved"] > 0
+    assert len(data["media_files"]) == data["dedup"]["images_kept"]
@@ -0,0 +1,62 @@
+import os
+from fastapi.testclient import TestClient
+from video_mvp.backend.main import app
+from video_mvp.backend.services import workflows
+from video_mvp.backend.services.delivery import publish_video, file_digest
+from video_mvp.backend.benchmarks.standins import isolated_uploads
+
+client = TestClient(app)
+
+def test_publish_video_is_content_addressed(tmp_path):
+    video_dir = tmp_path / "videos"
+    first = tmp_path / "render_a.mp4"
+    second = tmp_path / "render_b.mp4"
+    first.write_bytes(b"same video bytes")
+    second.write_bytes(b"same video bytes")
+    a = publish_video(str(first), str(video_dir))
+    b = publish_video(str(second), str(video_dir))
+    assert a == b
+    assert a["url"] == f"/videos/{file_digest(a['path'])}.mp4"
+    assert not first.exists() and not second.exists()
+    assert os.listdir(video_dir) == [os.path.basename(a["path"])]
+
+def test_video_endpoint_caching_and_ranges(tmp_path):
+    src = tmp_path / "render.mp4"
+    payload = os.urandom(200_000)
+    src.write_bytes(payload)
+    with isolated_uploads(tmp_path / "uploads") as uploads:
+        published = publish_video(str(src), os.path.join(uploads, "videos"))
+        r = client.get(published["url"])
+        assert r.status_code == 200
+        assert r.content == payload
+        assert r.headers["etag"] == published["etag"]
+        assert "immutable" in r.headers["cache-control"]
+        assert r.headers["content-type"] == "video/mp4"
+        r = client.get(published["url"], headers={"Range": "bytes=100-199"})
+        assert r.status_code == 206
+        assert r.content == payload[100:200]
+        assert r.headers["content-range"] == f"bytes 100-199/{len(payload)}"
+        r = client.get(published["url"], headers={"If-None-Match": published["etag"]})
+        assert r.status_code == 304
+        assert client.get("/videos/../main.py").status_code == 404
+        assert client.get("/videos/0123456789abcdef.mp4").status_code == 404
+
+def test_broken_render_is_not_published(tmp_path, monkeypatch):
+    monkeypatch.setattr(workflows, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(workflows, "VIDEO_DIR", str(tmp_path / "videos"))
+    still = tmp_path / "still.jpg"
+    still.write_bytes(b"not decoded here")
+    monkeypatch.setattr(workflows, "is_renderable", lambda path: True)
+
+    def broken_render(storyboard, media_files, output_path, **kwargs):
+        with open(output_path, "wb") as f:
+            f.write(b"00")
+        return output_path
+
+    monkeypatch.setattr(workflows, "render_video", broken_render)
+    r = client.post("/api/render_video", json={
+        "storyboard": '{"media": [{"start": "00:00", "end": "00:01", "file": "a"}]}',
+        "media_files": [str(still)]})
+    assert r.status_code == 500
+    assert not (tmp_path / "videos").exists()
+    assert os.listdir(tmp_path) == ["still.jpg"]
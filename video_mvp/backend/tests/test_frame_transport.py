@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pytest
+from video_mvp.backend.utils import frame_transport
+from video_mvp.backend.utils.frame_transport import FrameRing, letterbox_into, stream_frames, FRAME_SHAPE
+from video_mvp.backend.utils.clips import probe_media
+from video_mvp.backend.tools import render_video as render_module
+from video_mvp.backend.benchmarks.standins import make_product_image
+
+class _FrameSink:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, data):
+        self.frames.append(np.frombuffer(bytes(data), dtype=np.uint8).reshape(FRAME_SHAPE))
+
+def _write(tmp_path, name, index, width, height):
+    path = tmp_path / name
+    path.write_bytes(make_product_image(index, width, height))
+    return str(path)
+
+def test_letterbox_writes_into_the_destination():
+    src = np.full((2594, 1946, 3), 200, dtype=np.uint8)
+    dst = np.full(FRAME_SHAPE, 7, dtype=np.uint8)
+    assert letterbox_into(src, dst) is dst
+    # 1946x2594 fits 720x959, centered with black bars above and below
+    assert dst[0].max() == 0 and dst[-1].max() == 0
+    assert (dst[640] == 200).all()
+
+def test_ring_slots_are_reused_only_after_consumption():
+    ring = FrameRing(slots=2, shape=(2, 2, 3))
+    try:
+        for seq in range(2):
+            ring.acquire_write(seq, timeout=0.1)[...] = seq
+            ring.commit(seq)
+        with pytest.raises(TimeoutError):
+            ring.acquire_write(2, timeout=0.01)
+        assert ring.acquire_read(0, timeout=0.1).max() == 0
+        ring.release(0)
+        ring.acquire_write(2, timeout=0.1)[...] = 2
+    finally:
+        ring.close()
+
+@pytest.mark.parametrize("transport", ["shm", "pipe"])
+def test_stream_frames_in_order(tmp_path, transport):
+    a = _write(tmp_path, "a.jpg", 1, 600, 800)
+    b = _write(tmp_path, "b.jpg", 2, 1280, 720)
+    items = [(a, 0, 3), (None, 3, 2), (b, 5, 3)]
+    sink = _FrameSink()
+    assert stream_frames(items, sink, transport=transport, workers=2, slots=2) == 8
+    frames = sink.frames
+    assert len(frames) == 8
+    assert all((f == frames[0]).all() for f in frames[:3]) and frames[0].any()
+    assert not frames[3].any() and not frames[4].any()
+    # The landscape image is letterboxed with bars top and bottom
+    assert frames[5][0].max() == 0 and frames[5][640].any()
+
+def test_shm_falls_back_to_pipe_off_x86(tmp_path, monkeypatch):
+    monkeypatch.setattr(frame_transport.platform, "machine", lambda: "aarch64")
+    monkeypatch.setattr(frame_transport, "_stream_ring", None)  # must not be used
+    a = _write(tmp_path, "a.jpg", 1, 600, 800)
+    sink = _FrameSink()
+    assert stream_frames([(a, 0, 2)], sink, transport="shm") == 2 and len(sink.frames) == 2
+
+def test_unguarded_script_streams_once(tmp_path):
+    # No __main__ guard: a multiprocessing child would run the whole script again
+    image = _write(tmp_path, "a.jpg", 1, 600, 800)
+    script = tmp_path / "render_once.py"
+    script.write_text(
+        "import io\n"
+        "from video_mvp.backend.utils.frame_transport import stream_frames\n"
+        "print('started', flush=True)\n"
+        f"print(stream_frames([({image!r}, 0, 2), (None, 2, 1)], io.BytesIO(), workers=2))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    out = subprocess.run([sys.executable, str(script)], env=dict(os.environ, PYTHONPATH=root),
+                         capture_output=True, text=True, timeout=120, check=True).stdout
+    assert out.split() == ["started", "3"]
+
+def test_plan_still_frames_matches_writer_timeline(tmp_path):
+    still = _write(tmp_path, "still.jpg", 1, 64, 64)
+    media = [
+        {"start": "00:01", "end": "00:03", "file": "a"},
+        {"start": "00:03", "end": "00:04", "file": "missing"},
+        {"start": "00:04", "end": "00:06", "file": "a"},
+    ]
+    items, spans, total = render_module.plan_still_frames(media, {"a": still, "missing": str(tmp_path / "x.jpg")}, fps=30)
+    assert items == [(None, 0, 30), (still, 30, 60), (None, 90, 30), (still, 120, 60)]
+    assert spans == [(1.0, 2.0), (4.0, 2.0)] and total == 180
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None, reason="ffmpeg not installed")
+def test_streamed_render_is_a_single_encode(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_module, "FRAME_TRANSPORT", "shm")
+    still = _write(tmp_path, "still.jpg", 1, 600, 800)
+    storyboard = json.dumps({"script": "", "media": [{"start": "00:00", "end": "00:02", "file": "a"}]})
+    out = render_module.render_video(storyboard, [still], str(tmp_path / "out.mp4"))
+    info = probe_media(out)
+    assert (info["codec"], info["width"], info["height"]) == ("h264", 720, 1280)
@@ -1,7 +1,9 @@
 import os
 import tempfile
+import pytest
 from fastapi.testclient import TestClient
 from video_mvp.backend.main import app
+from video_mvp.backend.benchmarks.standins import isolated_uploads
 import json
 import cv2
 import numpy as np
@@ -11,7 +13,14 @@ import imagehash
 
 client = TestClient(app)
 
-def test_full_flow(tmp_path):
+@pytest.fixture
+def uploads(tmp_path):
+    # The endpoints save uploads and renders here instead of the repository's uploads/
+    with isolated_uploads(tmp_path / "uploads") as root:
+        os.makedirs(root, exist_ok=True)
+        yield root
+
+def test_full_flow(tmp_path, uploads):
     # Step 1: Create dummy image files
     img1 = tmp_path / "img1.jpg"
     img2 = tmp_path / "img2.jpg"
@@ -109,7 +118,7 @@ def test_video_frames_match_storyboard(tmp_path):
             mean = frames[f].mean(axis=(0,1))
             assert np.allclose(mean, colors[i], atol=5), f"Frame {f} does not match color {colors[i]}"
 
-def test_api_video_duration_and_media_coverage(tmp_path):
+def test_api_video_duration_and_media_coverage(tmp_path, uploads):
     # Create 3 dummy images with different colors
     img_paths = []
     colors = [(255,0,0), (0,255,0), (0,0,255)]
@@ -159,7 +168,7 @@ def test_api_video_duration_and_media_coverage(tmp_path):
     # Should be at least 3 unique frames (one per image)
     assert len(unique_means) >= 3
 
-def test_multistage_real_data_pipeline(tmp_path):
+def test_multistage_real_data_pipeline(tmp_path, uploads):
     import sys
     from pprint import pprint
     # --- Stage 1: Input ---
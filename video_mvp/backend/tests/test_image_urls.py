@@ -0,0 +1,69 @@
+from video_mvp.backend.utils.image_urls import absolutize, parse_srcset, declared_width, declared_height, canonical_key, select_variant
+from video_mvp.backend.tools.scrape_url import scrape_url
+from video_mvp.backend.benchmarks.standins import offline_environment
+
+def test_absolutize_uses_page_url():
+    page = "http://shop.example/products/plush"
+    assert absolutize("//cdn.example/a.jpg", page) == "http://cdn.example/a.jpg"
+    assert absolutize("/cdn/a.jpg", page) == "http://shop.example/cdn/a.jpg"
+    assert absolutize("a.jpg", page) == "http://shop.example/products/a.jpg"
+    assert absolutize("data:image/gif;base64,R0lGOD", page) is None
+
+def test_parse_srcset_widths_densities_and_commas():
+    srcset = "//cdn/a.jpg?width=246 246w, //cdn/a.jpg?width=600 600w,//cdn/w_100,h_100/b.jpg 2x, /c.jpg"
+    assert parse_srcset(srcset) == [
+        ("//cdn/a.jpg?width=246", 246, None),
+        ("//cdn/a.jpg?width=600", 600, None),
+        ("//cdn/w_100,h_100/b.jpg", None, 2.0),
+        ("/c.jpg", None, None),
+    ]
+
+def test_declared_width_and_canonical_key():
+    assert declared_width("https://cdn/files/IMG_1.jpg?v=17&width=990") == 990
+    assert declared_width("https://cdn/files/IMG_1_600x.jpg") == 600
+    assert declared_width("https://cdn/files/IMG_1_400x400@2x.jpg") == 800
+    assert declared_width("https://cdn/files/IMG_1.jpg") is None
+    assert declared_height("https://cdn/files/IMG_1_400x400@2x.jpg") == 800
+    assert declared_height("https://cdn/files/IMG_1_600x.jpg") is None
+    variants = [
+        "https://CDN/files/IMG_1.jpg?v=17&width=990",
+        "http://cdn/files/IMG_1_600x.jpg",
+        "https://cdn/files/IMG_1_x800_crop_center.jpg?v=3",
+        "https://cdn/files/IMG_1.jpg",
+    ]
+    assert len({canonical_key(u) for u in variants}) == 1
+    assert canonical_key("https://cdn/files/IMG_2.jpg") != canonical_key(variants[0])
+    # A bare "_x" is part of the name, not a size suffix
+    assert canonical_key("https://cdn/files/photo_x.jpg") != canonical_key("https://cdn/files/photo.jpg")
+    assert declared_width("https://cdn/files/photo_x.jpg") is None
+
+def test_select_variant_never_upscales():
+    variants = [("a246", 246), ("a713", 713), ("a823", 823), ("a1946", 1946), ("orig", None)]
+    assert select_variant(variants) == "a823"
+    assert select_variant([("a246", 246), ("orig", None)]) == "orig"
+    assert select_variant([("a246", 246), ("a600", 600)]) == "a600"
+
+def test_select_variant_covers_the_vertical_target_for_landscape_images():
+    landscape = parse_srcset("l720.jpg 720w, l1440.jpg 1440w, l2400.jpg 2400w, l3000.jpg 3000w")
+    # 16:9: a 720-wide variant is only 405 tall, 2400 wide is the first that reaches 1280
+    assert select_variant(landscape, aspect=9 / 16) == "l2400.jpg"
+    assert select_variant(landscape) == "l720.jpg"
+    assert select_variant(landscape[:2], aspect=9 / 16) == "l1440.jpg"
+    # Square variants whose URLs declare their height need no aspect
+    square = [("s_800x800.jpg", 800), ("s_1280x1280.jpg", 1280), ("s_2048x2048.jpg", 2048)]
+    assert select_variant(square) == "s_1280x1280.jpg"
+
+def test_select_variant_ranks_srcset_densities():
+    dense = [("src", None, None), ("a1x", None, 1.0), ("a2x", None, 2.0), ("a3x", None, 3.0)]
+    assert select_variant(dense) == "a2x"
+    assert select_variant([("a1x", None, 1.0), ("a1.5x", None, 1.5)]) == "a1.5x"
+    assert select_variant([("a823", 823)] + dense) == "a823"
+
+def test_scrape_url_groups_variants_offline():
+    with offline_environment(image_count=4) as (site, _):
+        result = scrape_url(site.product_url)
+    gallery = [u for u in result["images"] if "-zoom" not in u]
+    assert len(gallery) == 4
+    # The <img> is 1946x2594, so 990 is the narrowest variant that is 1280 tall
+    assert all(u.startswith(site.url) and u.endswith("width=990") for u in gallery)
+    assert not any("logo" in u or "banner" in u for u in result["images"])
@@ -0,0 +1,86 @@
+import subprocess
+import sys
+import threading
+import time
+from fastapi.testclient import TestClient
+from video_mvp.backend import main as main_module
+from video_mvp.backend.services.job_queue import JobQueue, Worker
+from video_mvp.backend.utils.cancellation import check_cancelled
+
+def test_same_key_enqueues_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    first = queue.enqueue("render", {"storyboard": "{}", "media_files": ["a.jpg"]})
+    again = queue.enqueue("render", {"media_files": ["a.jpg"], "storyboard": "{}"})
+    assert again["id"] == first["id"] and queue.counts()["queued"] == 1
+    assert queue.enqueue("render", {"storyboard": "{}"}, key="project-1")["id"] == "project-1"
+    assert queue.counts()["queued"] == 2
+
+def test_expired_lease_is_redelivered_and_stale_result_dropped(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.2)
+    job = queue.enqueue("analyze", {"creative_prompt": "x"})
+    assert queue.claim("worker-a")["id"] == job["id"]
+    assert queue.claim("worker-b") is None  # leased
+    time.sleep(0.3)  # worker-a died without heartbeating
+    redelivered = queue.claim("worker-b")
+    assert redelivered["id"] == job["id"] and redelivered["attempts"] == 2
+    assert not queue.heartbeat(job["id"], "worker-a")
+    assert not queue.complete(job["id"], "worker-a", {"late": True})
+    assert queue.complete(job["id"], "worker-b", {"ok": True})
+    assert queue.get(job["id"])["result"] == {"ok": True}
+
+def test_failures_retry_then_fail(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), max_attempts=2, retry_seconds=0)
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        raise RuntimeError("encoder crashed")
+
+    job = queue.enqueue("render", {"n": 1})
+    Worker(queue, {"render": flaky}).run(until_idle=True)
+    failed = queue.get(job["id"])
+    assert len(calls) == 2 and failed["status"] == "failed" and "encoder crashed" in failed["error"]
+    # Submitting a failed key again gives it a fresh set of attempts
+    assert queue.enqueue("render", {"n": 1})["status"] == "queued"
+
+def test_lost_lease_cancels_the_running_handler(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.db"), lease_seconds=0.3)
+    job = queue.enqueue("render", {})
+    cancelled = threading.Event()
+
+    def slow(payload):
+        # Another worker takes the job over while this one is still rendering
+        queue._conn().execute("UPDATE jobs SET lease_owner = 'other' WHERE id = ?", (job["id"],))
+        try:
+            while True:
+                check_cancelled()
+                time.sleep(0.01)
+        finally:
+            cancelled.set()
+
+    worker = Worker(queue, {"render": slow})
+    thread = threading.Thread(target=worker.run, kwargs={"until_idle": True})
+    thread.start()
+    assert cancelled.wait(5)
+    thread.join(5)
+    assert queue.get(job["id"])["status"] == "running"  # still owned by the other worker
+
+def test_jobs_api_enqueues_and_reports(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    monkeypatch.setattr(main_module, "job_queue", queue)
+    client = TestClient(main_module.app)
+    body = {"kind": "analyze", "payload": {"creative_prompt": "10 sec vid"}, "key": "item-1"}
+    r = client.post("/api/jobs", json=body)
+    assert r.status_code == 202 and r.json()["status"] == "queued" and r.json()["id"] == "item-1"
+    assert client.post("/api/jobs", json=body).json()["id"] == "item-1"
+    assert client.post("/api/jobs", json={"kind": "render", "payload": {}}).status_code == 422
+    assert client.post("/api/jobs", json={"kind": "transcode", "payload": {}}).status_code == 422
+    Worker(queue, {"analyze": lambda payload: {"storyboard": payload["creative_prompt"]}}).run(until_idle=True)
+    done = client.get("/api/jobs/item-1").json()
+    assert done["status"] == "done" and done["result"] == {"storyboard": "10 sec vid"}
+    assert client.get("/api/jobs/missing").status_code == 404
+
+def test_worker_does_not_build_the_api_app():
+    script = "import sys; import video_mvp.backend.worker; print('video_mvp.backend.main' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    assert out.split() == ["False"]
@@ -0,0 +1,116 @@
+import threading
+import time
+import pytest
+from video_mvp.backend.services.llm import LLMScheduler, LLMError, LLMDeadlineExceeded, TokenBucket, BULK, INTERACTIVE
+from video_mvp.backend.benchmarks.standins import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Describe this product."}]
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    servers = []
+
+    def start(**kwargs):
+        server = FakeOpenAIServer(**kwargs).start()
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-offline-standin")
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60, now=bucket._updated) == 0
+    bucket.take(60, now=bucket._updated)
+    assert bucket.wait_time(2, now=bucket._updated) == pytest.approx(2.0)
+    assert TokenBucket(per_minute=0).wait_time(10 ** 9, now=0) == 0
+
+def test_identical_calls_in_flight_share_one_request(fake_openai):
+    server = fake_openai(latency=0.2)
+    scheduler = LLMScheduler()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.chat(MESSAGES))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 5 and len(set(results)) == 1
+    assert server.requests == 1
+
+def test_interactive_calls_go_before_queued_bulk_calls(fake_openai):
+    fake_openai(latency=0.1)
+    scheduler = LLMScheduler(max_concurrent=1)
+    finished = []
+
+    def call(name, lane):
+        scheduler.chat([{"role": "user", "content": name}], lane=lane)
+        finished.append(name)
+
+    first = threading.Thread(target=call, args=("first", BULK))
+    first.start()
+    time.sleep(0.03)  # "first" holds the only slot
+    threads = [threading.Thread(target=call, args=(f"bulk-{i}", BULK)) for i in range(2)]
+    for t in threads:
+        t.start()
+        time.sleep(0.01)
+    threads.append(threading.Thread(target=call, args=("interactive", INTERACTIVE)))
+    threads[-1].start()
+    for t in [first] + threads:
+        t.join()
+    assert finished[:2] == ["first", "interactive"]
+
+def test_rate_limits_honour_retry_after(fake_openai):
+    server = fake_openai(status=lambda n: 429 if n <= 2 else 200, retry_after=0.1)
+    scheduler = LLMScheduler()
+    start = time.monotonic()
+    assert scheduler.chat(MESSAGES)
+    assert server.requests == 3
+    assert time.monotonic() - start >= 0.2
+
+def test_failures_raise_instead_of_returning_text(fake_openai):
+    server = fake_openai(status=lambda n: 400)
+    with pytest.raises(LLMError):
+        LLMScheduler().chat(MESSAGES)
+    assert server.requests == 1  # client errors are not retried
+    fake_openai(status=lambda n: 500)
+    with pytest.raises(LLMError):
+        LLMScheduler(max_retries=1).chat(MESSAGES)
+
+def test_slow_call_is_hedged_and_first_answer_wins(fake_openai):
+    # The first request stalls; its duplicate answers straight away
+    server = fake_openai(latency=lambda n: 3.0 if n == 1 else 0.01)
+    scheduler = LLMScheduler(hedge_ratio=1.0, hedge_after=0.1)
+    start = time.monotonic()
+    assert scheduler.chat(MESSAGES)
+    assert time.monotonic() - start < 1.5
+    assert server.requests == 2
+    stats = scheduler.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1 and stats["hedge_rate"] == 1.0
+
+def test_hedges_are_capped_by_the_budget(fake_openai):
+    server = fake_openai(latency=0.2)
+    scheduler = LLMScheduler(hedge_ratio=0.0, hedge_after=0.01)
+    scheduler.chat(MESSAGES)
+    assert server.requests == 1 and scheduler.stats()["hedges"] == 0
+
+def test_hedge_delay_follows_observed_p95(fake_openai):
+    fake_openai(latency=lambda n: 0.01)
+    scheduler = LLMScheduler(hedge_ratio=1.0)
+    assert scheduler._latency.get("llm_call") is None
+    for i in range(25):
+        scheduler.chat([{"role": "user", "content": f"call {i}"}])
+    assert 0 < scheduler._latency["llm_call"].percentile(0.95) < 1.0
+
+def test_deadline_returns_cached_then_fallback_answer(fake_openai):
+    fake_openai(latency=lambda n: 0.01 if n == 1 else 3.0)
+    scheduler = LLMScheduler(hedge_ratio=0.0)
+    first = scheduler.chat(MESSAGES)
+    start = time.monotonic()
+    assert scheduler.chat(MESSAGES, deadline=0.2) == first
+    assert scheduler.chat([{"role": "user", "content": "new"}], deadline=0.2, fallback="fallback") == "fallback"
+    with pytest.raises(LLMDeadlineExceeded):
+        scheduler.chat([{"role": "user", "content": "newer"}], deadline=0.2)
+    assert time.monotonic() - start < 2
@@ -0,0 +1,68 @@
+import json
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+from video_mvp.backend.main import app
+from video_mvp.backend.benchmarks.standins import isolated_uploads
+from video_mvp.backend.utils.cache import MemoCache
+from video_mvp.backend.utils.metrics import Registry, span, collect_timings, summarize_timings, record_cache, STAGE_SECONDS
+
+client = TestClient(app)
+
+def test_histogram_exposition_format():
+    registry = Registry()
+    hist = registry.histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+    hist.observe(0.05, stage="a")
+    hist.observe(0.5, stage="a")
+    hist.observe(5.0, stage="a")
+    text = registry.expose()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="a"} 3' in text
+
+def test_span_feeds_histogram_and_request_timings():
+    before = STAGE_SECONDS.count(stage="unit_test_stage")
+    with collect_timings() as spans:
+        with span("unit_test_stage") as sp:
+            sp["bytes"] = 42
+        record_cache("unit_test_cache", hit=True)
+        record_cache("unit_test_cache", hit=False)
+    assert STAGE_SECONDS.count(stage="unit_test_stage") == before + 1
+    summary = summarize_timings(spans)
+    assert summary["stages"]["unit_test_stage"]["count"] == 1
+    assert summary["stages"]["unit_test_stage"]["bytes"] == 42
+    assert summary["cache"]["unit_test_cache"] == {"hit": 1, "miss": 1}
+
+def test_memo_cache_counts_plain_gets():
+    cache = MemoCache(name="unit_test_memo")
+    cache.set("k", 1)
+    with collect_timings() as spans:
+        assert cache.get("k") == 1 and cache.get("missing") is None
+        assert cache.get_or_compute("k", lambda: 2) == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert summarize_timings(spans)["cache"]["unit_test_memo"] == {"hit": 2, "miss": 1}
+
+def test_metrics_endpoint_and_render_timings(tmp_path):
+    img_paths = []
+    for i, color in enumerate([(255, 0, 0), (0, 255, 0)]):
+        img_path = tmp_path / f"img{i}.jpg"
+        cv2.imwrite(str(img_path), np.full((100, 100, 3), color, dtype=np.uint8))
+        img_paths.append(str(img_path))
+    sb = {"script": "Test", "media": [
+        {"start": "00:00", "end": "00:02", "file": img_paths[0]},
+        {"start": "00:02", "end": "00:04", "file": img_paths[1]},
+    ]}
+    with isolated_uploads(tmp_path):
+        response = client.post("/api/render_video", json={
+            "storyboard": json.dumps(sb), "media_files": img_paths, "include_timings": True
+        })
+    assert response.status_code == 200
+    timings = response.json()["timings"]
+    assert timings["stages"]["image_decode"]["count"] >= 2
+    assert "frame_write" in timings["stages"]
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert 'video_mvp_stage_duration_seconds_count{stage="image_decode"}' in metrics.text
+    assert "video_mvp_http_request_duration_seconds_bucket" in metrics.text
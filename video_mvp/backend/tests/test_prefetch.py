@@ -0,0 +1,68 @@
+import threading
+import time
+from fastapi.testclient import TestClient
+from video_mvp.backend import main as main_module
+from video_mvp.backend.services import pipeline
+from video_mvp.backend.services import prefetch
+from video_mvp.backend.services.llm import LLM, BULK, INTERACTIVE, current_lane, llm_priority
+from video_mvp.backend.benchmarks.standins import isolated_uploads, offline_environment
+
+client = TestClient(main_module.app)
+
+def test_input_joins_prefetched_work(tmp_path, monkeypatch):
+    # Hedged duplicates would blur the request count
+    monkeypatch.setattr(LLM, "hedge_ratio", 0.0)
+    monkeypatch.setattr(LLM, "_hedge_credit", 0.0)
+    for cache in (pipeline.SCRAPE_CACHE, pipeline.DOWNLOAD_CACHE, pipeline.ANALYSIS_CACHE):
+        cache.clear()
+    with isolated_uploads(tmp_path), offline_environment(image_count=3, openai_latency=0.3) as (site, fake):
+        r = client.post("/api/prefetch", data={"product_url": site.product_url})
+        assert r.status_code == 202 and r.json() == {"status": "started"}
+        assert client.post("/api/prefetch", data={"product_url": site.product_url}).json() == {"status": "running"}
+        response = client.post("/api/input", data={"product_url": site.product_url, "creative_prompt": "10 sec vid"})
+        main_module.prefetcher.wait(site.product_url, pipeline.MAX_STORYBOARD_MEDIA, timeout=10)
+    assert response.status_code == 200
+    # Each image was described once, shared by the prefetch and the submit, plus one storyboard call
+    assert fake.requests == len(response.json()["media_files"]) + 1
+
+def test_input_joining_a_prefetch_does_not_wait_behind_bulk_calls(tmp_path, monkeypatch):
+    monkeypatch.setattr(LLM, "hedge_ratio", 0.0)
+    monkeypatch.setattr(LLM, "_hedge_credit", 0.0)
+    monkeypatch.setattr(LLM, "max_concurrent", 2)
+    for cache in (pipeline.SCRAPE_CACHE, pipeline.DOWNLOAD_CACHE, pipeline.ANALYSIS_CACHE):
+        cache.clear()
+    bulk_done = []
+
+    def bulk_call(i):
+        with llm_priority(BULK):
+            LLM.chat([{"role": "user", "content": f"batch item {i}"}], stage="batch_standin")
+        bulk_done.append(i)
+
+    with isolated_uploads(tmp_path), offline_environment(image_count=3, openai_latency=0.2) as (site, fake):
+        # Twenty queued batch calls keep both LLM slots busy for about two seconds
+        batch = [threading.Thread(target=bulk_call, args=(i,)) for i in range(20)]
+        for t in batch:
+            t.start()
+        deadline = time.monotonic() + 5
+        while LLM.stats()["waiting"] < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.post("/api/prefetch", data={"product_url": site.product_url}).status_code == 202
+        response = client.post("/api/input", data={"product_url": site.product_url, "creative_prompt": "10 sec vid"})
+        finished_before_input = len(bulk_done)
+        main_module.prefetcher.wait(site.product_url, pipeline.MAX_STORYBOARD_MEDIA, timeout=10)
+        for t in batch:
+            t.join(timeout=10)
+    assert response.status_code == 200
+    # The joined vision calls went ahead of the batch backlog instead of queueing behind it
+    assert finished_before_input < 20 and len(bulk_done) == 20
+
+def test_prefetch_vision_calls_run_in_the_interactive_lane(tmp_path, monkeypatch):
+    lanes = []
+    monkeypatch.setattr(prefetch, "scrape_product", lambda url: {"images": ["a"]})
+    monkeypatch.setattr(prefetch, "select_images", lambda product, n: product["images"])
+    monkeypatch.setattr(prefetch, "download_images", lambda urls, dest: [(u, f"{dest}/{u}.jpg") for u in urls])
+    monkeypatch.setattr(prefetch, "dedupe_downloads", lambda downloads: (downloads, []))
+    monkeypatch.setattr(prefetch, "describe_media", lambda paths: lanes.append(current_lane()) or {p: "" for p in paths})
+    with llm_priority(BULK):
+        assert prefetch.warm_product("https://shop.example/p", str(tmp_path), 3) == {"images": 1, "described": 1}
+    assert lanes == [INTERACTIVE]
@@ -0,0 +1,57 @@
+from fastapi.testclient import TestClient
+from video_mvp.backend.main import app
+from video_mvp.backend.services.ranking import rank_images, probe_image, PROBE_BYTES
+from video_mvp.backend.utils.metrics import collect_timings
+from video_mvp.backend.benchmarks.standins import isolated_uploads, offline_environment
+
+client = TestClient(app)
+
+def _candidate(url, position, gallery=False, alt="", width=None, height=None):
+    return {"url": url, "gallery": gallery, "position": position, "alt": alt, "width": width, "height": height}
+
+def test_cheap_signals_order_candidates():
+    candidates = [
+        _candidate("https://cdn/badge.png", 0, alt="Free shipping", width=80, height=80),
+        _candidate("https://cdn/promo.jpg", 1, alt="Plush sale", width=1500, height=400),
+        _candidate("https://cdn/hero.jpg", 2, gallery=True, alt="Strawberry plush front", width=1946, height=2594),
+        _candidate("https://cdn/zoom.jpg", 3, gallery=True, width=1946, height=2594),
+        _candidate("https://cdn/lifestyle.jpg", 4, alt="Plush on a sofa"),
+    ]
+    ranked = rank_images(candidates, "Strawberry Maxine Heatable Plush", top_n=3, probe=False)
+    assert ranked == ["https://cdn/hero.jpg", "https://cdn/zoom.jpg", "https://cdn/lifestyle.jpg"]
+    assert rank_images(candidates, top_n=0, probe=False) == []
+
+def test_probe_reads_only_the_header():
+    with offline_environment(image_count=1) as (site, _):
+        info = probe_image(f"{site.url}/cdn/shop/files/IMG_0.jpg?v=probe&width=1946")
+    assert (info["width"], info["height"]) == (1946, 2594)
+    assert info["content_length"] > PROBE_BYTES
+
+def test_probe_demotes_images_smaller_than_declared():
+    with offline_environment(image_count=2) as (site, _):
+        candidates = [
+            # Declares a big photo, but the server returns a 64px thumbnail
+            _candidate(f"{site.url}/cdn/shop/files/placeholder.jpg?v=probe", 0, gallery=True, alt="Plush",
+                       width=1946, height=2594),
+            _candidate(f"{site.url}/cdn/shop/files/IMG_1.jpg?v=probe&width=823", 1, gallery=True, alt="Plush"),
+        ]
+        assert rank_images(candidates, "Plush", top_n=1, probe=False) == [candidates[0]["url"]]
+        assert rank_images(candidates, "Plush", top_n=1) == [candidates[1]["url"]]
+
+def test_probes_record_their_spans_in_the_caller_context():
+    with offline_environment(image_count=2) as (site, _):
+        candidates = [_candidate(f"{site.url}/cdn/shop/files/IMG_{i}.jpg?v=spans", i, gallery=True) for i in range(2)]
+        with collect_timings() as spans:
+            rank_images(candidates, top_n=2)
+    assert [s["stage"] for s in spans].count("image_probe") == 2
+
+def test_input_api_limits_downloads_to_max_images(tmp_path):
+    with isolated_uploads(tmp_path), offline_environment(image_count=6) as (site, _):
+        response = client.post("/api/input", data={
+            "product_url": site.product_url, "creative_prompt": "10 sec vid", "max_images": "2",
+        })
+    data = response.json()
+    assert response.status_code == 200
+    assert data["dedup"]["images_in"] == 2
+    assert len(data["media_files"]) == 2
+    assert "image_candidates" not in data["product"]
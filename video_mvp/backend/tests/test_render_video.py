@@ -1,10 +1,11 @@
 import os
 import tempfile
+import pytest
 from PIL import Image
-from video_mvp.backend.tools.render_video import render_video
+from video_mvp.backend.tools.render_video import RenderError, render_video
 import json
 
-def test_render_video_basic(tmp_path):
+def test_render_video_failure_raises(tmp_path):
     # Create two dummy image files
     img1 = tmp_path / "img1.jpg"
     img2 = tmp_path / "img2.jpg"
@@ -18,10 +19,10 @@ def test_render_video_basic(tmp_path):
 00:02-00:04 - {img2}
 [END STORYBOARD]""".format(img1=img1, img2=img2)
     output_path = tmp_path / "output.mp4"
-    result = render_video(storyboard, [str(img1), str(img2)], str(output_path))
-    assert os.path.exists(result)
-    assert result.endswith(".mp4")
-    assert os.path.getsize(result) > 0
+    # Not a JSON storyboard: the render fails and must not leave a file that looks like a video
+    with pytest.raises(RenderError):
+        render_video(storyboard, [str(img1), str(img2)], str(output_path))
+    assert not output_path.exists()
 
 def test_render_video_with_local_images(tmp_path):
     # Create 3 dummy images
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from video_mvp.backend import main as main_module
+from video_mvp.backend.utils.startup import WarmUp, role_from_env, stack_modules
+from video_mvp.backend.benchmarks.run import import_profile
+
+HEAVY = ["cv2", "numpy", "openai", "bs4", "PIL", "requests", "imagehash"]
+
+def _worker_state(role: str) -> dict:
+    # A fresh interpreter: this one has long since imported everything
+    script = (
+        "import json, sys\n"
+        "from video_mvp.backend import main\n"
+        f"heavy = [m for m in {HEAVY!r} if m in sys.modules]\n"
+        "print(json.dumps({'heavy': heavy, 'paths': sorted(main.app.openapi()['paths'])}))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", script], env=dict(os.environ, VIDEO_MVP_ROLE=role),
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+@pytest.mark.parametrize("role, served, absent", [
+    ("api", "/api/input", "/api/render_video"),
+    ("render", "/api/render_video", "/api/input"),
+])
+def test_roles_import_no_heavy_modules_and_serve_their_routes(role, served, absent):
+    state = _worker_state(role)
+    assert state["heavy"] == []
+    assert served in state["paths"] and absent not in state["paths"]
+    assert "/healthz" in state["paths"] and "/videos/{name}" in state["paths"]
+
+def test_warm_up_imports_only_the_role_stack():
+    assert "cv2" not in stack_modules("api") and "openai" not in stack_modules("render")
+    warm_up = WarmUp("render").start()
+    assert warm_up.wait(30)
+    assert warm_up.status()["warm"] and set(warm_up.seconds) >= {"numpy", "cv2"}
+
+def test_unknown_role_is_rejected(monkeypatch):
+    monkeypatch.setenv("VIDEO_MVP_ROLE", "renderer")
+    with pytest.raises(ValueError):
+        role_from_env()
+
+def test_healthz_reports_warm_up():
+    client = TestClient(main_module.app)
+    assert client.get("/healthz").json()["status"] == "ok"
+    with TestClient(main_module.app) as started:
+        assert main_module.warm_up.wait(30)
+        body = started.get("/healthz", params={"require_warm": True}).json()
+    assert body["role"] == "all" and body["warm"] and body["status"] == "ok"
+
+def test_import_profile_ranks_outermost_imports():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |   fastapi.types\n"
+        "import time:       200 |       5000 | fastapi\n"
+        "import time:       300 |       2000 | json\n"
+    )
+    assert import_profile(stderr, top=2) == [{"module": "fastapi", "cumulative_s": 0.005},
+                                             {"module": "json", "cumulative_s": 0.002}]
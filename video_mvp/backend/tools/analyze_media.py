@@ -1,34 +1,38 @@
 from typing import List, Dict
-import os
-import openai
+from concurrent.futures import ThreadPoolExecutor
 import base64
+import contextvars
+from ..services.llm import LLM
 
 # Placeholder for agent tool registration
 def function_tool(func):
     return func
 
+def describe_image(path: str) -> str:
+    """Describe one image for a marketing video (OpenAI Vision, gpt-4o). Raises ``LLMError``."""
+    with open(path, "rb") as f:
+        img_bytes = f.read()
+    img_b64 = base64.b64encode(img_bytes).decode("utf-8")
+    return LLM.chat(
+        [
+            {"role": "user", "content": [
+                {"type": "text", "text": "Describe this image for a marketing video."},
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}}
+            ]}
+        ],
+        max_tokens=256, stage="vision_call", nbytes=len(img_bytes),
+    )
+
 @function_tool
 def analyze_media(media_paths: List[str]) -> Dict[str, str]:
-    """Analyze each media file and return a description using OpenAI Vision (gpt-4o)."""
-    client = openai.OpenAI()
-    results = {}
-    for path in media_paths:
-        try:
-            with open(path, "rb") as f:
-                img_bytes = f.read()
-                img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "user", "content": [
-                            {"type": "text", "text": "Describe this image for a marketing video."},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}}
-                        ]}
-                    ],
-                    max_tokens=256
-                )
-                desc = response.choices[0].message.content
-                results[path] = desc
-        except Exception as e:
-            results[path] = f"Error analyzing {path}: {e}"
-    return results 
\ No newline at end of file
+    """Analyze each media file and return a description using OpenAI Vision (gpt-4o).
+
+    Images are described concurrently; the shared LLM scheduler keeps the calls
+    within the provider's rate limits. Raises ``LLMError`` if any call fails.
+    """
+    if not media_paths:
+        return {}
+    # Each call runs in a copy of this context so its spans and LLM lane carry over
+    with ThreadPoolExecutor(max_workers=min(8, len(media_paths)), thread_name_prefix="vision") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, describe_image, path) for path in media_paths]
+        return {path: future.result() for path, future in zip(media_paths, futures)}
@@ -1,27 +1,309 @@
-from typing import List
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
 import re
 import os
 import logging
 import json
-from PIL import Image
-import cv2
-import numpy as np
 import subprocess
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from ..utils.metrics import span
+from ..utils.clips import (is_video_file, probe_media, plan_clip, clip_segment_cmd, still_segment_cmd,
+                           black_segment_cmd, concat_cmd, write_concat_list, audio_args, video_encode_args)
+from ..utils.captions import caption_cues, segment_cues, write_srt, subtitles_filter
+from ..utils.cancellation import Cancelled, check_cancelled, current_token, run_cancellable
+
+# OpenCV, NumPy and the compositor pool are imported by the functions that render, so
+# importing this module (e.g. in an API-only worker) stays cheap
+if TYPE_CHECKING:
+    from ..utils.frame_transport import FrameItem
+
+logger = logging.getLogger(__name__)
 
 # Placeholder for agent tool registration
 def function_tool(func):
     return func
 
+# ffmpeg processes run in parallel when a storyboard is rendered as segments
+SEGMENT_WORKERS = min(4, os.cpu_count() or 1)
+# Stills are composited in worker processes and streamed into one ffmpeg encode over a
+# pipe ("pipe") or, opt-in and x86 only, a shared-memory ring ("shm"); "off" keeps the
+# OpenCV writer + re-encode
+FRAME_TRANSPORT = os.environ.get("VIDEO_MVP_FRAME_TRANSPORT", "pipe")
+RENDER_FPS = int(os.environ.get("VIDEO_MVP_RENDER_FPS", "1"))
+COMPOSITOR_WORKERS = int(os.environ.get("VIDEO_MVP_COMPOSITOR_WORKERS", "2"))
+
+
+class RenderError(RuntimeError):
+    """The render failed; no usable video was written."""
+
+
+def is_valid_video(path: str) -> bool:
+    """Cheap check that ``path`` is an MP4 (an ``ftyp`` box up front), not an empty or stray file."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+    except OSError:
+        return False
+    return len(header) == 12 and header[4:8] == b"ftyp"
+
+
+def validate_video(path: str) -> str:
+    if not is_valid_video(path):
+        raise RenderError(f"Render produced no valid video at {path}")
+    return path
+
+
+def _seconds(timestamp) -> float:
+    """Storyboard "MM:SS" (or plain seconds) to seconds."""
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    parts = str(timestamp).split(":")
+    return int(parts[0]) * 60 + float(parts[1]) if len(parts) > 1 else float(parts[0])
+
+
+def plan_segments(media_list: List[dict], file_map: dict) -> List[dict]:
+    """Turn storyboard items into timeline segments (gaps become black segments).
+
+    A clip's slot [start, end] maps onto the clip window [clip_start, clip_start + (end - start)],
+    ``clip_start`` defaulting to 0. Gaps are taken from storyboard time, but segment start times
+    follow the actual length of earlier segments (a clip can be shorter than its slot).
+    """
+    segments = []
+    cursor = 0.0  # output timeline
+    storyboard_cursor = 0.0  # end of the previous item in storyboard time
+    for item in media_list:
+        media_path = file_map.get(item["file"], item["file"])
+        start_s = _seconds(item["start"])
+        duration = max(1.0, _seconds(item["end"]) - start_s)
+        if start_s > storyboard_cursor:
+            gap = start_s - storyboard_cursor
+            segments.append({"kind": "black", "start": cursor, "duration": gap})
+            cursor += gap
+        storyboard_cursor = max(storyboard_cursor, start_s + duration)
+        if is_video_file(media_path):
+            try:
+                info = probe_media(media_path)
+            except Exception as e:
+                logger.warning("[render_video] Failed to probe %s, skipping: %s", media_path, e)
+                continue
+            plan = plan_clip(info, _seconds(item.get("clip_start", 0)), duration)
+            if plan["duration"] <= 0:
+                continue
+            segments.append({"kind": "clip", "path": media_path, "start": cursor,
+                             "duration": plan["duration"], "plan": plan})
+            cursor += plan["duration"]
+        elif os.path.exists(media_path):
+            segments.append({"kind": "still", "path": media_path, "start": cursor, "duration": duration})
+            cursor += duration
+        else:
+            logger.warning("[render_video] Missing media %s, skipping", media_path)
+    return segments
+
+
+def _segment_cmd(segment: dict, out_path: str, video_filter: Optional[str] = None) -> List[str]:
+    if segment["kind"] == "clip":
+        return clip_segment_cmd(segment["path"], segment["plan"], out_path, video_filter)
+    if segment["kind"] == "still":
+        return still_segment_cmd(segment["path"], segment["duration"], out_path, video_filter)
+    return black_segment_cmd(segment["duration"], out_path, video_filter)
+
+
+def write_captions(script: str, media_spans: List[Tuple[float, float]], srt_path: str) -> Optional[str]:
+    """Write the script as SRT timed from (start, duration) media spans; returns the burn-in filter."""
+    cues = caption_cues(script, media_spans)
+    if not cues:
+        return None
+    return subtitles_filter(write_srt(cues, srt_path))
+
+
+def _run_ffmpeg(cmd: List[str]) -> None:
+    run_cancellable(cmd, current_token())
+
+
+def run_final_encode(build_cmd: Callable[[Optional[str]], List[str]], video_filter: Optional[str],
+                     output_path: str, stage: str, runner: Callable[[List[str]], None] = _run_ffmpeg) -> None:
+    """Run the one ffmpeg pass that produces the output (captions and audio included).
+
+    If burning in captions fails (e.g. an ffmpeg built without libass) the
+    pass is retried without them rather than losing the render.
+    """
+    try:
+        with span(stage) as sp:
+            runner(build_cmd(video_filter))
+            sp["bytes"] = os.path.getsize(output_path)
+    except subprocess.CalledProcessError as e:
+        if not video_filter:
+            raise
+        logger.warning("[render_video] Caption burn-in failed, rendering without captions: %s",
+                       (e.stderr or b"").decode("utf-8", "replace").strip())
+        with span(stage) as sp:
+            runner(build_cmd(None))
+            sp["bytes"] = os.path.getsize(output_path)
+
+
+def plan_still_frames(media_list: List[dict], file_map: dict,
+                      fps: int = RENDER_FPS) -> Tuple[List["FrameItem"], List[Tuple[float, float]], int]:
+    """Frame items for a stills storyboard (same timeline as the OpenCV writer path).
+
+    Returns the items, the (start, duration) of each still for caption timing,
+    and the total frame count. Unreadable files are skipped from their
+    headers alone; nothing is decoded here.
+    """
+    import cv2
+    items, media_spans, frame = [], [], 0
+    for item in media_list:
+        media_path = file_map.get(item["file"], item["file"])
+        start_s = _seconds(item["start"])
+        duration = max(1.0, _seconds(item["end"]) - start_s)
+        if not cv2.haveImageReader(media_path):
+            logger.warning("[render_video] Failed to read %s, skipping", media_path)
+            continue
+        start_frame = int(round(start_s * fps))
+        if start_frame > frame:
+            items.append((None, frame, start_frame - frame))
+            frame = start_frame
+        count = int(round(duration * fps))
+        items.append((media_path, frame, count))
+        media_spans.append((frame / fps, count / fps))
+        frame += count
+    total = int(round(_seconds(media_list[-1]["end"]) * fps)) if media_list else 0
+    if total > frame:
+        items.append((None, frame, total - frame))
+        frame = total
+    return items, media_spans, frame
+
+
+def feed_ffmpeg(cmd: List[str], items: List["FrameItem"]) -> None:
+    """Run an ffmpeg reading raw frames on stdin, fed by the compositor workers."""
+    import numpy as np
+    from ..utils.frame_transport import FRAME_SHAPE, stream_frames
+    token = current_token()
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+        # Killing ffmpeg also stops the feeder: its next write fails with a broken pipe
+        unregister = token.on_cancel(proc.kill) if token else lambda: None
+        try:
+            with span("frame_write") as sp:
+                frames = stream_frames(items, proc.stdin, transport=FRAME_TRANSPORT, workers=COMPOSITOR_WORKERS)
+                sp["bytes"] = frames * int(np.prod(FRAME_SHAPE))
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass  # ffmpeg exited early; its exit code and stderr say why
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            unregister()
+        check_cancelled()
+        if proc.wait() != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr.read())
+
+
+def render_stills_streamed(media_list: List[dict], file_map: dict, output_path: str, script: str = "",
+                           audio_path: Optional[str] = None, fps: int = RENDER_FPS) -> str:
+    """Render a stills storyboard in one ffmpeg encode fed over the frame transport."""
+    from ..utils.frame_transport import rawvideo_input_args
+    items, media_spans, total_frames = plan_still_frames(media_list, file_map, fps)
+    if not media_spans:
+        raise ValueError("No renderable media")
+    srt_path = os.path.splitext(output_path)[0] + '.srt'
+    audio_in, audio_out = audio_args(audio_path, total_frames / fps)
+
+    def ffmpeg_cmd(video_filter: Optional[str]) -> List[str]:
+        return (['ffmpeg', '-y', '-v', 'error'] + rawvideo_input_args(fps) + audio_in
+                + video_encode_args(video_filter) + audio_out + ['-movflags', '+faststart', output_path])
+
+    try:
+        video_filter = write_captions(script, media_spans, srt_path) if script else None
+        run_final_encode(ffmpeg_cmd, video_filter, output_path, "ffmpeg_encode",
+                         runner=lambda cmd: feed_ffmpeg(cmd, items))
+    finally:
+        if os.path.exists(srt_path):
+            os.remove(srt_path)
+    logger.info("[render_video] Video written to %s (%d frames, %s transport)", output_path, total_frames, FRAME_TRANSPORT)
+    return output_path
+
+
+def render_segments(segments: List[dict], output_path: str, script: str = "",
+                    audio_path: Optional[str] = None) -> str:
+    """Encode each segment with ffmpeg (stream copy for matching clips), then concat.
+
+    Captions are timed over the whole timeline, split at the segment cuts and
+    burned into each segment during its own encode; only a clip that carries
+    captions loses its stream copy. The concat is always a stream copy, with
+    the audio track muxed in the same pass.
+    """
+    if not segments:
+        raise ValueError("No renderable media")
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(os.path.abspath(output_path)))
+    # Segment encodes run on pool threads, outside this context
+    token = current_token()
+    try:
+        paths = [os.path.join(work_dir, f"seg_{i:04d}.ts") for i in range(len(segments))]
+        media_spans = [(seg["start"], seg["duration"]) for seg in segments if seg["kind"] != "black"]
+        cues = caption_cues(script, media_spans) if script else []
+
+        def encode(i: int) -> None:
+            segment = segments[i]
+            local_cues = segment_cues(cues, segment["start"], segment["duration"])
+            video_filter = (subtitles_filter(write_srt(local_cues, os.path.join(work_dir, f"seg_{i:04d}.srt")))
+                            if local_cues else None)
+            copy = segment.get("plan", {}).get("copy") and not video_filter
+            with span("segment_" + ("copy" if copy else "encode")) as sp:
+                try:
+                    run_cancellable(_segment_cmd(segment, paths[i], video_filter), token)
+                except subprocess.CalledProcessError as e:
+                    if not video_filter:
+                        raise
+                    # e.g. an ffmpeg built without libass: keep the segment, drop its captions
+                    logger.warning("[render_video] Caption burn-in failed, segment %d without captions: %s",
+                                   i, (e.stderr or b"").decode("utf-8", "replace").strip())
+                    run_cancellable(_segment_cmd(segment, paths[i]), token)
+                sp["bytes"] = os.path.getsize(paths[i])
+
+        with ThreadPoolExecutor(max_workers=SEGMENT_WORKERS, thread_name_prefix="render-segment") as pool:
+            list(pool.map(encode, range(len(segments))))
+        list_path = write_concat_list(paths, os.path.join(work_dir, "segments.txt"))
+        total = sum(seg["duration"] for seg in segments)
+        with span("ffmpeg_concat") as sp:
+            _run_ffmpeg(concat_cmd(list_path, output_path, audio_path, total))
+            sp["bytes"] = os.path.getsize(output_path)
+        logger.info("[render_video] Video written to %s from %d segments", output_path, len(segments))
+        return output_path
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
 @function_tool
-def render_video(storyboard: str, media_files: List[str], output_path: str) -> str:
-    """Render a video from storyboard (JSON) and media files using OpenCV."""
+def render_video(storyboard: str, media_files: List[str], output_path: str,
+                 captions: bool = True, audio_path: Optional[str] = None) -> str:
+    """Render a video from storyboard (JSON) and media files using OpenCV.
+
+    The storyboard ``script`` is burned in as captions (unless ``captions`` is
+    False) and ``audio_path`` (voiceover/music) is muxed in, both in the final
+    ffmpeg encode. Raises ``Cancelled`` if the render is superseded while it runs
+    and ``RenderError`` if it fails; either way no output file is left behind.
+    """
+    import cv2
+    import numpy as np
+    from ..utils.frame_transport import TRANSPORTS
     try:
-        print(f"[render_video] Storyboard (JSON):\n{storyboard}")
-        print(f"[render_video] Media files: {media_files}")
+        logger.debug("[render_video] Storyboard (JSON): %s", storyboard)
+        logger.debug("[render_video] Media files: %s", media_files)
         data = json.loads(storyboard)
         media_list = data.get("media", [])
+        script = data.get("script", "") if captions else ""
         if not media_files or not media_list:
             raise ValueError("No media files provided")
+        storyboard_files = [item["file"] for item in media_list]
+        file_map = {storyboard_files[i]: media_files[i] for i in range(len(media_files))}
+        # Video clips go through ffmpeg segment by segment; stills-only storyboards keep the frame writer
+        if any(is_video_file(file_map.get(f, f)) for f in storyboard_files):
+            return validate_video(render_segments(plan_segments(media_list, file_map), output_path, script, audio_path))
+        if FRAME_TRANSPORT in TRANSPORTS and shutil.which("ffmpeg"):
+            return validate_video(render_stills_streamed(media_list, file_map, output_path, script, audio_path))
         # --- Set output video size to 720x1280 (9:16) ---
         width, height = 720, 1280
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -34,9 +316,7 @@ def render_video(storyboard: str, media_files: List[str], output_path: str) -> s
         fps = 1
         out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
         current_frame = 0
-        # Build a mapping from storyboard file path to local file path
-        storyboard_files = [item["file"] for item in media_list]
-        file_map = {storyboard_files[i]: media_files[i] for i in range(len(media_files))}
+        media_spans = []  # (start, duration) in seconds of each written item, for caption timing
         for idx, item in enumerate(media_list):
             media_path = file_map.get(item["file"], item["file"])
             start = item["start"]
@@ -44,10 +324,12 @@ def render_video(storyboard: str, media_files: List[str], output_path: str) -> s
             start_s = int(start.split(":")[0])*60 + int(start.split(":")[1])
             end_s = int(end.split(":")[0])*60 + int(end.split(":")[1])
             duration = max(1, end_s - start_s)
-            print(f"[render_video] Adding {media_path} for {duration} seconds")
-            frame = cv2.imread(media_path)
+            check_cancelled()
+            logger.info("[render_video] Adding %s for %s seconds", media_path, duration)
+            with span("image_decode"):
+                frame = cv2.imread(media_path)
             if frame is None:
-                print(f"[render_video] Failed to read {media_path}, skipping")
+                logger.warning("[render_video] Failed to read %s, skipping", media_path)
                 continue
             # --- Resize and pad to 720x1280 (centered, black bars) ---
             h, w = frame.shape[:2]
@@ -58,38 +340,59 @@ def render_video(storyboard: str, media_files: List[str], output_path: str) -> s
             y_off = (height - new_h) // 2
             x_off = (width - new_w) // 2
             padded[y_off:y_off+new_h, x_off:x_off+new_w] = resized
-            # Pad with black frames if there's a gap
-            while current_frame < start_s:
-                out.write(np.zeros((height, width, 3), dtype=np.uint8))
-                current_frame += 1
-            for _ in range(duration):
-                out.write(padded)
-                current_frame += 1
+            with span("frame_write") as sp:
+                # Pad with black frames if there's a gap
+                while current_frame < start_s:
+                    out.write(np.zeros((height, width, 3), dtype=np.uint8))
+                    current_frame += 1
+                media_spans.append((current_frame / fps, duration / fps))
+                for _ in range(duration):
+                    out.write(padded)
+                    current_frame += 1
+                sp["bytes"] = padded.nbytes * duration
         # Pad to total duration with black frames if needed
         while current_frame < total_duration:
             out.write(np.zeros((height, width, 3), dtype=np.uint8))
             current_frame += 1
         out.release()
-        print(f"[render_video] Video written to {output_path}")
+        logger.info("[render_video] Video written to %s", output_path)
 
-        # --- Post-process: re-encode to H.264 for browser compatibility ---
+        # --- Post-process: re-encode to H.264 for browser compatibility (captions and audio in the same pass) ---
         h264_path = output_path.replace('.mp4', '_h264.mp4')
-        ffmpeg_cmd = [
-            'ffmpeg', '-y', '-i', output_path,
-            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
-            h264_path
-        ]
+        srt_path = os.path.splitext(output_path)[0] + '.srt'
+        audio_in, audio_out = audio_args(audio_path, current_frame / fps)
+
+        def ffmpeg_cmd(video_filter: Optional[str]) -> List[str]:
+            return (['ffmpeg', '-y', '-i', output_path] + audio_in + video_encode_args(video_filter)
+                    + audio_out + ['-movflags', '+faststart', h264_path])
+
         try:
-            print(f"[render_video] Running ffmpeg: {' '.join(ffmpeg_cmd)}")
-            subprocess.run(ffmpeg_cmd, check=True)
+            video_filter = write_captions(script, media_spans, srt_path) if script else None
+            logger.info("[render_video] Running ffmpeg: %s", ' '.join(ffmpeg_cmd(video_filter)))
+            run_final_encode(ffmpeg_cmd, video_filter, h264_path, "ffmpeg_encode")
             # Replace original with h264 version
             os.replace(h264_path, output_path)
-            print(f"[render_video] Re-encoded video to H.264 at {output_path}")
+            logger.info("[render_video] Re-encoded video to H.264 at %s", output_path)
+        except Cancelled:
+            raise
         except Exception as e:
-            print(f"[render_video] ffmpeg re-encode failed: {e}")
-        return output_path
+            logger.warning("[render_video] ffmpeg re-encode failed: %s", e)
+        finally:
+            for path in (srt_path, h264_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        return validate_video(output_path)
+    except Cancelled:
+        # Superseded: leave nothing half-written behind
+        logger.info("[render_video] Render of %s cancelled", output_path)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
     except Exception as e:
-        print(f"[render_video] Exception: {e}")
-        with open(output_path, "wb") as f:
-            f.write(b"00")
-        return output_path 
\ No newline at end of file
+        # Callers publish and cache what this returns, so a failure must not look like a video
+        logger.exception("[render_video] Render of %s failed: %s", output_path, e)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if isinstance(e, RenderError):
+            raise
+        raise RenderError(f"Render failed: {e}") from e 
\ No newline at end of file
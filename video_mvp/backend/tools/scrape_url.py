@@ -1,15 +1,87 @@
-from typing import Dict, List
-import requests
-from bs4 import BeautifulSoup
+from typing import Dict, List, Optional
+from ..utils.metrics import span
+from ..utils.image_urls import absolutize, parse_srcset, declared_width, canonical_key, select_variant
 
 # Placeholder for agent tool registration
 def function_tool(func):
     return func
 
+GALLERY_CLASSES = ["product__media", "product-gallery", "product__media-list", "product__media-wrapper"]
+SKIP_KEYWORDS = ["icon", "logo", "thumb", "sprite", "favicon", "banner", "arrow", "cart", "star"]
+MAX_IMAGES = 10
+# Candidates handed to the relevance pre-ranker (see services/ranking.py)
+MAX_CANDIDATES = 40
+
+
+def collect_image_candidates(soup: "BeautifulSoup", page_url: str) -> List[Dict]:
+    """Group every <img> reference on the page by asset, gallery images first.
+
+    Each candidate holds all size variants seen for one asset (from src,
+    data-src, srcset and data-srcset) and the variant chosen for rendering.
+    """
+    gallery_imgs = []
+    for gallery_class in GALLERY_CLASSES:
+        for g in soup.find_all(class_=gallery_class):
+            gallery_imgs.extend(g.find_all("img"))
+    gallery_ids = {id(img) for img in gallery_imgs}
+    # Tags compare by content, so de-duplicate by identity to keep identical <img>s in different places
+    ordered, seen = [], set()
+    for img in gallery_imgs + soup.find_all("img"):
+        if id(img) not in seen:
+            seen.add(id(img))
+            ordered.append(img)
+    candidates: Dict[str, Dict] = {}
+    for position, img in enumerate(ordered):
+        variants = []
+        for attr in ("src", "data-src"):
+            url = absolutize(img.get(attr), page_url)
+            if url:
+                variants.append((url, declared_width(url), None))
+        for attr in ("srcset", "data-srcset"):
+            for raw_url, width, density in parse_srcset(img.get(attr)):
+                url = absolutize(raw_url, page_url)
+                if url:
+                    variants.append((url, width or declared_width(url), density))
+        for url, width, density in variants:
+            key = canonical_key(url)
+            candidate = candidates.get(key)
+            if candidate is None:
+                candidate = candidates[key] = {
+                    "key": key,
+                    "gallery": id(img) in gallery_ids,
+                    "position": position,
+                    "alt": img.get("alt", ""),
+                    "width": _int_attr(img.get("width")),
+                    "height": _int_attr(img.get("height")),
+                    "variants": [],
+                }
+            if (url, width, density) not in candidate["variants"]:
+                candidate["variants"].append((url, width, density))
+    for candidate in candidates.values():
+        width, height = candidate["width"], candidate["height"]
+        candidate["url"] = select_variant(candidate["variants"], aspect=height / width if width and height else None)
+    return list(candidates.values())
+
+
+def _int_attr(value) -> Optional[int]:
+    try:
+        return int(str(value).strip().rstrip("px"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_relevant(img_url: str) -> bool:
+    return not any(kw in img_url.lower() for kw in SKIP_KEYWORDS)
+
+
 @function_tool
 def scrape_url(url: str) -> Dict:
     """Scrape product title, description, and images from a product page URL."""
-    resp = requests.get(url)
+    import requests
+    from bs4 import BeautifulSoup
+    with span("scrape") as sp:
+        resp = requests.get(url)
+        sp["bytes"] = len(resp.content)
     soup = BeautifulSoup(resp.text, 'html.parser')
     # Title
     title = soup.find('title').text.strip() if soup.find('title') else ''
@@ -23,75 +95,19 @@ def scrape_url(url: str) -> Dict:
         desc_div = soup.find('div', {'class': 'product__description'})
         if desc_div:
             desc = desc_div.get_text(strip=True)
-    # Try to find product gallery images first
-    gallery_imgs = []
-    # Look for common product gallery containers
-    for gallery_class in ["product__media", "product-gallery", "product__media-list", "product__media-wrapper"]:
-        gallery = soup.find_all(class_=gallery_class)
-        for g in gallery:
-            for img in g.find_all("img"):
-                src = img.get("src")
-                if src:
-                    if src.startswith('//'):
-                        src = 'https:' + src
-                    elif src.startswith('/'):
-                        src = 'https://www.uncomfy.store' + src
-                    gallery_imgs.append(src)
-                data_src = img.get("data-src")
-                if data_src:
-                    if data_src.startswith('//'):
-                        data_src = 'https:' + data_src
-                    elif data_src.startswith('/'):
-                        data_src = 'https://www.uncomfy.store' + data_src
-                    gallery_imgs.append(data_src)
-                srcset = img.get("srcset")
-                if srcset:
-                    first_url = srcset.split(',')[0].strip().split(' ')[0]
-                    if first_url.startswith('//'):
-                        first_url = 'https:' + first_url
-                    elif first_url.startswith('/'):
-                        first_url = 'https://www.uncomfy.store' + first_url
-                    gallery_imgs.append(first_url)
-    # Remove duplicates
-    gallery_imgs = list(dict.fromkeys(gallery_imgs))
-    # If not enough, supplement with all <img> tags
-    all_imgs = set(gallery_imgs)
-    if len(gallery_imgs) < 10:
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if src:
-                if src.startswith('//'):
-                    src = 'https:' + src
-                elif src.startswith('/'):
-                    src = 'https://www.uncomfy.store' + src
-                all_imgs.add(src)
-            data_src = img.get('data-src')
-            if data_src:
-                if data_src.startswith('//'):
-                    data_src = 'https:' + data_src
-                elif data_src.startswith('/'):
-                    data_src = 'https://www.uncomfy.store' + data_src
-                all_imgs.add(data_src)
-            srcset = img.get('srcset')
-            if srcset:
-                first_url = srcset.split(',')[0].strip().split(' ')[0]
-                if first_url.startswith('//'):
-                    first_url = 'https:' + first_url
-                elif first_url.startswith('/'):
-                    first_url = 'https://www.uncomfy.store' + first_url
-                all_imgs.add(first_url)
-        all_imgs = list(all_imgs)
-    else:
-        all_imgs = gallery_imgs
+    # Resolve relative URLs against the final page URL (after redirects)
+    candidates = collect_image_candidates(soup, resp.url or url)
     # Filtering
-    def is_relevant(img_url):
-        skip_keywords = ["icon", "logo", "thumb", "sprite", "favicon", "banner", "arrow", "cart", "star"]
-        return not any(kw in img_url.lower() for kw in skip_keywords)
-    filtered_images = [img for img in all_imgs if is_relevant(img)]
-    filtered_images = filtered_images[:10]
+    relevant = [c for c in candidates if is_relevant(c["key"])]
+    filtered_images = [c["url"] for c in relevant][:MAX_IMAGES]
     result = {
         'title': title,
         'description': desc,
         'images': filtered_images,
+        # Cheap per-image signals for pre-ranking before anything is downloaded
+        'image_candidates': [
+            {k: c[k] for k in ("url", "gallery", "position", "alt", "width", "height")}
+            for c in relevant[:MAX_CANDIDATES]
+        ],
     }
-    return result 
\ No newline at end of file
+    return result
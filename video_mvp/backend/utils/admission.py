@@ -0,0 +1,116 @@
+"""Per-endpoint admission control.
+
+Each endpoint gets a concurrency limit and a bounded wait queue. A request that
+finds the queue full is rejected straight away with 429; one that waits longer
+than ``queue_timeout`` gets 503. Either way the client hears back quickly
+instead of latency growing without bound.
+"""
+from typing import Deque, Dict, Tuple
+from collections import deque
+import asyncio
+import os
+import threading
+from fastapi import HTTPException
+from .metrics import REGISTRY
+
+ADMISSION_REJECTED = REGISTRY.counter("video_mvp_admission_rejected_total", "Requests rejected by admission control.")
+ADMISSION_WAIT = REGISTRY.histogram("video_mvp_admission_wait_seconds", "Time requests spent queued for admission.")
+
+
+class AdmissionController:
+    """Concurrency semaphore with a bounded FIFO queue.
+
+    Safe to share between event loops (the FastAPI TestClient runs each request
+    on its own loop), so it is built on a thread lock and per-waiter futures
+    rather than ``asyncio.Semaphore``.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float = 30.0):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.max_concurrent and not self._waiters:
+                self.active += 1
+                ADMISSION_WAIT.observe(0.0, endpoint=self.name)
+                return
+            if len(self._waiters) >= self.max_queue:
+                ADMISSION_REJECTED.inc(endpoint=self.name, reason="queue_full")
+                raise HTTPException(status_code=429, detail=f"{self.name}: too many queued requests",
+                                    headers={"Retry-After": "1"})
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        start = loop.time()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(waiter):
+                ADMISSION_REJECTED.inc(endpoint=self.name, reason="queue_timeout")
+                raise HTTPException(status_code=503, detail=f"{self.name}: timed out waiting for capacity",
+                                    headers={"Retry-After": "5"})
+            # The slot was handed over just as the wait timed out; keep it
+        except BaseException:
+            # Cancelled (e.g. client went away): give back a slot we may already hold
+            if not self._abandon(waiter):
+                self.release()
+            raise
+        ADMISSION_WAIT.observe(loop.time() - start, endpoint=self.name)
+
+    def _abandon(self, waiter) -> bool:
+        """Drop a waiter from the queue; False if it had already been granted a slot."""
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return True
+            return False
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the next waiter (active count is unchanged)
+                loop, future = self._waiters.popleft()
+                loop.call_soon_threadsafe(_grant, future)
+                return
+            self.active -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"active": self.active, "queued": self.queued,
+                "max_concurrent": self.max_concurrent, "max_queue": self.max_queue}
+
+
+def _grant(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+def controller_from_env(name: str, default_concurrent: int, default_queue: int) -> AdmissionController:
+    """Build a controller from ``VIDEO_MVP_<NAME>_MAX_CONCURRENCY`` / ``_MAX_QUEUE`` / ``VIDEO_MVP_QUEUE_TIMEOUT``."""
+    prefix = f"VIDEO_MVP_{name.upper()}"
+    return AdmissionController(
+        name,
+        max_concurrent=int(os.environ.get(f"{prefix}_MAX_CONCURRENCY", default_concurrent)),
+        max_queue=int(os.environ.get(f"{prefix}_MAX_QUEUE", default_queue)),
+        queue_timeout=float(os.environ.get("VIDEO_MVP_QUEUE_TIMEOUT", 30)),
+    )
+
+
+def admit(controller: AdmissionController):
+    """FastAPI dependency that holds a slot of ``controller`` for the duration of the request."""
+    async def dependency():
+        await controller.acquire()
+        try:
+            yield
+        finally:
+            controller.release()
+    return dependency
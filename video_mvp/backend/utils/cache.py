@@ -0,0 +1,84 @@
+from typing import Any, Callable, Dict, Hashable, Optional
+from concurrent.futures import Future
+import threading
+import time
+from .metrics import record_cache
+
+
+class MemoCache:
+    """Thread-safe memo cache that also de-duplicates in-flight computations.
+
+    Concurrent callers asking for the same key while it is being computed wait
+    on the same result instead of repeating the work. Failed computations are
+    not cached.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 1024, name: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values: Dict[Hashable, tuple] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, entry: tuple) -> bool:
+        return self.ttl is None or time.monotonic() - entry[1] < self.ttl
+
+    def _record(self, hit: bool) -> None:
+        if self.name:
+            record_cache(self.name, hit)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._values.get(key)
+            hit = entry is not None and self._fresh(entry)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        self._record(hit)
+        return entry[0] if hit else default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            if len(self._values) >= self.max_entries and key not in self._values:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._values.pop(next(iter(self._values)))
+            self._values[key] = (value, time.monotonic())
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and self._fresh(entry):
+                self.hits += 1
+                self._record(True)
+                return entry[0]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.hits += 1
+        self._record(not owner)
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        self.set(key, value)
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
@@ -0,0 +1,157 @@
+"""Cancellation for work that a newer submission makes pointless.
+
+Rapid storyboard edits each submit a render, but only the last one matters.
+``Supersession`` keeps the latest ``CancelToken`` per key (project/session
+id); starting new work for a key cancels the token of the work before it,
+whether that work is still queued or already encoding. Blocking code checks
+the token at its own checkpoints, and child processes started through
+``run_cancellable`` are killed as soon as the token fires.
+"""
+from typing import Callable, Dict, List, Optional
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import logging
+import subprocess
+import threading
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SUPERSEDED = REGISTRY.counter("video_mvp_superseded_total", "Work cancelled because a newer submission replaced it.")
+
+
+class Cancelled(Exception):
+    """The work was superseded by a newer submission for the same key."""
+
+
+class CancelToken:
+    """A thread-safe cancellation flag with callbacks (e.g. kill a child process)."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("[cancellation] Cancel callback failed: %s", e)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run ``callback`` on cancellation (now, if already cancelled). Returns an unregister function."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise Cancelled("superseded by a newer submission")
+
+    async def guard(self, awaitable):
+        """Await ``awaitable``, cancelling it (and raising ``Cancelled``) when the token fires."""
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(awaitable)
+        unregister = self.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if self.cancelled and task.cancelled():
+                raise Cancelled("superseded by a newer submission") from None
+            raise
+        finally:
+            unregister()
+
+
+_current_token: contextvars.ContextVar = contextvars.ContextVar("video_mvp_cancel_token", default=None)
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]):
+    """Make ``token`` the one ``current_token()`` returns for code running in this context."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def check_cancelled() -> None:
+    """Raise ``Cancelled`` if the work running in this context has been superseded."""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+def run_cancellable(cmd: List[str], token: Optional[CancelToken] = None) -> subprocess.CompletedProcess:
+    """``subprocess.run(cmd, check=True, capture_output=True)`` that kills the child on cancellation."""
+    if token is None:
+        return subprocess.run(cmd, check=True, capture_output=True)
+    token.check()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    unregister = token.on_cancel(proc.kill)
+    try:
+        stdout, stderr = proc.communicate()
+    finally:
+        unregister()
+    token.check()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+class Supersession:
+    """Latest-wins registry: beginning work for a key cancels the work already registered for it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._latest: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def begin(self, key: Optional[str]):
+        """Register new work for ``key`` and yield its token. Without a key nothing is superseded."""
+        token = CancelToken()
+        if not key:
+            yield token
+            return
+        with self._lock:
+            previous = self._latest.get(key)
+            self._latest[key] = token
+        if previous is not None and not previous.cancelled:
+            SUPERSEDED.inc(scope=self.name)
+            logger.info("[cancellation] %s for %s superseded by a newer submission", self.name, key)
+            previous.cancel()
+        try:
+            yield token
+        finally:
+            with self._lock:
+                if self._latest.get(key) is token:
+                    del self._latest[key]
+
+    def active(self) -> int:
+        with self._lock:
+            return len(self._latest)
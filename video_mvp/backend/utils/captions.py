@@ -0,0 +1,97 @@
+"""Captions for the storyboard script, timed from the rendered media segments.
+
+The script is split into short caption lines. With one line per media
+segment each line simply covers its segment; otherwise lines share the
+timeline in proportion to their length, with cue boundaries snapped to
+nearby segment cuts so captions change with the picture.
+"""
+from typing import List, Tuple
+import re
+
+# Two lines of ~42 characters is the usual readability limit for burned-in captions
+MAX_CAPTION_CHARS = 84
+# Cue boundaries within this many seconds of a segment cut move onto the cut
+SNAP_SECONDS = 0.75
+CAPTION_STYLE = "FontName=DejaVu Sans,FontSize=16,Outline=1,Shadow=0,Alignment=2,MarginV=40"
+
+Cue = Tuple[float, float, str]
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_script(script: str, max_chars: int = MAX_CAPTION_CHARS) -> List[str]:
+    """Sentences of the script, long ones broken at word boundaries."""
+    lines = []
+    for sentence in _SENTENCE_RE.split((script or "").strip()):
+        words, current = sentence.split(), ""
+        for word in words:
+            if current and len(current) + 1 + len(word) > max_chars:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            lines.append(current)
+    return lines
+
+
+def caption_cues(script: str, segments: List[Tuple[float, float]]) -> List[Cue]:
+    """(start, end, text) cues for ``script`` over media ``segments`` given as (start, duration)."""
+    lines = split_script(script)
+    segments = [(start, duration) for start, duration in segments if duration > 0]
+    if not lines or not segments:
+        return []
+    if len(lines) == len(segments):
+        return [(start, start + duration, line) for line, (start, duration) in zip(lines, segments)]
+    t0 = segments[0][0]
+    t1 = max(start + duration for start, duration in segments)
+    cuts = sorted({start for start, _ in segments} | {start + duration for start, duration in segments})
+    weights = [len(line) for line in lines]
+    total_weight = sum(weights)
+    cues, start, acc = [], t0, 0
+    for line, weight in zip(lines, weights):
+        acc += weight
+        end = t0 + (t1 - t0) * acc / total_weight
+        nearest = min(cuts, key=lambda c: abs(c - end))
+        if abs(nearest - end) <= SNAP_SECONDS and nearest > start:
+            end = nearest
+        cues.append((start, end, line))
+        start = end
+    return cues
+
+
+def segment_cues(cues: List[Cue], start: float, duration: float) -> List[Cue]:
+    """The parts of ``cues`` shown during a segment, in the segment's own time (its first frame is 0)."""
+    end = start + duration
+    return [(max(s, start) - start, min(e, end) - start, text)
+            for s, e, text in cues if min(e, end) - max(s, start) > 0.001]
+
+
+def _srt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def to_srt(cues: List[Cue]) -> str:
+    return "".join(
+        f"{i}\n{_srt_time(start)} --> {_srt_time(end)}\n{text}\n\n"
+        for i, (start, end, text) in enumerate(cues, 1)
+    )
+
+
+def write_srt(cues: List[Cue], path: str) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(to_srt(cues))
+    return path
+
+
+def subtitles_filter(srt_path: str, style: str = CAPTION_STYLE) -> str:
+    """ffmpeg ``subtitles`` filter burning ``srt_path`` in.
+
+    The path is escaped twice: once for the filter's option parser and once
+    for the filtergraph parser that sees it first.
+    """
+    escaped = srt_path.replace("\\", "/").replace(":", "\\\\:").replace("'", "\\\\\\'")
+    return f"subtitles={escaped}:force_style='{style}'"
@@ -0,0 +1,229 @@
+"""ffprobe/ffmpeg helpers for video clips as storyboard media.
+
+Clips are never decoded in Python. ffprobe reads stream parameters and
+keyframe positions once per file (cached by path, size and mtime). Each
+storyboard slot becomes an MPEG-TS segment: clips that already match the
+output format are cut at a keyframe with stream copy, everything else is
+scaled and letterboxed by ffmpeg (burning in the segment's captions in the
+same encode). Segments are joined by the concat demuxer without re-encoding,
+muxing any audio in that pass; MPEG-TS keeps SPS/PPS in-band, so copied and
+encoded segments can share one output.
+"""
+from typing import Dict, List, Optional, Tuple
+import bisect
+import json
+import os
+import logging
+import subprocess
+from .cache import MemoCache
+from .metrics import span
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".webm", ".mkv", ".avi"}
+OUTPUT_SIZE = (720, 1280)
+SEGMENT_FPS = 30
+# Output format a clip must already have for its segment to be stream-copied
+COPY_CODEC, COPY_PIX_FMT = "h264", "yuv420p"
+# Audio codecs that go into the MP4 without re-encoding
+COPY_AUDIO_CODECS = {"aac"}
+
+logger = logging.getLogger(__name__)
+
+PROBE_CACHE = MemoCache(max_entries=1024, name="ffprobe")
+POSTER_CACHE = MemoCache(max_entries=1024, name="clip_poster")
+
+
+def is_video_file(path: str) -> bool:
+    return os.path.splitext(path.split("?")[0])[1].lower() in VIDEO_EXTENSIONS
+
+
+def _rate(value: Optional[str]) -> Optional[float]:
+    try:
+        num, _, den = (value or "").partition("/")
+        rate = float(num) / float(den or 1)
+        return rate or None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def parse_probe(raw: Dict) -> Dict:
+    """Reduce ffprobe JSON to the fields the renderer needs."""
+    stream = (raw.get("streams") or [{}])[0]
+    duration = raw.get("format", {}).get("duration") or stream.get("duration")
+    keyframes = sorted(
+        float(p["pts_time"]) for p in raw.get("packets", [])
+        if "K" in p.get("flags", "") and p.get("pts_time") not in (None, "N/A")
+    )
+    return {
+        "codec": stream.get("codec_name"),
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "pix_fmt": stream.get("pix_fmt"),
+        "fps": _rate(stream.get("avg_frame_rate")) or _rate(stream.get("r_frame_rate")),
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "keyframes": keyframes,
+    }
+
+
+def probe_media(path: str, stream: str = "v") -> Dict:
+    """Parameters of the first video (``"v"``) or audio (``"a"``) stream, one ffprobe per file version.
+
+    Video probes also list keyframe times.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, stream)
+
+    def run() -> Dict:
+        entries = "stream=codec_name,width,height,pix_fmt,avg_frame_rate,r_frame_rate,duration:format=duration"
+        if stream == "v":
+            # Packet flags come from the demuxer, so listing keyframes decodes nothing
+            entries += ":packet=pts_time,flags"
+        cmd = ["ffprobe", "-v", "error", "-select_streams", f"{stream}:0", "-print_format", "json",
+               "-show_entries", entries, path]
+        with span("ffprobe"):
+            result = subprocess.run(cmd, check=True, capture_output=True)
+        info = parse_probe(json.loads(result.stdout or b"{}"))
+        if not info["codec"]:
+            raise ValueError(f"No {'video' if stream == 'v' else 'audio'} stream in {path}")
+        return info
+
+    return PROBE_CACHE.get_or_compute(key, run)
+
+
+def can_stream_copy(info: Dict, size: Tuple[int, int] = OUTPUT_SIZE) -> bool:
+    return (info.get("codec") == COPY_CODEC and info.get("pix_fmt") == COPY_PIX_FMT
+            and (info.get("width"), info.get("height")) == tuple(size))
+
+
+def plan_clip(info: Dict, clip_start: float, duration: float, size: Tuple[int, int] = OUTPUT_SIZE) -> Dict:
+    """Where to cut a clip for a slot of ``duration`` seconds and whether a stream copy will do.
+
+    Stream copies must start on a keyframe, so the in-point moves back to the
+    nearest one at or before ``clip_start``. Clips shorter than the slot give a
+    shorter segment rather than being looped.
+    """
+    copy = can_stream_copy(info, size)
+    start = max(0.0, clip_start)
+    keyframes = info.get("keyframes") or []
+    if copy and keyframes:
+        i = bisect.bisect_right(keyframes, start + 1e-6)
+        start = keyframes[i - 1] if i else keyframes[0]
+    total = info.get("duration")
+    if total is not None:
+        if start >= total:
+            start = 0.0
+        duration = min(duration, total - start)
+    return {"start": round(start, 3), "duration": round(max(duration, 0.0), 3), "copy": copy}
+
+
+def letterbox_filter(size: Tuple[int, int] = OUTPUT_SIZE, fps: int = SEGMENT_FPS) -> str:
+    w, h = size
+    return (f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:color=black,setsar=1,fps={fps},format={COPY_PIX_FMT}")
+
+
+def _encode_args() -> List[str]:
+    return ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", COPY_PIX_FMT, "-f", "mpegts"]
+
+
+def _filters(*filters: Optional[str]) -> str:
+    return ",".join(f for f in filters if f)
+
+
+def clip_segment_cmd(path: str, plan: Dict, out_path: str, video_filter: Optional[str] = None,
+                     size: Tuple[int, int] = OUTPUT_SIZE, fps: int = SEGMENT_FPS) -> List[str]:
+    """Cut a clip into a segment; ``video_filter`` (captions) runs after the letterbox and needs an encode."""
+    cmd = ["ffmpeg", "-y", "-v", "error", "-ss", f"{plan['start']:.3f}", "-i", path,
+           "-t", f"{plan['duration']:.3f}", "-map", "0:v:0", "-an", "-sn"]
+    if plan["copy"] and not video_filter:
+        return cmd + ["-c:v", "copy", "-avoid_negative_ts", "make_zero", "-f", "mpegts", out_path]
+    return cmd + ["-vf", _filters(letterbox_filter(size, fps), video_filter)] + _encode_args() + [out_path]
+
+
+def still_segment_cmd(path: str, duration: float, out_path: str, video_filter: Optional[str] = None,
+                      size: Tuple[int, int] = OUTPUT_SIZE, fps: int = SEGMENT_FPS) -> List[str]:
+    return (["ffmpeg", "-y", "-v", "error", "-loop", "1", "-framerate", str(fps), "-t", f"{duration:.3f}", "-i", path,
+             "-vf", _filters(letterbox_filter(size, fps), video_filter), "-tune", "stillimage"]
+            + _encode_args() + [out_path])
+
+
+def black_segment_cmd(duration: float, out_path: str, video_filter: Optional[str] = None,
+                      size: Tuple[int, int] = OUTPUT_SIZE, fps: int = SEGMENT_FPS) -> List[str]:
+    w, h = size
+    filter_args = ["-vf", video_filter] if video_filter else []
+    return (["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"color=c=black:s={w}x{h}:r={fps}:d={duration:.3f}"]
+            + filter_args + _encode_args() + [out_path])
+
+
+def audio_args(audio_path: Optional[str], duration: Optional[float] = None,
+               input_index: int = 1) -> Tuple[List[str], List[str]]:
+    """ffmpeg input and output arguments that mux ``audio_path`` into the video being encoded.
+
+    The audio is stream-copied when its codec can go into the MP4 as-is and
+    encoded to AAC otherwise. Output is cut to ``duration`` (the video length).
+    Audio that can't be probed is left out rather than failing the render.
+    """
+    if not audio_path:
+        return [], []
+    try:
+        codec = probe_media(audio_path, stream="a")["codec"]
+    except Exception as e:
+        logger.warning("[clips] Ignoring unreadable audio %s: %s", audio_path, e)
+        return [], []
+    codec_args = ["-c:a", "copy"] if codec in COPY_AUDIO_CODECS else ["-c:a", "aac", "-b:a", "160k"]
+    out_args = ["-map", "0:v:0", "-map", f"{input_index}:a:0"] + codec_args
+    if duration:
+        out_args += ["-t", f"{duration:.3f}"]
+    return ["-i", audio_path], out_args
+
+
+def video_encode_args(video_filter: Optional[str] = None) -> List[str]:
+    """Final H.264 encode, with an optional filter (e.g. burned-in captions)."""
+    args = ["-vf", video_filter] if video_filter else []
+    return args + ["-c:v", "libx264", "-pix_fmt", COPY_PIX_FMT]
+
+
+def concat_cmd(list_path: str, out_path: str, audio_path: Optional[str] = None,
+               duration: Optional[float] = None) -> List[str]:
+    """Join segments with a video stream copy (captions are already in the segments), muxing in any audio."""
+    audio_in, audio_out = audio_args(audio_path, duration)
+    return (["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path] + audio_in
+            + ["-c:v", "copy"] + audio_out + ["-movflags", "+faststart", out_path])
+
+
+def write_concat_list(segment_paths: List[str], list_path: str) -> str:
+    with open(list_path, "w") as f:
+        for p in segment_paths:
+            escaped = os.path.abspath(p).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def poster_frame(path: str, out_path: Optional[str] = None) -> Optional[str]:
+    """A JPEG still from the middle of a clip (for vision analysis), or None if ffmpeg can't make one.
+
+    Posters are made once per clip version (path, size and mtime, as for
+    ``probe_media``). A poster on disk is stamped with its clip's mtime and
+    only reused while the clip still has that mtime.
+    """
+    out_path = out_path or os.path.splitext(path)[0] + ".poster.jpg"
+    try:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, os.path.abspath(out_path))
+
+        def run() -> str:
+            try:
+                poster = os.stat(out_path)
+                if poster.st_size > 0 and poster.st_mtime_ns == st.st_mtime_ns:
+                    return out_path
+            except FileNotFoundError:
+                pass
+            middle = (probe_media(path).get("duration") or 0) / 2
+            cmd = ["ffmpeg", "-y", "-v", "error", "-ss", f"{middle:.3f}", "-i", path, "-frames:v", "1", "-q:v", "3", out_path]
+            with span("clip_poster"):
+                subprocess.run(cmd, check=True, capture_output=True)
+            os.utime(out_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            return out_path
+
+        return POSTER_CACHE.get_or_compute(key, run)
+    except Exception:
+        return None
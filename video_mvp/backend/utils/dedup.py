@@ -0,0 +1,65 @@
+"""Perceptual-hash near-duplicate detection for downloaded images."""
+from typing import Dict, List, Optional, Tuple
+import functools
+
+# Hamming distance (out of 64 bits) below which two pHashes are the same picture
+DEFAULT_MAX_DISTANCE = 6
+
+
+@functools.lru_cache(maxsize=None)
+def _imagehash():
+    # Imported on first use (it pulls in numpy); processes that never dedupe don't pay for it
+    try:
+        import imagehash
+    except ImportError:  # optional: without it every image is treated as unique
+        return None
+    return imagehash
+
+
+def image_fingerprint(path: str) -> Optional[Tuple[object, int, int]]:
+    """(phash, width, height) of an image, or None if it can't be read."""
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            # pHash only needs a tiny greyscale image; let the JPEG decoder downscale via DCT
+            img.draft("L", (128, 128))
+            return _imagehash().phash(img.convert("L")), width, height
+    except Exception:
+        return None
+
+
+def find_duplicates(paths: List[str], max_distance: int = DEFAULT_MAX_DISTANCE) -> Dict[str, str]:
+    """Map each near-duplicate path to the highest-resolution path of its group.
+
+    Paths that are unique (or unreadable) are not in the result.
+    """
+    if len(paths) < 2 or _imagehash() is None:
+        return {}
+    prints = {p: image_fingerprint(p) for p in paths}
+    readable = [p for p in paths if prints[p] is not None]
+    parent = {p: p for p in readable}
+
+    def root(p: str) -> str:
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    for i, a in enumerate(readable):
+        for b in readable[i + 1:]:
+            if prints[a][0] - prints[b][0] <= max_distance:
+                parent[root(b)] = root(a)
+    groups: Dict[str, List[str]] = {}
+    for p in readable:
+        groups.setdefault(root(p), []).append(p)
+    replaced = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        # Highest resolution wins; ties go to the earliest
+        best = max(members, key=lambda p: (prints[p][1] * prints[p][2], -members.index(p)))
+        for p in members:
+            if p != best:
+                replaced[p] = best
+    return replaced
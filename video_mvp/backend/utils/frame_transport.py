@@ -0,0 +1,447 @@
+"""Frame transport between compositor worker processes and the ffmpeg feeder.
+
+Output frames are 720x1280x3 BGR buffers. Sending them through a pipe or a
+multiprocessing queue costs a copy per frame per hop (pickle, kernel buffer,
+unpickle). ``FrameRing`` is a ``multiprocessing.shared_memory`` ring of frame
+slots instead: compositor processes letterbox straight into a slot and the
+feeder hands the slot's memory to ffmpeg's stdin without an intermediate copy.
+
+Slot ownership needs no locks. Frame ``k`` lives in slot ``k % slots``; a
+producer may fill it once frame ``k - slots`` has been consumed, and the
+consumer reads it once the slot's sequence number says frame ``k`` is there.
+Every counter in the shared header has a single writer.
+
+That handshake relies on x86's store ordering: the frame bytes become visible
+to the other process before the header update that publishes them. Python has
+no memory barriers, and weakly ordered CPUs (ARM, POWER) may reorder the
+stores, so the reader could see a slot marked ready before its pixels land.
+The ring is therefore opt-in (``transport="shm"``) and only used on x86;
+elsewhere ``stream_frames`` falls back to the pipe transport, where the
+kernel orders every hand-off.
+
+Compositor workers are fresh interpreters started with ``subprocess``, not
+``multiprocessing`` children: they never re-import the caller's ``__main__``,
+so scripts that render without an ``if __name__ == "__main__"`` guard (or
+render from inside a daemonic process) work.
+"""
+from typing import BinaryIO, Callable, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection
+import logging
+import os
+import pickle
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_SHAPE = (1280, 720, 3)
+DEFAULT_SLOTS = 8
+DEFAULT_TIMEOUT = 30.0
+_POLL_SECONDS = 0.0002
+TRANSPORTS = ("shm", "pipe")
+# CPUs whose store ordering (TSO) the ring's lock-free header relies on
+SHM_MACHINES = {"x86_64", "amd64", "i386", "i686", "x86"}
+
+# (image path or None for black, first frame index, frame count)
+FrameItem = Tuple[Optional[str], int, int]
+
+
+class TransportAborted(RuntimeError):
+    """The other side of the ring gave up (encoder failed or render cancelled)."""
+
+
+def shm_supported() -> bool:
+    """Whether this CPU orders stores the way ``FrameRing``'s header assumes."""
+    return platform.machine().lower() in SHM_MACHINES
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Only the creating process unlinks the block; a worker's own resource tracker must not
+    # unlink it (or warn about a leak) when the worker exits.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameRing:
+    """A ring of fixed-size frame slots in shared memory."""
+
+    def __init__(self, slots: int = DEFAULT_SLOTS, shape: Sequence[int] = FRAME_SHAPE, name: Optional[str] = None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        frame_bytes = int(np.prod(self.shape))
+        header_bytes = 8 * (slots + 2)
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * frame_bytes)
+        else:
+            self.shm = _attach(name)
+        # header[:slots] = sequence number held by each slot, then frames consumed, then the abort flag
+        self.header = np.ndarray((slots + 2,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if self._owner:
+            self.header[:slots] = -1
+            self.header[slots:] = 0
+
+    @property
+    def spec(self) -> Tuple[str, int, Tuple[int, ...]]:
+        """What another process needs to attach (see ``FrameRing.attach``)."""
+        return self.shm.name, self.slots, self.shape
+
+    @classmethod
+    def attach(cls, spec: Tuple[str, int, Tuple[int, ...]]) -> "FrameRing":
+        name, slots, shape = spec
+        return cls(slots, shape, name=name)
+
+    @property
+    def consumed(self) -> int:
+        return int(self.header[self.slots])
+
+    def _wait(self, ready: Callable[[], bool], timeout: float, check: Optional[Callable[[], None]] = None) -> None:
+        deadline = time.monotonic() + timeout
+        while not ready():
+            if self.header[self.slots + 1]:
+                raise TransportAborted("frame ring aborted")
+            if check:
+                check()
+            if time.monotonic() > deadline:
+                raise TimeoutError("timed out waiting on the frame ring")
+            time.sleep(_POLL_SECONDS)
+
+    def acquire_write(self, seq: int, timeout: float = DEFAULT_TIMEOUT) -> np.ndarray:
+        """The slot for frame ``seq``, once the frame that used it before has been consumed."""
+        self._wait(lambda: seq - self.header[self.slots] < self.slots, timeout)
+        return self.frames[seq % self.slots]
+
+    def commit(self, seq: int) -> None:
+        self.header[seq % self.slots] = seq
+
+    def acquire_read(self, seq: int, timeout: float = DEFAULT_TIMEOUT,
+                     check: Optional[Callable[[], None]] = None) -> np.ndarray:
+        """Frame ``seq`` (a view into shared memory, valid until ``release``)."""
+        self._wait(lambda: self.header[seq % self.slots] == seq, timeout, check)
+        return self.frames[seq % self.slots]
+
+    def release(self, seq: int) -> None:
+        self.header[self.slots] = seq + 1
+
+    def abort(self) -> None:
+        self.header[self.slots + 1] = 1
+
+    def close(self) -> None:
+        # Views must go before the mapping can be closed
+        self.header = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            logger.warning("[frame_transport] Frame ring %s still has live views", self.shm.name)
+        if self._owner:
+            self.shm.unlink()
+
+
+def letterbox_into(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Scale ``src`` to fit ``dst`` (centered, black bars), writing straight into ``dst``."""
+    height, width = dst.shape[:2]
+    h, w = src.shape[:2]
+    scale = min(width / w, height / h)
+    new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+    y, x = (height - new_h) // 2, (width - new_w) // 2
+    dst[:y] = 0
+    dst[y + new_h:] = 0
+    dst[y:y + new_h, :x] = 0
+    dst[y:y + new_h, x + new_w:] = 0
+    target = dst[y:y + new_h, x:x + new_w]
+    resized = cv2.resize(src, (new_w, new_h), dst=target)
+    if not np.shares_memory(resized, target):
+        np.copyto(target, resized)
+    return dst
+
+
+def _item_frames(items: List[FrameItem]):
+    """Yield (seq, image or None, is_first_frame_of_item) in frame order."""
+    for path, first, count in items:
+        image = cv2.imread(path) if path else None
+        if path and image is None:
+            logger.warning("[frame_transport] Failed to read %s, using black frames", path)
+        for seq in range(first, first + count):
+            yield seq, image, seq == first
+
+
+def composite_to_ring(ring_spec: Tuple, items: List[FrameItem], timeout: float = DEFAULT_TIMEOUT) -> None:
+    """Compositor worker: letterbox each item into its ring slots, in frame order."""
+    ring = FrameRing.attach(ring_spec)
+    slot = template = None
+    try:
+        for seq, image, first in _item_frames(items):
+            slot = ring.acquire_write(seq, timeout)
+            if first:
+                if image is None:
+                    slot[...] = 0
+                else:
+                    letterbox_into(image, slot)
+                # A still repeats for the whole item: composite once, then copy
+                template = slot.copy()
+            else:
+                np.copyto(slot, template)
+            ring.commit(seq)
+    except TransportAborted:
+        pass
+    finally:
+        slot = template = None
+        ring.close()
+
+
+def composite_to_conn(conn, items: List[FrameItem], shape: Tuple[int, ...] = FRAME_SHAPE) -> None:
+    """Compositor worker for the pipe transport: every frame is copied through the worker's pipe."""
+    frame = np.zeros(shape, dtype=np.uint8)
+    for _, image, first in _item_frames(items):
+        if first:
+            if image is None:
+                frame[...] = 0
+            else:
+                letterbox_into(image, frame)
+        conn.send_bytes(frame.reshape(-1).data)
+
+
+def _serve(conn) -> None:
+    """Compositor process main loop: run jobs from the pool until the pipe closes."""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        transport, args = job
+        try:
+            if transport == "shm":
+                composite_to_ring(*args)
+            elif transport == "pipe":
+                composite_to_conn(conn, *args)
+            conn.send(("done", None))
+        except Exception as exc:
+            conn.send(("error", repr(exc)))
+
+
+def _serve_fd(fd: int) -> None:
+    """Entry point of a compositor process: serve the pool over the inherited socket ``fd``."""
+    _serve(Connection(fd))
+
+
+# Directory holding the top-level package, so a fresh interpreter can import this module
+_IMPORT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def _worker_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (_IMPORT_ROOT, env.get("PYTHONPATH")) if p)
+    return env
+
+
+class _Worker:
+    def __init__(self, name: str):
+        ours, theirs = socket.socketpair()
+        fd = theirs.fileno()
+        code = f"from {__name__} import _serve_fd; _serve_fd({fd})"
+        try:
+            self.process = subprocess.Popen([sys.executable, "-c", code], pass_fds=(fd,),
+                                            stdin=subprocess.DEVNULL, env=_worker_env())
+        except BaseException:
+            ours.close()
+            raise
+        finally:
+            theirs.close()
+        self.conn = Connection(ours.detach())
+        self.name = name
+        self.busy = False
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def submit(self, transport: str, args: Tuple) -> None:
+        self.conn.send((transport, args))
+        self.busy = True
+
+    def poll(self, timeout: float = 0) -> bool:
+        """True once the current job has finished; raises if it failed or the process died."""
+        if self.busy and self.conn.poll(timeout):
+            status, detail = self.conn.recv()
+            self.busy = False
+            if status == "error":
+                raise RuntimeError(f"compositor {self.name} failed: {detail}")
+        if self.busy and not self.alive:
+            raise RuntimeError(f"compositor {self.name} exited with code {self.process.returncode}")
+        return not self.busy
+
+    def recv_frame(self, frame_bytes: int, timeout: float) -> bytes:
+        if not self.conn.poll(timeout):
+            self.poll()
+            raise TimeoutError("timed out waiting for frames")
+        data = self.conn.recv_bytes()
+        if len(data) != frame_bytes:
+            # Not a frame: the job ended early with a status message
+            self.busy = False
+            status, detail = pickle.loads(data)
+            raise RuntimeError(f"compositor {self.name} stopped early: {detail or status}")
+        return data
+
+    def close(self) -> None:
+        self.conn.close()
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+
+
+class CompositorPool:
+    """Long-lived compositor processes, checked out exclusively by one render at a time.
+
+    Starting a process costs far more than compositing a few seconds of
+    video (each one is a new interpreter importing NumPy and OpenCV), so
+    workers are started lazily and reused. A render holds its workers for its whole
+    duration: each one blocks on the ring until the feeder catches up, so
+    sharing them between renders could deadlock.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: List[_Worker] = []
+        self._started = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def checkout(self, count: int):
+        count = max(1, min(count, self.size))
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._idle) + self.size - self._started >= count)
+            workers = self._idle[:count]
+            del self._idle[:count]
+            missing = count - len(workers)
+            self._started += missing
+        reusable = False
+        try:
+            for _ in range(missing):
+                workers.append(_Worker(f"compositor-{len(workers)}"))
+                missing -= 1
+            yield workers
+            reusable = True
+        finally:
+            with self._cond:
+                self._started -= missing
+            self._release(workers, reusable)
+
+    def warm(self, count: int) -> None:
+        """Start ``count`` workers ahead of the first render and wait until they are ready."""
+        with self.checkout(count) as workers:
+            for worker in workers:
+                worker.submit("ping", ())
+            for worker in workers:
+                while not worker.poll(DEFAULT_TIMEOUT):
+                    pass
+
+    def _release(self, workers: List[_Worker], reusable: bool) -> None:
+        keep = [w for w in workers if reusable and not w.busy and w.alive]
+        for worker in workers:
+            if worker not in keep:
+                worker.close()
+        with self._cond:
+            self._idle.extend(keep)
+            self._started -= len(workers) - len(keep)
+            self._cond.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def compositor_pool() -> CompositorPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CompositorPool(os.cpu_count() or 2)
+        return _pool
+
+
+def stream_frames(items: List[FrameItem], sink: BinaryIO, transport: str = "pipe", workers: int = 2,
+                  slots: int = DEFAULT_SLOTS, shape: Sequence[int] = FRAME_SHAPE,
+                  timeout: float = DEFAULT_TIMEOUT) -> int:
+    """Composite ``items`` in worker processes and write raw frames to ``sink`` in order.
+
+    Items are dealt to workers round-robin so neighbouring stills are decoded
+    and scaled in parallel. Returns the number of frames written. ``shm``
+    falls back to ``pipe`` on CPUs the ring isn't safe on (see the module
+    docstring).
+    """
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Unknown frame transport {transport!r}")
+    if transport == "shm" and not shm_supported():
+        logger.warning("[frame_transport] shm transport needs x86 store ordering, using pipe on %s",
+                       platform.machine())
+        transport = "pipe"
+    total = sum(count for _, _, count in items)
+    if total == 0:
+        return 0
+    shape = tuple(shape)
+    with compositor_pool().checkout(min(max(1, workers), len(items))) as pool_workers:
+        if transport == "shm":
+            _stream_ring(pool_workers, items, sink, total, slots, shape, timeout)
+        else:
+            _stream_pipe(pool_workers, items, sink, shape, timeout)
+        for worker in pool_workers:
+            while not worker.poll(timeout):
+                pass
+    return total
+
+
+def _stream_ring(workers: List[_Worker], items: List[FrameItem], sink: BinaryIO, total: int,
+                 slots: int, shape: Tuple[int, ...], timeout: float) -> None:
+    ring = FrameRing(slots, shape)
+    frame = None
+    try:
+        for i, worker in enumerate(workers):
+            worker.submit("shm", (ring.spec, items[i::len(workers)], timeout))
+
+        def check():
+            for worker in workers:
+                worker.poll()
+
+        for seq in range(total):
+            frame = ring.acquire_read(seq, timeout, check=check)
+            sink.write(frame.data)
+            frame = None
+            ring.release(seq)
+    except BaseException:
+        ring.abort()
+        raise
+    finally:
+        frame = None
+        ring.close()
+
+
+def _stream_pipe(workers: List[_Worker], items: List[FrameItem], sink: BinaryIO,
+                 shape: Tuple[int, ...], timeout: float) -> None:
+    frame_bytes = int(np.prod(shape))
+    for i, worker in enumerate(workers):
+        worker.submit("pipe", (items[i::len(workers)], shape))
+    # Items were dealt round-robin and each worker sends its own frames in order
+    for index, (_, _, count) in enumerate(items):
+        worker = workers[index % len(workers)]
+        for _ in range(count):
+            sink.write(worker.recv_frame(frame_bytes, timeout))
+
+
+def rawvideo_input_args(fps: float, shape: Sequence[int] = FRAME_SHAPE) -> List[str]:
+    """ffmpeg input arguments for frames written by ``stream_frames`` to stdin."""
+    height, width = shape[:2]
+    return ["-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-"]
@@ -0,0 +1,139 @@
+"""Image URL canonicalization and responsive-variant selection.
+
+Product pages list the same asset many times: ``src``, ``data-src`` and every
+``srcset`` candidate, often with CDN size parameters (Shopify ``width=`` or
+``_600x`` filename suffixes). These helpers group those variants by a
+canonical key and pick the cheapest one that is still big enough to render.
+"""
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+import re
+
+# The renderer outputs 720x1280; a variant that covers both is never upscaled
+TARGET_WIDTH = 720
+TARGET_HEIGHT = 1280
+# For density-only srcsets (1x, 2x, ...): product images are laid out around 360 CSS px
+# wide, so 2x is the first density that reaches TARGET_WIDTH
+TARGET_DENSITY = 2.0
+
+# Query parameters that select a size/crop/version of the same asset
+SIZE_PARAMS = {"width", "height", "w", "h", "crop", "v", "quality", "q", "format", "fm", "fit", "dpr"}
+# Shopify-style filename suffixes: name_600x.jpg, name_600x800.jpg, name_x800@2x.jpg, name_600x_crop_center.jpg
+# (at least one side has digits, so a name like photo_x.jpg is left alone)
+_SIZE_SUFFIX_RE = re.compile(r"_(?=\d|x\d)(\d*)x(\d*)(@(\d)x)?(_crop_[a-z]+)?(?=\.[A-Za-z0-9]+$)")
+
+
+def absolutize(url: Optional[str], page_url: str) -> Optional[str]:
+    """Resolve ``url`` against the page it appeared on; None for empty/inline images."""
+    if not url:
+        return None
+    url = url.strip()
+    if not url or url.startswith(("data:", "blob:", "javascript:")):
+        return None
+    return urljoin(page_url, url)
+
+
+def parse_srcset(srcset: Optional[str]) -> List[Tuple[str, Optional[int], Optional[float]]]:
+    """Parse a srcset into (url, width, density) candidates.
+
+    URLs may themselves contain commas (e.g. ``w_100,h_100`` transforms); like the
+    HTML spec, a URL runs to the next whitespace and only a trailing comma ends it.
+    """
+    candidates = []
+    if not srcset:
+        return candidates
+    pos, n = 0, len(srcset)
+    while pos < n:
+        while pos < n and (srcset[pos].isspace() or srcset[pos] == ","):
+            pos += 1
+        start = pos
+        while pos < n and not srcset[pos].isspace():
+            pos += 1
+        url = srcset[start:pos]
+        descriptor = ""
+        if url.endswith(","):
+            url = url.rstrip(",")
+        else:
+            start = pos
+            while pos < n and srcset[pos] != ",":
+                pos += 1
+            descriptor = srcset[start:pos].strip()
+        if not url:
+            continue
+        width, density = None, None
+        for token in descriptor.split():
+            try:
+                if token.endswith("w"):
+                    width = int(token[:-1])
+                elif token.endswith("x"):
+                    density = float(token[:-1])
+            except ValueError:
+                pass
+        candidates.append((url, width, density))
+    return candidates
+
+
+def declared_width(url: str) -> Optional[int]:
+    """Width a CDN URL asks for (``width=``/``w=`` or a Shopify ``_600x`` suffix), if any."""
+    parts = urlsplit(url)
+    for key, value in parse_qsl(parts.query):
+        if key.lower() in ("width", "w") and value.isdigit():
+            return int(value)
+    match = _SIZE_SUFFIX_RE.search(parts.path)
+    if match and match.group(1):
+        return int(match.group(1)) * int(match.group(4) or 1)
+    return None
+
+
+def declared_height(url: str) -> Optional[int]:
+    """Height a CDN URL asks for (``height=``/``h=`` or a Shopify ``_x800`` suffix), if any."""
+    parts = urlsplit(url)
+    for key, value in parse_qsl(parts.query):
+        if key.lower() in ("height", "h") and value.isdigit():
+            return int(value)
+    match = _SIZE_SUFFIX_RE.search(parts.path)
+    if match and match.group(2):
+        return int(match.group(2)) * int(match.group(4) or 1)
+    return None
+
+
+def canonical_key(url: str) -> str:
+    """Identity of the underlying asset, ignoring size/version parameters and suffixes."""
+    parts = urlsplit(url)
+    path = _SIZE_SUFFIX_RE.sub("", parts.path)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if k.lower() not in SIZE_PARAMS))
+    return urlunsplit(("https", parts.netloc.lower(), path, query, ""))
+
+
+def select_variant(variants: List[Tuple], target_width: int = TARGET_WIDTH,
+                   target_density: float = TARGET_DENSITY, aspect: Optional[float] = None,
+                   target_height: int = TARGET_HEIGHT) -> str:
+    """Smallest variant that covers ``target_width`` x ``target_height``.
+
+    Variants are ``(url, width)`` or ``(url, width, density)``. A variant's
+    height comes from its URL (``_600x800``, ``height=``) or from ``aspect``
+    (height / width, e.g. from the <img> attributes); when neither is known
+    only its width is checked. Without a big enough variant, srcset densities
+    are ranked next: the smallest density that reaches ``target_density``, else
+    the highest. After that, prefer one with no size parameters (usually the
+    original upload) and otherwise the widest available, so we never pick a
+    thumbnail when something bigger exists.
+    """
+    rows = [(v[0], v[1], v[2] if len(v) > 2 else None) for v in variants]
+
+    def height(url: str, width: int) -> Optional[float]:
+        declared = declared_height(url)
+        return declared if declared is not None else width * aspect if aspect else None
+
+    big_enough = [(w, url) for url, w, _ in rows if w is not None and w >= target_width
+                  and (height(url, w) or target_height) >= target_height]
+    if big_enough:
+        return min(big_enough)[1]
+    densities = [(d, url) for url, w, d in rows if w is None and d is not None]
+    if densities:
+        dense_enough = [(d, url) for d, url in densities if d >= target_density]
+        return min(dense_enough)[1] if dense_enough else max(densities)[1]
+    unsized = [url for url, w, _ in rows if w is None]
+    if unsized:
+        return unsized[0]
+    return max((w, url) for url, w, _ in rows)[1]
@@ -0,0 +1,186 @@
+"""Minimal Prometheus-compatible metrics and per-request stage timings.
+
+Stages are timed with ``span("stage")``; every span feeds a process-wide
+histogram and, when a ``collect_timings()`` block is active, the timing
+breakdown of the current request.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+import bisect
+import contextvars
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = []
+    for k, v in pairs:
+        v = v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{k}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def expose(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("video_mvp_stage_duration_seconds", "Duration of pipeline stages in seconds.")
+STAGE_BYTES = REGISTRY.counter("video_mvp_stage_bytes_total", "Bytes read or written by pipeline stages.")
+STAGE_ERRORS = REGISTRY.counter("video_mvp_stage_errors_total", "Pipeline stage failures.")
+CACHE_REQUESTS = REGISTRY.counter("video_mvp_cache_requests_total", "Cache lookups by cache and result (hit/miss).")
+HTTP_SECONDS = REGISTRY.histogram("video_mvp_http_request_duration_seconds", "API request latency in seconds.")
+
+_request_spans: contextvars.ContextVar = contextvars.ContextVar("video_mvp_request_spans", default=None)
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[Dict]:
+    """Time a stage. Yields a dict the caller can add attributes to (e.g. ``bytes``)."""
+    record = {"stage": stage}
+    record.update(attrs)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["error"] = True
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        record["seconds"] = round(seconds, 4)
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if record.get("bytes"):
+            STAGE_BYTES.inc(record["bytes"], stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append(record)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append({"stage": f"cache:{cache}", "hit": hit, "seconds": 0.0})
+
+
+@contextmanager
+def collect_timings() -> Iterator[List[Dict]]:
+    """Collect the spans recorded in the current context (one API request)."""
+    spans: List[Dict] = []
+    token = _request_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _request_spans.reset(token)
+
+
+def current_spans() -> List[Dict]:
+    """Spans recorded so far in the active ``collect_timings()`` block (empty if none)."""
+    spans = _request_spans.get()
+    return spans if spans is not None else []
+
+
+def summarize_timings(spans: List[Dict]) -> Dict:
+    """Per-stage totals for a request's spans, plus the raw spans."""
+    totals: Dict[str, Dict] = {}
+    cache: Dict[str, Dict[str, int]] = {}
+    for s in spans:
+        if s["stage"].startswith("cache:"):
+            counts = cache.setdefault(s["stage"][len("cache:"):], {"hit": 0, "miss": 0})
+            counts["hit" if s["hit"] else "miss"] += 1
+            continue
+        t = totals.setdefault(s["stage"], {"count": 0, "seconds": 0.0, "bytes": 0})
+        t["count"] += 1
+        t["seconds"] = round(t["seconds"] + s.get("seconds", 0.0), 4)
+        t["bytes"] += s.get("bytes", 0) or 0
+    return {"stages": totals, "cache": cache, "spans": [s for s in spans if not s["stage"].startswith("cache:")]}
@@ -0,0 +1,104 @@
+"""Worker roles and warm-up of the heavy third-party modules.
+
+Importing the app only loads FastAPI and this package's own modules; OpenCV,
+NumPy, the OpenAI client, BeautifulSoup, PIL and requests are imported by the
+functions that use them. A worker therefore binds its port and answers
+``/healthz`` within a fraction of a second. Right after startup, ``WarmUp``
+imports the modules of the stacks the worker's role serves in a background
+thread, so the first real request doesn't pay for them either.
+
+``VIDEO_MVP_ROLE`` picks the routes a worker serves: ``api`` (input,
+prefetch, batch), ``render`` (video rendering) or ``all``. A worker never
+imports the modules of a stack it doesn't serve.
+"""
+from typing import Dict, List, Optional
+import importlib
+import logging
+import os
+import threading
+import time
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = REGISTRY.histogram("video_mvp_startup_seconds", "Worker startup phases in seconds.")
+
+API = "api"
+RENDER = "render"
+ROLES = {"all": (API, RENDER), API: (API,), RENDER: (RENDER,)}
+
+# Heavy modules behind each stack, in the order a request first needs them.
+# Relative names are modules of this package (utils); optional ones may be missing.
+STACK_MODULES = {
+    API: ("requests", "bs4", "PIL.Image", "PIL.ImageFile", "openai", "imagehash"),
+    RENDER: ("requests", "numpy", "cv2", ".frame_transport"),
+}
+OPTIONAL_MODULES = {"imagehash"}
+
+
+def role_from_env() -> str:
+    """The worker role from ``VIDEO_MVP_ROLE`` (default ``all``)."""
+    role = os.environ.get("VIDEO_MVP_ROLE", "all").strip().lower() or "all"
+    if role not in ROLES:
+        raise ValueError(f"VIDEO_MVP_ROLE must be one of {', '.join(ROLES)}, got {role!r}")
+    return role
+
+
+def serves(role: str, stack: str) -> bool:
+    return stack in ROLES[role]
+
+
+def stack_modules(role: str) -> List[str]:
+    """Heavy modules a worker in ``role`` imports, without repeats."""
+    modules: List[str] = []
+    for stack in ROLES[role]:
+        modules.extend(m for m in STACK_MODULES[stack] if m not in modules)
+    return modules
+
+
+class WarmUp:
+    """Imports a role's heavy modules once, in a background thread."""
+
+    def __init__(self, role: str):
+        self.role = role
+        self.seconds: Dict[str, float] = {}
+        self.total_s: Optional[float] = None
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "WarmUp":
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+                self._thread.start()
+        return self
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        try:
+            for name in stack_modules(self.role):
+                t0 = time.perf_counter()
+                try:
+                    importlib.import_module(name, package=__package__)
+                except ImportError as e:
+                    # A missing module fails the request that needs it, with a clearer error than here
+                    level = logging.DEBUG if name in OPTIONAL_MODULES else logging.WARNING
+                    logger.log(level, "[startup] Could not import %s: %s", name, e)
+                    continue
+                self.seconds[name] = round(time.perf_counter() - t0, 4)
+        finally:
+            self.total_s = round(time.perf_counter() - start, 4)
+            STARTUP_SECONDS.observe(self.total_s, phase="warm_up", role=self.role)
+            self._done.set()
+        logger.info("[startup] %s worker warm in %.2fs: %s", self.role, self.total_s, self.seconds)
+
+    @property
+    def warm(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict:
+        return {"role": self.role, "warm": self.warm, "warm_up_s": self.total_s}
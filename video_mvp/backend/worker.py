@@ -0,0 +1,80 @@
+"""Run render and analysis jobs from the durable job queue.
+
+Usage:
+    python -m video_mvp.backend.worker [--kinds render,analyze] [--concurrency 2] [--until-idle]
+
+The API tier enqueues jobs with ``POST /api/jobs``; any number of these
+workers on the same host, sharing the queue database (``VIDEO_MVP_QUEUE_PATH``,
+single-host only: SQLite WAL does not work across machines or on network
+filesystems) and video directory (``VIDEO_MVP_VIDEO_DIR``), pull them. Jobs run the same code as the API endpoints, and finished videos
+are published to the shared video directory, where the API serves them.
+"""
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+from .services.job_queue import JobQueue, Worker, queue_from_env
+from .services.workflows import AnalyzeJob, RenderVideoRequest, prepare_storyboard, render_storyboard
+from .utils.cancellation import current_token
+from .utils.startup import WarmUp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = os.path.join("uploads", "queue.db")
+# Worker role (see utils/startup.py) whose modules each job kind needs
+KIND_ROLES = {"analyze": "api", "render": "render"}
+
+
+def run_analyze(payload: Dict) -> Dict:
+    job = AnalyzeJob(**payload)
+    media_json = [{"path": path, "description": ""} for path in job.media_files]
+    return prepare_storyboard(job.product_url, job.creative_prompt, list(job.media_files), media_json, job.max_images)
+
+
+def run_render(payload: Dict) -> Dict:
+    # The worker's token fires if the lease is lost, which kills the encode
+    return render_storyboard(RenderVideoRequest(**payload), current_token())
+
+
+HANDLERS = {"analyze": run_analyze, "render": run_render}
+
+
+def build_worker(kinds: List[str], queue: Optional[JobQueue] = None, concurrency: int = 1,
+                 name: Optional[str] = None) -> Worker:
+    unknown = set(kinds) - set(HANDLERS)
+    if unknown:
+        raise ValueError(f"Unknown job kinds: {', '.join(sorted(unknown))}")
+    queue = queue or queue_from_env(DEFAULT_QUEUE_PATH)
+    return Worker(queue, {kind: HANDLERS[kind] for kind in kinds}, name=name, concurrency=concurrency)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run queued render/analysis jobs.")
+    parser.add_argument("--kinds", default="render,analyze", help="Comma-separated job kinds to take")
+    parser.add_argument("--concurrency", type=int, default=1, help="Jobs run at once by this process")
+    parser.add_argument("--queue", help="Queue database (default $VIDEO_MVP_QUEUE_PATH or uploads/queue.db)")
+    parser.add_argument("--until-idle", action="store_true", help="Exit once no job is ready")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    queue = queue_from_env(DEFAULT_QUEUE_PATH, path=args.queue)
+    worker = build_worker(kinds, queue, args.concurrency)
+    # Import the stacks the jobs need while waiting for the first one
+    roles = {KIND_ROLES[k] for k in kinds}
+    WarmUp(roles.pop() if len(roles) == 1 else "all").start()
+    # SIGTERM (e.g. a deploy) lets running jobs finish; anything cut short is redelivered after its lease
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        processed = worker.run(until_idle=args.until_idle)
+    except KeyboardInterrupt:
+        worker.stop()
+        return 130
+    print(json.dumps({"worker": worker.name, "processed": processed, "queue": queue.counts()}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())